@@ -1,26 +1,41 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
+import time
+import asyncio
+from typing import List, Dict, Any, Callable, Optional, Tuple, AsyncIterator
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from app.schemas import ClassificationResponse, ExtractionResponse
+from app.schemas import ClassificationRequest, ClassificationResponse, ExtractionRequest, ExtractionResponse, AnalysisResponse
+from app.utils.concurrency import get_semaphore
+from app.utils.scheduler import Priority, get_scheduler
+from app.utils.singleflight import get_single_flight
+from app.utils.metrics import span, observe, record_usage, record_fallback
+from app.utils.deadline import detached_context
+from app.utils.cache import get_result_cache, make_key
+from app.utils.text import estimate_tokens
+from app.agents.local_classifier import get_classifier_cascade, record_example
+from app.agents.context import ContextReport, create_context_manager
+from app.agents.router import ModelRouter
+from app.phrases import CLOSING_QUESTION, FILED_CONFIRMATION
+from app.languages import detected_name
 
 import logging
 logger = logging.getLogger(__name__)
 
-class BrainAgent:
-    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0):
-        self.llm = ChatGroq(
-            model=model_name,
-            temperature=temperature,
-            api_key=os.getenv("GROQ_API_KEY")
-        )
-        self.parser = JsonOutputParser()
+# Marker the persona appends to the final turn of a conversation
+FINISH_TOKEN = "[FINISH]"
+
+# Completion tokens assumed per call when reserving tokens/min quota
+COMPLETION_TOKENS = 256
+
+# Seconds a warmed-up connection is assumed to stay in the pool
+WARM_UP_INTERVAL = 5.0
 
-    def classify_complaint(self, text: str, labels: List[str], multi_label: bool = False) -> ClassificationResponse:
-        prompt = ChatPromptTemplate.from_template(
-            """You are a civic complaint classifier. 
+# Bump a prompt's version whenever its wording changes so cached results are not reused.
+# The complaint's language is not asked for: it is detected locally (app.languages).
+CLASSIFY_PROMPT_VERSION = "classify-v1"
+CLASSIFY_PROMPT = """You are a civic complaint classifier. 
             Classify the following text into these labels: {labels}.
             
             Multi-label allowed: {multi_label}
@@ -37,41 +52,9 @@ class BrainAgent:
             }}
             Scores must be floats between 0 and 1. If a label is not applicable, set its score to 0.
             No explanation or extra text."""
-        )
-        
-        chain = prompt | self.llm | self.parser
-        
-        try:
-            result = chain.invoke({
-                "text": text,
-                "labels": ", ".join(labels),
-                "multi_label": multi_label
-            })
-            
-            # Ensure all labels are present in scores
-            scores = result.get("scores", {})
-            for label in labels:
-                if label not in scores:
-                    scores[label] = 0.0
-            
-            return ClassificationResponse(
-                top_label=result.get("top_label", labels[0] if labels else "unknown"),
-                scores=scores,
-                model_name=self.llm.model_name
-            )
-        except Exception as e:
-            import traceback
-            logger.error(f"Classification error: {traceback.format_exc()}")
-            # Safe Fallback
-            return ClassificationResponse(
-                top_label=labels[0] if labels else "unknown",
-                scores={label: 0.0 for label in labels},
-                model_name=self.llm.model_name
-            )
 
-    def extract_complaint_data(self, text: str, labels: List[str]) -> ExtractionResponse:
-        prompt = ChatPromptTemplate.from_template(
-            """You are a civic data extractor. 
+EXTRACT_PROMPT_VERSION = "extract-v2"
+EXTRACT_PROMPT = """You are a civic data extractor. 
             Analyze the following complaint text and categorize it using one of these labels: {labels}.
             
             Text: {text}
@@ -82,46 +65,431 @@ class BrainAgent:
                 "confidence": float,
                 "urgency": "low" | "medium" | "high",
                 "location_hint": "string or null",
-                "summary": "string (max 300 chars)",
-                "language": "string or null"
+                "summary": "string (max 300 chars)"
             }}
             No explanation or extra text."""
-        )
+
+ANALYZE_PROMPT_VERSION = "analyze-v2"
+ANALYZE_PROMPT = """You are a civic complaint analyst. 
+            Classify the following complaint into these labels: {labels}, and extract its details.
+            
+            Multi-label allowed: {multi_label}
+            
+            Text: {text}
+            
+            IMPORTANT: The input text might be in English, Hindi, Bengali, or Tamil. 
+            Understand the meaning and classify it into the English labels provided above.
+            
+            Output ONLY valid JSON matching this schema:
+            {{
+                "top_label": "string",
+                "scores": {{ "label": float }},
+                "category": "string",
+                "confidence": float,
+                "urgency": "low" | "medium" | "high",
+                "location_hint": "string or null",
+                "summary": "string (max 300 chars)"
+            }}
+            Scores must be floats between 0 and 1. If a label is not applicable, set its score to 0.
+            "category" is the best matching label and "confidence" your confidence in it.
+            No explanation or extra text."""
+
+BATCH_CLASSIFY_PROMPT = """You are a civic complaint classifier. 
+            Classify EACH of the numbered complaints below into these labels: {labels}.
+            
+            Multi-label allowed: {multi_label}
+            
+            Complaints:
+            {items}
+            
+            IMPORTANT: The input text might be in English, Hindi, Bengali, or Tamil. 
+            Understand the meaning and classify it into the English labels provided above.
+            
+            Output ONLY valid JSON correctly matching the following schema:
+            {{
+                "results": [
+                    {{ "index": int, "top_label": "string", "scores": {{ "label": float }} }}
+                ]
+            }}
+            Return exactly one result per complaint, using the complaint's number as "index".
+            Scores must be floats between 0 and 1. If a label is not applicable, set its score to 0.
+            No explanation or extra text."""
+
+BATCH_EXTRACT_PROMPT = """You are a civic data extractor. 
+            Analyze EACH of the numbered complaints below and categorize it using one of these labels: {labels}.
+            
+            Complaints:
+            {items}
+            
+            Output ONLY valid JSON matching this schema:
+            {{
+                "results": [
+                    {{
+                        "index": int,
+                        "category": "string",
+                        "confidence": float,
+                        "urgency": "low" | "medium" | "high",
+                        "location_hint": "string or null",
+                        "summary": "string (max 300 chars)"
+                    }}
+                ]
+            }}
+            Return exactly one result per complaint, using the complaint's number as "index".
+            No explanation or extra text."""
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a citizen and a civic complaint portal.
+            
+            Existing summary: {summary}
+            
+            New messages:
+            {messages}
+            
+            Write an updated summary of at most 120 words. Keep every complaint detail (issue, location, time,
+            urgency, names or contact details) and note the language the citizen uses.
+            Output only the summary."""
+
+class BrainAgent:
+    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0, router: Optional[ModelRouter] = None):
+        self.scheduler = get_scheduler()
+        self.http_client = self.scheduler.http_client()
+        self._warmed_at = 0.0
+        # Picks the model per call; responses report the model that actually answered
+        self.router = router or ModelRouter(model_name)
+        self.llms = {
+            model: ChatGroq(
+                model=model,
+                temperature=temperature,
+                api_key=os.getenv("GROQ_API_KEY"),
+                # Retries go through the scheduler so they are re-queued by priority
+                max_retries=0,
+                http_async_client=self.http_client
+            )
+            for model in self.router.models
+        }
+        # The primary model: names fallback answers and serves calls the router cannot redirect
+        self.llm = self.llms[self.router.primary]
+        self.parser = JsonOutputParser()
+        self.cascade = get_classifier_cascade()
+        self.context = create_context_manager(self._summarize_history)
+        self._background_tasks = set()
+
+    async def classify_complaint(self, text: str, labels: List[str], multi_label: bool = False, use_cache: bool = True, use_local: bool = True, priority: Priority = Priority.CLASSIFICATION) -> ClassificationResponse:
+        # Cheap local first pass; only low-confidence requests reach the LLM
+        local_guess = None
+        if use_local:
+            local, local_guess = self.cascade.predict(text, labels, multi_label)
+            if local is not None:
+                if self.cascade.should_shadow():
+                    self._spawn(self._shadow_check(text, labels, local.top_label))
+                return local
         
-        chain = prompt | self.llm | self.parser
+        inputs = {"text": text, "labels": ", ".join(labels), "multi_label": multi_label}
+        keys = self._cache_keys("classify", CLASSIFY_PROMPT, inputs, lambda model: make_key("classify", text, labels, model, CLASSIFY_PROMPT_VERSION, multi_label))
+        if use_cache:
+            cached = await get_result_cache().get_any(keys)
+            if cached is not None:
+                if local_guess:
+                    self.cascade.stats.record_comparison(local_guess, cached["top_label"])
+                return ClassificationResponse(**cached)
         
         try:
-            result = chain.invoke({
-                "text": text,
-                "labels": ", ".join(labels)
-            })
-            
-            # Validation and Fallbacks
-            return ExtractionResponse(
-                category=result.get("category", labels[0] if labels else "unknown"),
-                confidence=float(result.get("confidence", 0.5)),
-                urgency=result.get("urgency", "medium"),
-                location_hint=result.get("location_hint"),
-                summary=result.get("summary", text[:300]),
-                language=result.get("language"),
+            # Identical requests already in flight (e.g. webhook retries) share one LLM call
+            response = await get_single_flight("classify").do(
+                keys[0], lambda: self._classify_llm(text, labels, multi_label, inputs, priority)
+            )
+            if local_guess:
+                self.cascade.stats.record_comparison(local_guess, response.top_label)
+            return response
+        except Exception as e:
+            import traceback
+            logger.error(f"Classification error: {traceback.format_exc()}")
+            record_fallback("classify")
+            # Safe Fallback
+            return ClassificationResponse(
+                top_label=labels[0] if labels else "unknown",
+                scores={label: 0.0 for label in labels},
                 model_name=self.llm.model_name
             )
+
+    async def _classify_llm(self, text: str, labels: List[str], multi_label: bool, inputs: Dict[str, Any], priority: Priority) -> ClassificationResponse:
+        result, model = await self._invoke("classify", CLASSIFY_PROMPT, inputs, priority)
+        
+        response = self._to_classification(result, labels, model)
+        # Filed under the model that answered, which may not be the one the lookup preferred
+        await get_result_cache().set(make_key("classify", text, labels, model, CLASSIFY_PROMPT_VERSION, multi_label), response.model_dump())
+        await self._record_example(text, labels, response.top_label, response.model_name)
+        return response
+
+    async def _shadow_check(self, text: str, labels: List[str], local_label: str):
+        """Re-classifies a sampled local answer with the LLM to measure cascade agreement."""
+        response = await self.classify_complaint(text, labels, use_local=False, priority=Priority.BATCH)
+        if response.model_name in self.llms:
+            self.cascade.stats.record_comparison(local_label, response.top_label)
+
+    async def _record_example(self, text: str, labels: List[str], top_label: str, model_name: str):
+        # The local classifier learns from the primary model only, not from fast-model, hedged or rerouted answers
+        if model_name == self.router.primary:
+            await record_example(text, labels, top_label, model_name)
+
+    def _spawn(self, coro):
+        # Background work is not bound by (or cancelled with) the request that started it
+        task = asyncio.create_task(coro, context=detached_context())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _to_classification(self, result: Dict[str, Any], labels: List[str], model_name: str) -> ClassificationResponse:
+        # Ensure all labels are present in scores
+        scores = result.get("scores", {})
+        for label in labels:
+            if label not in scores:
+                scores[label] = 0.0
+        
+        return ClassificationResponse(
+            top_label=result.get("top_label", labels[0] if labels else "unknown"),
+            scores=scores,
+            model_name=model_name
+        )
+
+    async def extract_complaint_data(self, text: str, labels: List[str], use_cache: bool = True, priority: Priority = Priority.CLASSIFICATION) -> ExtractionResponse:
+        inputs = {"text": text, "labels": ", ".join(labels)}
+        keys = self._cache_keys("extract", EXTRACT_PROMPT, inputs, lambda model: make_key("extract", text, labels, model, EXTRACT_PROMPT_VERSION))
+        if use_cache:
+            cached = await get_result_cache().get_any(keys)
+            if cached is not None:
+                return ExtractionResponse(**cached)
+        
+        try:
+            return await get_single_flight("extract").do(
+                keys[0], lambda: self._extract_llm(text, labels, inputs, priority)
+            )
         except Exception:
             import traceback
             logger.error(f"Extraction error: {traceback.format_exc()}")
+            record_fallback("extract")
             return ExtractionResponse(
                 category=labels[0] if labels else "unknown",
                 confidence=0.0,
                 urgency="medium",
                 location_hint=None,
                 summary=text[:300],
-                language=None,
+                language=detected_name(text),
+                model_name=self.llm.model_name
+            )
+
+    async def _extract_llm(self, text: str, labels: List[str], inputs: Dict[str, Any], priority: Priority) -> ExtractionResponse:
+        result, model = await self._invoke("extract", EXTRACT_PROMPT, inputs, priority)
+        
+        response = self._to_extraction(result, text, labels, model)
+        await get_result_cache().set(make_key("extract", text, labels, model, EXTRACT_PROMPT_VERSION), response.model_dump())
+        return response
+
+    def _to_extraction(self, result: Dict[str, Any], text: str, labels: List[str], model_name: str) -> ExtractionResponse:
+        # Validation and Fallbacks
+        return ExtractionResponse(
+            category=result.get("category", labels[0] if labels else "unknown"),
+            confidence=float(result.get("confidence", 0.5)),
+            urgency=result.get("urgency", "medium"),
+            location_hint=result.get("location_hint"),
+            summary=result.get("summary", text[:300]),
+            language=detected_name(text),
+            model_name=model_name
+        )
+
+    async def analyze_complaint(self, text: str, labels: List[str], multi_label: bool = False, use_cache: bool = True, priority: Priority = Priority.CLASSIFICATION) -> AnalysisResponse:
+        """Classification and extraction from a single LLM call."""
+        inputs = {"text": text, "labels": ", ".join(labels), "multi_label": multi_label}
+        keys = self._cache_keys("analyze", ANALYZE_PROMPT, inputs, lambda model: make_key("analyze", text, labels, model, ANALYZE_PROMPT_VERSION, multi_label))
+        if use_cache:
+            cached = await get_result_cache().get_any(keys)
+            if cached is not None:
+                return AnalysisResponse(**cached)
+        
+        try:
+            return await get_single_flight("analyze").do(
+                keys[0], lambda: self._analyze_llm(text, labels, multi_label, inputs, priority)
+            )
+        except Exception:
+            import traceback
+            logger.error(f"Analysis error: {traceback.format_exc()}")
+            record_fallback("analyze")
+            # Same fallbacks as classify_complaint and extract_complaint_data
+            return AnalysisResponse(
+                top_label=labels[0] if labels else "unknown",
+                scores={label: 0.0 for label in labels},
+                category=labels[0] if labels else "unknown",
+                confidence=0.0,
+                urgency="medium",
+                location_hint=None,
+                summary=text[:300],
+                language=detected_name(text),
                 model_name=self.llm.model_name
             )
 
-    def chat(self, text: str, history: List[Dict[str, str]], language: str = "English") -> str:
+    async def _analyze_llm(self, text: str, labels: List[str], multi_label: bool, inputs: Dict[str, Any], priority: Priority) -> AnalysisResponse:
+        result, model = await self._invoke("analyze", ANALYZE_PROMPT, inputs, priority)
+        
+        if "category" not in result and "top_label" in result:
+            result["category"] = result["top_label"]
+        classification = self._to_classification(result, labels, model)
+        extraction = self._to_extraction(result, text, labels, model)
+        response = AnalysisResponse(**classification.model_dump(), **extraction.model_dump(exclude={"model_name"}))
+        
+        cache = get_result_cache()
+        await cache.set(make_key("analyze", text, labels, model, ANALYZE_PROMPT_VERSION, multi_label), response.model_dump())
+        # Later /classify or /extract calls for the same complaint are answered from this result
+        await cache.set(make_key("classify", text, labels, model, CLASSIFY_PROMPT_VERSION, multi_label), classification.model_dump())
+        await cache.set(make_key("extract", text, labels, model, EXTRACT_PROMPT_VERSION), extraction.model_dump())
+        await self._record_example(text, labels, response.top_label, response.model_name)
+        return response
+
+    async def classify_batch(self, requests: List[ClassificationRequest], use_cache: bool = True) -> List[ClassificationResponse]:
+        """
+        Classifies many complaints, packing several into each LLM call.
+        Items missing from (or malformed in) a packed answer fall back to a per-item call.
+        """
+        async def run_pack(pack: List[Tuple[int, ClassificationRequest]]) -> Dict[int, ClassificationResponse]:
+            first = pack[0][1]
+            result, model = await self._invoke("classify_batch", BATCH_CLASSIFY_PROMPT, {
+                "items": _format_batch_items([item.text for _, item in pack]),
+                "labels": ", ".join(first.labels),
+                "multi_label": first.multi_label
+            }, Priority.BATCH, completion_tokens=COMPLETION_TOKENS // 2 * len(pack))
+            answers = _index_batch_results(result, "top_label")
+            responses = {}
+            for position, (index, item) in enumerate(pack):
+                if position in answers:
+                    try:
+                        responses[index] = self._to_classification(answers[position], item.labels, model)
+                        await self._record_example(item.text, item.labels, responses[index].top_label, model)
+                    except Exception:
+                        logger.warning(f"Batch classification item {index} failed validation, retrying individually")
+            return responses
+
+        # Local first pass; only escalated items go through the packed LLM calls
+        results: List[Optional[ClassificationResponse]] = [None] * len(requests)
+        escalated = []
+        for index, item in enumerate(requests):
+            local, _ = self.cascade.predict(item.text, item.labels, item.multi_label)
+            if local is not None:
+                results[index] = local
+            else:
+                escalated.append(index)
+        if not escalated:
+            return results
+        
+        llm_results = await self._run_batch(
+            [requests[index] for index in escalated],
+            kind="classify",
+            group_key=lambda item: (tuple(item.labels), item.multi_label),
+            cache_keys=lambda item: self._cache_keys(
+                "classify", CLASSIFY_PROMPT, {"text": item.text, "labels": ", ".join(item.labels), "multi_label": item.multi_label},
+                lambda model: make_key("classify", item.text, item.labels, model, CLASSIFY_PROMPT_VERSION, item.multi_label)
+            ),
+            store_key=lambda item, model: make_key("classify", item.text, item.labels, model, CLASSIFY_PROMPT_VERSION, item.multi_label),
+            response_type=ClassificationResponse,
+            run_pack=run_pack,
+            run_single=lambda item: self.classify_complaint(item.text, item.labels, item.multi_label, use_cache=use_cache, use_local=False, priority=Priority.BATCH),
+            use_cache=use_cache
+        )
+        for index, response in zip(escalated, llm_results):
+            results[index] = response
+        return results
+
+    async def extract_batch(self, requests: List[ExtractionRequest], use_cache: bool = True) -> List[ExtractionResponse]:
+        """
+        Extracts structured data for many complaints, packing several into each LLM call.
+        Items missing from (or malformed in) a packed answer fall back to a per-item call.
+        """
+        async def run_pack(pack: List[Tuple[int, ExtractionRequest]]) -> Dict[int, ExtractionResponse]:
+            result, model = await self._invoke("extract_batch", BATCH_EXTRACT_PROMPT, {
+                "items": _format_batch_items([item.text for _, item in pack]),
+                "labels": ", ".join(pack[0][1].labels)
+            }, Priority.BATCH, completion_tokens=COMPLETION_TOKENS // 2 * len(pack))
+            answers = _index_batch_results(result, "category")
+            responses = {}
+            for position, (index, item) in enumerate(pack):
+                if position in answers:
+                    try:
+                        responses[index] = self._to_extraction(answers[position], item.text, item.labels, model)
+                    except Exception:
+                        logger.warning(f"Batch extraction item {index} failed validation, retrying individually")
+            return responses
+
+        return await self._run_batch(
+            requests,
+            kind="extract",
+            group_key=lambda item: tuple(item.labels),
+            cache_keys=lambda item: self._cache_keys(
+                "extract", EXTRACT_PROMPT, {"text": item.text, "labels": ", ".join(item.labels)},
+                lambda model: make_key("extract", item.text, item.labels, model, EXTRACT_PROMPT_VERSION)
+            ),
+            store_key=lambda item, model: make_key("extract", item.text, item.labels, model, EXTRACT_PROMPT_VERSION),
+            response_type=ExtractionResponse,
+            run_pack=run_pack,
+            run_single=lambda item: self.extract_complaint_data(item.text, item.labels, use_cache=use_cache, priority=Priority.BATCH),
+            use_cache=use_cache
+        )
+
+    async def _run_batch(self, requests, kind, group_key, cache_keys, store_key, response_type, run_pack, run_single, use_cache):
+        cache = get_result_cache()
+        results: List[Any] = [None] * len(requests)
+        
+        # Serve what we can from the cache and group the rest by prompt parameters
+        groups: Dict[Any, List[Tuple[int, Any]]] = {}
+        for index, item in enumerate(requests):
+            if use_cache:
+                cached = await cache.get_any(cache_keys(item))
+                if cached is not None:
+                    results[index] = response_type(**cached)
+                    continue
+            groups.setdefault(group_key(item), []).append((index, item))
+        
+        packs = []
+        for items in groups.values():
+            packs.extend(_pack_items(items))
+        
+        async def resolve(pack):
+            try:
+                responses = await run_pack(pack)
+            except Exception:
+                import traceback
+                logger.error(f"Batch {kind} error: {traceback.format_exc()}")
+                responses = {}
+            for index, item in pack:
+                response = responses.get(index)
+                if response is not None:
+                    results[index] = response
+                    await cache.set(store_key(item, response.model_name), response.model_dump())
+        
+        await asyncio.gather(*(resolve(pack) for pack in packs))
+        
+        # Per-item fallback for anything the packed calls did not answer
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            logger.info(f"Batch {kind}: {len(missing)} of {len(requests)} items retried individually")
+            fallbacks = await asyncio.gather(*(run_single(requests[index]) for index in missing))
+            for index, response in zip(missing, fallbacks):
+                results[index] = response
+        return results
+
+    def build_chat_context(self, text: str, history: List[Dict[str, str]], language: str, conversation_id: Optional[str] = None) -> Tuple[List[Tuple[str, str]], ContextReport]:
+        """
+        Builds the prompt for a chat turn. Older turns are replaced by a cached running
+        summary and the result is kept within the configured token budget.
+        """
         # Construct message history
         # We explicitly tell the LLM to include the intro and outro in the target language.
+        # Where a fixed translation exists it must be used verbatim so its audio is served from the TTS cache.
+        closing = CLOSING_QUESTION.get(language)
+        filed = FILED_CONFIRMATION.get(language)
+        closing_rule = (
+            f"ALWAYS END with exactly this sentence: '{closing}'" if closing
+            else f"ALWAYS END by asking: 'Is there anything else I can help you with?' in {language}."
+        )
+        termination_rule = (
+            f"respond with exactly: '{filed}'" if filed
+            else f"respond with: 'Thank you, your complaint has been filed and is being processed for verification.' in {language}"
+        )
         system_prompt = (
             f"You are the OFFICIAL CIVIC COMPLAINT PORTAL. Respond ONLY in {language}.\n"
             f"STRICT PERSONA RULES:\n"
@@ -130,31 +498,178 @@ class BrainAgent:
             f"3. [STRUCTURE]:\n"
             f"   - START: Respond in {language}.\n"
             f"   - BODY: Confirmation of issue or help with civic complaint.\n"
-            f"   - ALWAYS END by asking: 'Is there anything else I can help you with?' in {language}.\n"
-            f"4. [TERMINATION]: If the user says 'No', 'That is all', 'Nothing else', or similar, respond with: 'Thank you, your complaint has been filed and is being processed for verification.' in {language} and add the token [FINISH] at the very end.\n"
+            f"   - {closing_rule}\n"
+            f"4. [TERMINATION]: If the user says 'No', 'That is all', 'Nothing else', or similar, {termination_rule} and add the token {FINISH_TOKEN} at the very end.\n"
             f"Example (Complaint): 'I have recorded your issue regarding the waste pile and will forward it to the department. Is there anything else I can help you with?'\n"
-            f"Example (Final): 'Thank you, your complaint has been filed and is being processed for verification. [FINISH]'"
+            f"Example (Final): 'Thank you, your complaint has been filed and is being processed for verification. {FINISH_TOKEN}'"
         )
         
-        messages = [
-            ("system", system_prompt)
-        ]
-        
-        for msg in history:
-            role = msg.get("role")
-            content = msg.get("content")
-            if role in ["user", "assistant"] and content:
-                messages.append((role, content))
-        
-        messages.append(("user", text))
-        
+        with span("prompt_build"):
+            return self.context.build(system_prompt, _chat_turns(history), text, conversation_id)
+
+    def restore_chat_context(self, conversation_id: str, summary: Optional[str], covered: List[Dict[str, str]]):
+        """Seeds the running summary of a persisted conversation, e.g. after a restart."""
+        self.context.restore(conversation_id, summary, _chat_turns(covered))
+
+    async def chat(self, text: str, history: List[Dict[str, str]], language: str = "English", conversation_id: Optional[str] = None, details: Optional[Dict[str, Any]] = None) -> str:
+        messages, _ = self.build_chat_context(text, history, language, conversation_id)
+        return await self.complete_chat(messages, language, details)
+
+    async def complete_chat(self, messages: List[Tuple[str, str]], language: str = "English", details: Optional[Dict[str, Any]] = None) -> str:
+        """Chat reply for messages from build_chat_context. If `details` is given, the answering model is recorded as model_name."""
+        if details is not None:
+            details["model_name"] = self.llm.model_name
         try:
-            response = self.llm.invoke(messages)
+            response, model = await self._invoke("chat", None, messages, Priority.CHAT, parse=False)
+            if details is not None:
+                details["model_name"] = model
             return response.content
         except Exception as e:
             import traceback
             logger.error(f"Chat Error: {traceback.format_exc()}")
-            return f"I'm having trouble connecting to my brain right now. Processing in {language} is encountering an issue."
+            record_fallback("chat")
+            return self._chat_fallback(language)
+
+    async def stream_chat(self, messages: List[Tuple[str, str]], language: str = "English", details: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Streams the chat reply (for messages from build_chat_context) token by token.
+        On failure the fallback message is yielded so callers always receive a reply.
+        Streams are not hedged, but skip the primary model while it is failing.
+        """
+        emitted = False
+        model = self.router.healthy(self.llm.model_name, "chat")
+        if details is not None:
+            details["model_name"] = model
+        
+        try:
+            # Only admission is scheduled; a stream that already produced tokens cannot be replayed
+            await self.scheduler.acquire(model, Priority.CHAT, _estimate_tokens(None, messages) + COMPLETION_TOKENS)
+            async with get_semaphore("llm"):
+                started = time.perf_counter()
+                async for chunk in self.llms[model].astream(messages):
+                    record_usage(model, getattr(chunk, "usage_metadata", None))
+                    if chunk.content:
+                        if not emitted:
+                            observe("llm_first_token", time.perf_counter() - started)
+                        emitted = True
+                        yield chunk.content
+                observe("llm_stream", time.perf_counter() - started)
+        except Exception:
+            import traceback
+            logger.error(f"Chat Stream Error: {traceback.format_exc()}")
+            record_fallback("chat_stream")
+            if not emitted:
+                yield self._chat_fallback(language)
+
+    async def _summarize_history(self, summary: Optional[str], messages: List[Tuple[str, str]]) -> str:
+        transcript = "\n".join(f"{role}: {content}" for role, content in messages)
+        result, _ = await self._invoke("summary", SUMMARY_PROMPT, {"summary": summary or "(none)", "messages": transcript}, Priority.BATCH, parse=False)
+        return result.content
+
+    async def warm_up(self):
+        """
+        Opens (or refreshes) a pooled connection to Groq with a cheap request, so the next
+        LLM call skips the TCP/TLS handshake. Meant to overlap with other work, e.g. transcription.
+        """
+        now = time.monotonic()
+        if now - self._warmed_at < WARM_UP_INTERVAL:
+            return
+        self._warmed_at = now
+        base_url = os.getenv("GROQ_BASE_URL") or "https://api.groq.com"
+        try:
+            await self.http_client.get(
+                f"{base_url.rstrip('/')}/openai/v1/models",
+                headers={"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"},
+                timeout=5.0
+            )
+        except Exception as e:
+            logger.debug(f"LLM connection warm-up failed: {e}")
+
+    def _cache_keys(self, task: str, template: str, inputs: Dict[str, Any], key: Callable[[str], str]) -> List[str]:
+        """
+        Result cache keys, built by `key` from a model name, whose answers may serve a `task` call: the model
+        it is routed to by configuration, then the primary. Entries are filed under the model that answered.
+        """
+        preferred = self.router.preferred(task, _estimate_tokens(template, inputs))
+        return [key(model) for model in dict.fromkeys([preferred, self.router.primary])]
+
+    async def _invoke(self, task: str, template: Optional[str], inputs: Any, priority: Priority, parse: bool = True, completion_tokens: int = COMPLETION_TOKENS) -> Tuple[Any, str]:
+        """
+        Runs one LLM call of `task` on the model the router picks, through the rate-limit scheduler,
+        then the concurrency limit; a slow call may be hedged on the other model.
+        `template` is formatted with `inputs` (without a template, `inputs` are chat messages).
+        Returns the reply, parsed as JSON unless parse=False, and the model that produced it.
+        """
+        with span("prompt_build"):
+            messages = ChatPromptTemplate.from_template(template).format_messages(**inputs) if template else inputs
+        
+        prompt_tokens = _estimate_tokens(template, inputs)
+        
+        async def call_model(model: str):
+            async def call():
+                async with get_semaphore("llm"):
+                    with span("llm_call"):
+                        return await self.llms[model].ainvoke(messages)
+            message = await self.scheduler.run(model, priority, call, prompt_tokens + completion_tokens)
+            record_usage(model, getattr(message, "usage_metadata", None))
+            if not parse:
+                return message
+            with span("json_parse"):
+                # Parsed inside the race so a malformed answer counts against its model
+                return self.parser.invoke(message)
+        
+        model = self.router.choose(task, prompt_tokens)
+        return await self.router.run(model, task, priority, call_model)
+
+    def _chat_fallback(self, language: str) -> str:
+        return f"I'm having trouble connecting to my brain right now. Processing in {language} is encountering an issue."
+
+def _estimate_tokens(template: Optional[str], inputs: Any) -> int:
+    """Prompt size estimate for quota accounting: a template plus its inputs, or chat messages."""
+    if isinstance(inputs, dict):
+        return estimate_tokens(template or "") + sum(estimate_tokens(str(value)) for value in inputs.values())
+    return sum(estimate_tokens(content) for _, content in inputs)
+
+def _chat_turns(history: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    turns = []
+    for msg in history:
+        role = msg.get("role")
+        content = msg.get("content")
+        if role in ["user", "assistant"] and content:
+            turns.append((role, content))
+    return turns
+
+def _format_batch_items(texts: List[str]) -> str:
+    return "\n".join(f"[{position}] {' '.join(text.split())}" for position, text in enumerate(texts))
+
+def _index_batch_results(result: Any, required_field: str) -> Dict[int, Dict[str, Any]]:
+    """Maps a packed answer back to positions, dropping entries without the required field."""
+    entries = result.get("results", []) if isinstance(result, dict) else result
+    answers = {}
+    for entry in entries or []:
+        if not isinstance(entry, dict) or required_field not in entry:
+            continue
+        try:
+            answers[int(entry.get("index"))] = entry
+        except (TypeError, ValueError):
+            continue
+    return answers
+
+def _pack_items(items: List[Tuple[int, Any]]) -> List[List[Tuple[int, Any]]]:
+    """Splits items into packs that fit the per-call token budget and item cap."""
+    token_budget = int(os.getenv("BATCH_TOKEN_BUDGET", "3000"))
+    max_items = int(os.getenv("BATCH_MAX_ITEMS", "20"))
+    packs, current, current_tokens = [], [], 0
+    for index, item in items:
+        tokens = estimate_tokens(item.text)
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append((index, item))
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
 
 # Singleton instance
 brain_agent: Optional[BrainAgent] = None
@@ -163,5 +678,17 @@ def get_brain_agent() -> BrainAgent:
     global brain_agent
     if brain_agent is None:
         model_name = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
-        brain_agent = BrainAgent(model_name=model_name)
+        router = ModelRouter(
+            model_name,
+            # Empty to send everything to GROQ_MODEL, without hedging
+            fast=os.getenv("GROQ_FAST_MODEL", "llama-3.1-8b-instant") or None,
+            fast_tasks={task.strip() for task in os.getenv("ROUTE_FAST_TASKS", "").split(",") if task.strip()},
+            fast_max_tokens=int(os.getenv("ROUTE_FAST_MAX_TOKENS", "1000")),
+            max_error_rate=float(os.getenv("ROUTE_MAX_ERROR_RATE", "0.25")),
+            hedge=os.getenv("HEDGE_ENABLED", "1") in ("1", "true", "yes"),
+            hedge_quantile=float(os.getenv("HEDGE_QUANTILE", "0.95")),
+            hedge_min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+            hedge_budget=float(os.getenv("HEDGE_BUDGET", "0.1"))
+        )
+        brain_agent = BrainAgent(model_name=model_name, router=router)
     return brain_agent
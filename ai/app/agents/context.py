@@ -0,0 +1,154 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from app.utils.text import estimate_tokens
+from app.utils.deadline import detached_context
+
+import logging
+logger = logging.getLogger(__name__)
+
+Message = Tuple[str, str]
+
+# Rough per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def count_tokens(messages: List[Message]) -> int:
+    return sum(estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS for _, content in messages)
+
+def _prefix_hash(messages: List[Message]) -> str:
+    digest = hashlib.sha256()
+    for role, content in messages:
+        digest.update(role.encode("utf-8") + b"\0" + content.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+class ContextReport:
+    def __init__(self, full_tokens: int, prompt_tokens: int, summarized_messages: int, dropped_messages: int):
+        self.full_tokens = full_tokens
+        self.prompt_tokens = prompt_tokens
+        self.summarized_messages = summarized_messages
+        self.dropped_messages = dropped_messages
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.full_tokens - self.prompt_tokens)
+
+class _SummaryState:
+    def __init__(self):
+        self.summary: Optional[str] = None
+        self.covered = 0
+        self.covered_hash = _prefix_hash([])
+        self.task: Optional[asyncio.Task] = None
+
+class ContextManager:
+    """
+    Keeps chat prompts bounded: the last `keep_turns` turns are sent verbatim and
+    older turns are replaced by a running summary cached per conversation.
+    The summary is refreshed in the background, so a turn never waits for it;
+    messages not yet folded into the summary are sent verbatim meanwhile.
+    """
+    def __init__(
+        self,
+        summarize: Callable[[Optional[str], List[Message]], Awaitable[str]],
+        keep_turns: int = 4,
+        token_budget: int = 3000,
+        summary_batch: int = 4,
+        max_conversations: int = 1024
+    ):
+        self.summarize = summarize
+        self.keep_messages = keep_turns * 2
+        self.token_budget = token_budget
+        self.summary_batch = summary_batch
+        self.max_conversations = max_conversations
+        self.states: "OrderedDict[str, _SummaryState]" = OrderedDict()
+
+    def _state(self, conversation_id: str) -> _SummaryState:
+        state = self.states.get(conversation_id)
+        if state is None:
+            state = self.states[conversation_id] = _SummaryState()
+        self.states.move_to_end(conversation_id)
+        while len(self.states) > self.max_conversations:
+            _, evicted = self.states.popitem(last=False)
+            if evicted.task:
+                evicted.task.cancel()
+        return state
+
+    def restore(self, conversation_id: str, summary: Optional[str], covered: List[Message]):
+        """Seeds the summary of a conversation persisted elsewhere (e.g. a server-side session)."""
+        state = self._state(conversation_id)
+        if summary and len(covered) > state.covered:
+            state.summary, state.covered, state.covered_hash = summary, len(covered), _prefix_hash(covered)
+
+    def snapshot(self, conversation_id: str) -> Tuple[Optional[str], int]:
+        """Returns (summary, number of messages it covers) for persisting."""
+        state = self.states.get(conversation_id)
+        if state is None:
+            return None, 0
+        return state.summary, state.covered
+
+    def forget(self, conversation_id: str):
+        state = self.states.pop(conversation_id, None)
+        if state and state.task:
+            state.task.cancel()
+
+    def build(self, system_prompt: str, history: List[Message], text: str, conversation_id: Optional[str] = None) -> Tuple[List[Message], ContextReport]:
+        full = [("system", system_prompt)] + history + [("user", text)]
+        full_tokens = count_tokens(full)
+
+        older = history[:-self.keep_messages] if self.keep_messages else history
+        recent = history[len(older):]
+        if not older:
+            return full, ContextReport(full_tokens, full_tokens, 0, 0)
+
+        # Conversations are identified by their opening message unless the caller has an id
+        key = conversation_id or _prefix_hash(history[:1])
+        state = self._state(key)
+
+        summary = None
+        summarized = 0
+        if state.summary and state.covered <= len(older) and _prefix_hash(older[:state.covered]) == state.covered_hash:
+            summary = state.summary
+            summarized = state.covered
+        elif state.summary:
+            # History was edited by the client; start over
+            state.summary, state.covered, state.covered_hash = None, 0, _prefix_hash([])
+
+        pending = older[summarized:]
+        if len(pending) >= self.summary_batch and (state.task is None or state.task.done()):
+            state.task = asyncio.create_task(self._refresh(state, summary, summarized, older), context=detached_context())
+
+        messages = [("system", system_prompt)]
+        if summary:
+            messages.append(("system", f"Summary of the earlier conversation: {summary}"))
+        tail = pending + recent
+        dropped = 0
+        # Enforce the hard budget by dropping the oldest verbatim messages
+        while tail and count_tokens(messages + tail + [("user", text)]) > self.token_budget:
+            tail = tail[1:]
+            dropped += 1
+        messages += tail + [("user", text)]
+
+        report = ContextReport(full_tokens, count_tokens(messages), summarized, dropped)
+        if report.tokens_saved:
+            logger.info(f"Chat context: {report.prompt_tokens} prompt tokens ({report.tokens_saved} saved, {summarized} messages summarized, {dropped} dropped)")
+        return messages, report
+
+    async def _refresh(self, state: _SummaryState, summary: Optional[str], covered: int, older: List[Message]):
+        try:
+            new_summary = await self.summarize(summary, older[covered:])
+            if new_summary:
+                state.summary = new_summary.strip()
+                state.covered = len(older)
+                state.covered_hash = _prefix_hash(older)
+        except Exception as e:
+            logger.error(f"Conversation summary failed: {e}")
+
+def create_context_manager(summarize: Callable[[Optional[str], List[Message]], Awaitable[str]]) -> ContextManager:
+    return ContextManager(
+        summarize,
+        keep_turns=int(os.getenv("CHAT_KEEP_TURNS", "4")),
+        token_budget=int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "3000")),
+        summary_batch=int(os.getenv("CHAT_SUMMARY_BATCH", "4"))
+    )
@@ -1,8 +1,20 @@
 import os
-from groq import Groq
-from typing import Tuple, Optional
+import math
+import time
+import hashlib
+import asyncio
+from groq import AsyncGroq
+from typing import Dict, List, Tuple, Optional
 import logging
 
+from app.schemas import TranscriptionResponse, TranscriptionSegment
+from app.utils.audio import AudioSource
+from app.utils.concurrency import get_semaphore
+from app.utils.scheduler import Priority, get_scheduler
+from app.utils.singleflight import get_single_flight
+from app.utils.metrics import span
+from app.utils.preprocess import preprocessing_enabled, prepare_chunks, encode_pcm, pcm_to_wav
+
 logger = logging.getLogger(__name__)
 
 class ListenerAgent:
@@ -11,15 +23,100 @@ class ListenerAgent:
         Initializes the Groq client for transcription.
         Cloud-based whisper is much faster and requires no local resources.
         """
-        self.client = Groq(api_key=api_key)
+        self.scheduler = get_scheduler()
+        # Retries go through the scheduler so they are re-queued by priority
+        self.client = AsyncGroq(api_key=api_key, max_retries=0, http_client=self.scheduler.http_client(model_name))
         self.model_name = model_name
 
-    def transcribe(self, audio_path: str, language_hint: Optional[str] = None) -> Tuple[str, str, float, str]:
+    async def transcribe(self, audio: AudioSource, language_hint: Optional[str] = None, timings: Optional[Dict[str, float]] = None, priority: Priority = Priority.TRANSCRIPTION) -> TranscriptionResponse:
+        """
+        Transcribes audio using Groq's cloud API.
+        When ffmpeg is available the audio is first transcoded to 16 kHz mono, trimmed of
+        leading/trailing silence and, if long, split at pauses into chunks that are
+        transcribed concurrently and stitched back together.
+        Concurrent requests for identical audio (same bytes, hint and model) share one transcription,
+        which reads the first caller's audio; that caller does not return before it is done, even when cancelled.
+        If `timings` is given, preprocess_ms and transcribe_ms are recorded into it, for every caller.
+        Background jobs pass Priority.BATCH so live requests get Groq quota first.
+        """
+        started = time.perf_counter()
+        # Hashed in blocks: a large upload spooled to disk is never read into memory whole
+        digest = await asyncio.to_thread(_hash_file, audio.file)
+        key = f"{self.model_name}:{language_hint or ''}:{digest}"
+        hashed_ms = (time.perf_counter() - started) * 1000
+        # Set only when this call leads: the shared transcription, which reads this call's audio
+        flight: List[asyncio.Task] = []
+        try:
+            response, shared_timings = await get_single_flight("transcribe").do(
+                key, lambda: self._transcribe_shared(audio, language_hint, priority, flight)
+            )
+        except asyncio.CancelledError:
+            if flight and not flight[0].done():
+                # Other callers still wait on it: keep this request, and so its upload, open until it is done
+                await asyncio.wait(flight)
+            raise
+        if timings is not None:
+            timings.update(shared_timings)
+            timings["preprocess_ms"] = hashed_ms + shared_timings.get("preprocess_ms", 0.0)
+        return response
+
+    async def transcribe_pcm(self, samples, language_hint: Optional[str] = None, offset: float = 0.0, priority: Priority = Priority.TRANSCRIPTION) -> TranscriptionResponse:
         """
-        Transcribes audio file using Groq's cloud API and returns (text, language, confidence, model_name).
+        Transcribes 16 kHz mono PCM samples already cut at pauses (a live-stream utterance), without
+        the decode/trim/split pass. `offset` (seconds) is added to the segment timestamps.
         """
+        if preprocessing_enabled():
+            with span("preprocess"):
+                data, extension = await encode_pcm(samples)
+        else:
+            data, extension = pcm_to_wav(samples), "wav"
+        text, language, segments, duration = await self._transcribe_file(f"utterance.{extension}", data, language_hint, offset=offset, priority=priority)
+        return self._build_response(text, language, segments, duration)
+
+    async def _transcribe_shared(self, audio: AudioSource, language_hint: Optional[str], priority: Priority, flight: List[asyncio.Task]) -> Tuple[TranscriptionResponse, Dict[str, float]]:
+        """One shared transcription: registers itself in `flight` and returns its timings with the result."""
+        flight.append(asyncio.current_task())
+        timings: Dict[str, float] = {}
+        return await self._transcribe_source(audio, language_hint, timings, priority), timings
+
+    async def _transcribe_source(self, audio: AudioSource, language_hint: Optional[str], timings: Optional[Dict[str, float]] = None, priority: Priority = Priority.TRANSCRIPTION) -> TranscriptionResponse:
+        started = time.perf_counter()
+        chunks = None
+        if preprocessing_enabled():
+            with span("preprocess"):
+                # The file is streamed into ffmpeg, so large uploads stay spooled on disk
+                chunks = await prepare_chunks(audio.file)
+        if timings is not None:
+            timings["preprocess_ms"] = timings.get("preprocess_ms", 0.0) + (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        try:
+            return await self._transcribe_chunks(audio, chunks, language_hint, priority)
+        finally:
+            if timings is not None:
+                timings["transcribe_ms"] = (time.perf_counter() - started) * 1000
+
+    async def _transcribe_chunks(self, audio: AudioSource, chunks, language_hint: Optional[str], priority: Priority = Priority.TRANSCRIPTION) -> TranscriptionResponse:
+
+        if not chunks:
+            # Send the original buffer as-is, streamed into the multipart request without a copy
+            audio.file.seek(0)
+            text, language, segments, duration = await self._transcribe_file(audio.filename, audio.file, language_hint, priority=priority)
+            return self._build_response(text, language, segments, duration)
+
+        results = await asyncio.gather(*(
+            self._transcribe_file(chunk.filename, chunk.data, language_hint, offset=chunk.offset, priority=priority)
+            for chunk in chunks
+        ))
+        text = " ".join(result[0].strip() for result in results if result[0].strip())
+        languages = [result[1] for result in results if result[1]]
+        language = max(set(languages), key=languages.count) if languages else "auto"
+        segments = [segment for result in results for segment in result[2]]
+        duration = sum(chunk.duration for chunk in chunks)
+        return self._build_response(text, language, segments, duration)
+
+    async def _transcribe_file(self, filename: str, file, language_hint: Optional[str], offset: float = 0.0, priority: Priority = Priority.TRANSCRIPTION) -> Tuple[str, str, List[TranscriptionSegment], Optional[float]]:
         params = {
-            "file": (os.path.basename(audio_path), open(audio_path, "rb").read()),
+            "file": (filename, file),
             "model": self.model_name,
             "response_format": "verbose_json",
         }
@@ -27,7 +124,15 @@ class ListenerAgent:
         if language_hint:
             params["language"] = language_hint
 
-        transcription = self.client.audio.transcriptions.create(**params)
+        async def call():
+            if hasattr(file, "seek"):
+                # Rewind in case a previous attempt consumed the buffer
+                file.seek(0)
+            async with get_semaphore("transcription"):
+                return await self.client.audio.transcriptions.create(**params)
+
+        with span("transcription"):
+            transcription = await self.scheduler.run(self.model_name, priority, call)
             
         # Groq returns a Transcription object.
         # Note: Depending on library version, attributes might be dicts or objects.
@@ -38,34 +143,43 @@ class ListenerAgent:
         
         text = getattr(transcription, 'text', "")
         language = getattr(transcription, 'language', "auto")
+        duration = getattr(transcription, 'duration', None)
         
-        segments = getattr(transcription, 'segments', [])
+        segments = []
+        for s in getattr(transcription, 'segments', None) or []:
+            # 's' could be a dict or an object
+            get = s.get if isinstance(s, dict) else lambda key, default=None: getattr(s, key, default)
+            try:
+                segments.append(TranscriptionSegment(
+                    start=float(get('start', 0.0)) + offset,
+                    end=float(get('end', 0.0)) + offset,
+                    text=(get('text', "") or "").strip(),
+                    confidence=math.exp(float(get('avg_logprob', -1.0)))
+                ))
+            except Exception as e:
+                logger.debug(f"Error reading segment: {e}")
         
-        print(f"DEBUG: Transcription success. Text length: {len(text)}")
-        
-        try:
-            if segments:
-                import math
-                total_confidence = 0.0
-                count = 0
-                for s in segments:
-                    # 's' could be a dict or an object
-                    if isinstance(s, dict):
-                        avg_logprob = s.get('avg_logprob', -1.0)
-                    else:
-                        avg_logprob = getattr(s, 'avg_logprob', -1.0)
-                        
-                    total_confidence += math.exp(avg_logprob)
-                    count += 1
-                
-                confidence = total_confidence / count if count > 0 else 0.0
-            else:
-                confidence = 0.0
-        except Exception as e:
-            print(f"DEBUG: Error calculating confidence: {e}")
-            confidence = 0.0
-
-        return text, language, confidence, self.model_name
+        logger.debug(f"Transcription success. Text length: {len(text)}")
+        return text, language, segments, duration
+
+    def _build_response(self, text: str, language: str, segments: List[TranscriptionSegment], duration: Optional[float]) -> TranscriptionResponse:
+        confidence = sum(s.confidence for s in segments) / len(segments) if segments else 0.0
+        return TranscriptionResponse(
+            text=text,
+            language=language,
+            confidence=confidence,
+            model_name=self.model_name,
+            duration=duration,
+            segments=segments
+        )
+
+def _hash_file(file) -> str:
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(1024 * 1024), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
 
 # Singleton instance initialized at app level
 listener_agent: Optional[ListenerAgent] = None
@@ -0,0 +1,292 @@
+import os
+import json
+import random
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.schemas import ClassificationResponse
+from app.utils.cache import normalize_text
+
+import logging
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_NAME = "local-centroid-v1"
+
+# Character n-gram sizes hashed into the feature vector
+NGRAM_SIZES = (2, 3, 4)
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+_HASH_SEEDS = {n: np.uint64(0x9E3779B97F4A7C15 * n % (1 << 64)) for n in NGRAM_SIZES}
+
+def featurize(text: str, dim: int) -> np.ndarray:
+    """
+    Hashes character n-grams of the normalized text into a dense, L2-normalized vector.
+    Hashing is a vectorized polynomial over code points, so it is stable across processes.
+    """
+    codes = np.frombuffer(f" {normalize_text(text)} ".encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    counts = np.zeros(dim, dtype=np.float32)
+    with np.errstate(over="ignore"):
+        for n in NGRAM_SIZES:
+            windows = len(codes) - n + 1
+            if windows <= 0:
+                continue
+            hashes = np.full(windows, _HASH_SEEDS[n], dtype=np.uint64)
+            for offset in range(n):
+                hashes = hashes * _HASH_MULTIPLIER + codes[offset:offset + windows]
+            counts += np.bincount((hashes >> np.uint64(16)) % np.uint64(dim), minlength=dim).astype(np.float32)
+    features = np.log1p(counts)
+    norm = np.linalg.norm(features)
+    return features / norm if norm > 0 else features
+
+class LocalClassifier:
+    """
+    CPU-only first-pass classifier: cosine similarity between hashed n-gram
+    features and per-label centroids learned from past LLM answers.
+    """
+    def __init__(self, labels: List[str], centroids: np.ndarray, dim: int, temperature: float = 0.05):
+        self.labels = labels
+        self.label_index = {label: i for i, label in enumerate(labels)}
+        self.centroids = centroids
+        self.dim = dim
+        self.temperature = temperature
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], dim: int = 1 << 14) -> "LocalClassifier":
+        labels = sorted({label for _, label in examples})
+        index = {label: i for i, label in enumerate(labels)}
+        centroids = np.zeros((len(labels), dim), dtype=np.float32)
+        for text, label in examples:
+            centroids[index[label]] += featurize(text, dim)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms > 0, norms, 1.0)
+        return cls(labels, centroids, dim, temperature=_fit_temperature(examples, labels, centroids, dim))
+
+    @classmethod
+    def load(cls, path: str) -> "LocalClassifier":
+        data = np.load(path, allow_pickle=False)
+        return cls(
+            labels=[str(label) for label in data["labels"]],
+            centroids=data["centroids"].astype(np.float32),
+            dim=int(data["dim"]),
+            temperature=float(data["temperature"])
+        )
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                labels=np.array(self.labels),
+                centroids=self.centroids,
+                dim=np.array(self.dim),
+                temperature=np.array(self.temperature)
+            )
+
+    def score(self, text: str, labels: List[str]) -> Optional[Dict[str, float]]:
+        """Returns a probability per requested label, or None if any label was never seen in training."""
+        rows = [self.label_index.get(label) for label in labels]
+        if not rows or any(row is None for row in rows):
+            return None
+        similarities = self.centroids[rows] @ featurize(text, self.dim)
+        logits = similarities / self.temperature
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        return {label: float(p) for label, p in zip(labels, probabilities)}
+
+def _fit_temperature(examples: List[Tuple[str, str]], labels: List[str], centroids: np.ndarray, dim: int) -> float:
+    """Picks the softmax temperature that minimizes log-loss, so confidences are roughly calibrated."""
+    if len(labels) < 2:
+        return 0.05
+    features = np.stack([featurize(text, dim) for text, _ in examples])
+    targets = np.array([labels.index(label) for _, label in examples])
+    similarities = features @ centroids.T
+    best_temperature, best_loss = 0.05, float("inf")
+    for temperature in (0.002, 0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1):
+        logits = similarities / temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        log_probabilities = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+        loss = -log_probabilities[np.arange(len(targets)), targets].mean()
+        if loss < best_loss:
+            best_temperature, best_loss = temperature, loss
+    return best_temperature
+
+class CascadeStats:
+    """Counters describing how often the local classifier answers and how well it agrees with the LLM."""
+    def __init__(self):
+        self.local_hits = 0
+        self.escalations = Counter()
+        self.comparisons = 0
+        self.agreements = 0
+
+    def record_comparison(self, local_label: str, llm_label: str):
+        self.comparisons += 1
+        if local_label == llm_label:
+            self.agreements += 1
+
+    def report(self) -> Dict:
+        escalated = sum(self.escalations.values())
+        total = self.local_hits + escalated
+        return {
+            "requests": total,
+            "local_hits": self.local_hits,
+            "hit_rate": self.local_hits / total if total else 0.0,
+            "escalations": dict(self.escalations),
+            "llm_comparisons": self.comparisons,
+            "llm_agreement": self.agreements / self.comparisons if self.comparisons else None,
+        }
+
+class ClassifierCascade:
+    """
+    Answers a classification locally when confident, otherwise tells the caller to escalate to the LLM.
+    """
+    def __init__(self, model: Optional[LocalClassifier], threshold: float = 0.8, shadow_rate: float = 0.0):
+        self.model = model
+        self.threshold = threshold
+        self.shadow_rate = shadow_rate
+        self.stats = CascadeStats()
+
+    def predict(self, text: str, labels: List[str], multi_label: bool = False) -> Tuple[Optional[ClassificationResponse], Optional[str]]:
+        """
+        Returns (response, None) when the local model is confident,
+        or (None, best_local_label_or_None) when the request must go to the LLM.
+        """
+        if self.model is None:
+            self.stats.escalations["disabled"] += 1
+            return None, None
+        if multi_label:
+            self.stats.escalations["multi_label"] += 1
+            return None, None
+        scores = self.model.score(text, labels)
+        if scores is None:
+            self.stats.escalations["unknown_label"] += 1
+            return None, None
+        top_label = max(scores, key=scores.get)
+        if scores[top_label] < self.threshold:
+            self.stats.escalations["low_confidence"] += 1
+            return None, top_label
+        self.stats.local_hits += 1
+        return ClassificationResponse(top_label=top_label, scores=scores, model_name=LOCAL_MODEL_NAME), None
+
+    def should_shadow(self) -> bool:
+        return self.shadow_rate > 0 and random.random() < self.shadow_rate
+
+# Singleton instance
+classifier_cascade: Optional[ClassifierCascade] = None
+
+def get_classifier_cascade() -> ClassifierCascade:
+    global classifier_cascade
+    if classifier_cascade is None:
+        model = None
+        model_path = os.getenv("LOCAL_CLASSIFIER_MODEL")
+        if model_path and os.path.exists(model_path):
+            try:
+                model = LocalClassifier.load(model_path)
+                logger.info(f"Loaded local classifier with {len(model.labels)} labels from {model_path}")
+            except Exception as e:
+                logger.error(f"Could not load local classifier {model_path}: {e}")
+        classifier_cascade = ClassifierCascade(
+            model,
+            threshold=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8")),
+            shadow_rate=float(os.getenv("LOCAL_CLASSIFIER_SHADOW_RATE", "0.0"))
+        )
+    return classifier_cascade
+
+_log_lock = threading.Lock()
+
+def _append_example(path: str, record: Dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _log_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+async def record_example(text: str, labels: List[str], top_label: str, model_name: str):
+    """Appends an LLM-labelled example to CLASSIFIER_TRAINING_LOG (if configured) for later training."""
+    path = os.getenv("CLASSIFIER_TRAINING_LOG")
+    if not path or top_label not in labels:
+        return
+    record = {"text": text, "labels": labels, "top_label": top_label, "model_name": model_name}
+    try:
+        await asyncio.to_thread(_append_example, path, record)
+    except Exception as e:
+        logger.error(f"Could not record training example: {e}")
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    """Reads LLM-labelled examples written to CLASSIFIER_TRAINING_LOG."""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("text") and record.get("top_label"):
+                examples.append((record["text"], record["top_label"]))
+    return examples
+
+def evaluate(model: LocalClassifier, examples: List[Tuple[str, str]], threshold: float) -> Dict:
+    """Measures cascade hit rate and agreement with the LLM labels on held-out examples."""
+    hits = agreements_on_hits = agreements = 0
+    for text, llm_label in examples:
+        scores = model.score(text, model.labels)
+        top_label = max(scores, key=scores.get)
+        agreements += top_label == llm_label
+        if scores[top_label] >= threshold:
+            hits += 1
+            agreements_on_hits += top_label == llm_label
+    total = len(examples)
+    return {
+        "examples": total,
+        "threshold": threshold,
+        "hit_rate": hits / total if total else 0.0,
+        "agreement_on_hits": agreements_on_hits / hits if hits else None,
+        "agreement_overall": agreements / total if total else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or evaluate the local first-pass classifier.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    train_cmd = subcommands.add_parser("train", help="Learn label centroids from LLM-labelled outputs")
+    train_cmd.add_argument("--data", default=os.getenv("CLASSIFIER_TRAINING_LOG", "data/classifications.jsonl"))
+    train_cmd.add_argument("--out", default=os.getenv("LOCAL_CLASSIFIER_MODEL", "data/local_classifier.npz"))
+    train_cmd.add_argument("--dim", type=int, default=1 << 14)
+    train_cmd.add_argument("--holdout", type=float, default=0.2)
+    train_cmd.add_argument("--threshold", type=float, default=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8")))
+
+    report_cmd = subcommands.add_parser("report", help="Report hit rate and LLM agreement of a trained model")
+    report_cmd.add_argument("--data", default=os.getenv("CLASSIFIER_TRAINING_LOG", "data/classifications.jsonl"))
+    report_cmd.add_argument("--model", default=os.getenv("LOCAL_CLASSIFIER_MODEL", "data/local_classifier.npz"))
+    report_cmd.add_argument("--threshold", type=float, default=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8")))
+
+    args = parser.parse_args()
+    examples = load_examples(args.data)
+    if not examples:
+        raise SystemExit(f"No labelled examples found in {args.data}")
+
+    if args.command == "train":
+        random.Random(0).shuffle(examples)
+        split = int(len(examples) * (1 - args.holdout)) if len(examples) > 1 else len(examples)
+        train_set, holdout_set = examples[:split], examples[split:]
+        model = LocalClassifier.train(train_set, dim=args.dim)
+        if holdout_set:
+            print(json.dumps(evaluate(model, holdout_set, args.threshold), indent=2))
+        # Refit on everything before saving
+        model = LocalClassifier.train(examples, dim=args.dim)
+        model.save(args.out)
+        print(f"Saved {len(model.labels)} labels trained on {len(examples)} examples to {args.out}")
+    else:
+        model = LocalClassifier.load(args.model)
+        print(json.dumps(evaluate(model, examples, args.threshold), indent=2))
+
+if __name__ == "__main__":
+    main()
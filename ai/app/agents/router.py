@@ -0,0 +1,240 @@
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, TypeVar
+
+from app.utils.scheduler import Priority
+from app.utils.deadline import DeadlineExceeded
+
+import logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Outcomes older than this no longer influence routing, so a model that recovers is tried again
+WINDOW_SECONDS = 300.0
+WINDOW_SIZE = 256
+
+# Cancellation message for the slower call of a hedged pair once the other answered
+_HEDGE_LOST = "hedge lost"
+
+class _Window:
+    """Recent (time, latency or None on error) outcomes of one model on one task."""
+    def __init__(self):
+        self.samples: Deque[Tuple[float, Optional[float]]] = deque(maxlen=WINDOW_SIZE)
+
+    def add(self, latency: Optional[float]):
+        self.samples.append((time.monotonic(), latency))
+
+    def recent(self) -> List[Optional[float]]:
+        cutoff = time.monotonic() - WINDOW_SECONDS
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return [latency for _, latency in self.samples]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        outcomes = self.recent()
+        latencies = sorted(latency for latency in outcomes if latency is not None)
+        return {
+            "samples": len(outcomes),
+            "error_rate": (len(outcomes) - len(latencies)) / len(outcomes) if outcomes else 0.0,
+            "p50": _quantile(latencies, 0.5),
+            "p95": _quantile(latencies, 0.95),
+            "successes": len(latencies),
+        }
+
+def _quantile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+class ModelRouter:
+    """
+    Picks the Groq model for each LLM call and hedges slow ones.
+    Short calls of the `fast_tasks` (none by default) go to the small, cheaper model; everything else to the primary.
+    A model with a high recent error rate is passed over. So is one whose median latency exceeds the other
+    model's p95, when that other model is the primary or the task is one of the fast tasks. Interactive calls still running at the model's p95 for the task get a duplicate
+    on the other model and the first answer wins, within a budget of `hedge_budget` of all calls.
+    """
+    def __init__(
+        self,
+        primary: str,
+        fast: Optional[str] = None,
+        fast_tasks: Optional[Set[str]] = None,
+        fast_max_tokens: int = 1000,
+        max_error_rate: float = 0.25,
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.05,
+        hedge_budget: float = 0.1
+    ):
+        self.primary = primary
+        self.fast = fast if fast and fast != primary else None
+        # Opt-in: without fast tasks the fast model only serves hedges and reroutes
+        self.fast_tasks = fast_tasks or set()
+        self.fast_max_tokens = fast_max_tokens
+        self.max_error_rate = max_error_rate
+        self.hedge = hedge and self.fast is not None
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+        self.windows: Dict[Tuple[str, str], _Window] = {}
+        self.calls: Deque[float] = deque(maxlen=4096)
+        self.hedge_times: Deque[float] = deque(maxlen=4096)
+        self.routed: Dict[str, int] = {}
+        self.rerouted = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def models(self) -> List[str]:
+        return [self.primary] + ([self.fast] if self.fast else [])
+
+    def _window(self, model: str, task: str) -> _Window:
+        key = (model, task)
+        if key not in self.windows:
+            self.windows[key] = _Window()
+        return self.windows[key]
+
+    def other(self, model: str) -> Optional[str]:
+        if not self.fast:
+            return None
+        return self.fast if model == self.primary else self.primary
+
+    def preferred(self, task: str, prompt_tokens: int) -> str:
+        """The model a call of `task` goes to by configuration alone, before health and latency are considered."""
+        return self.fast if self.fast and task in self.fast_tasks and prompt_tokens <= self.fast_max_tokens else self.primary
+
+    def choose(self, task: str, prompt_tokens: int) -> str:
+        """Model for a call of `task` with a prompt of about `prompt_tokens` tokens."""
+        preferred = self.preferred(task, prompt_tokens)
+        model = preferred
+        alternative = self.other(preferred)
+        if alternative:
+            mine = self._window(preferred, task).summary()
+            theirs = self._window(alternative, task).summary()
+            if mine["samples"] >= self.hedge_min_samples and mine["error_rate"] > self.max_error_rate and theirs["error_rate"] <= self.max_error_rate:
+                model = alternative
+            elif self._may_reroute_for_latency(task, alternative) and mine["p50"] is not None and theirs["p95"] is not None \
+                    and theirs["successes"] >= self.hedge_min_samples and mine["p50"] > theirs["p95"]:
+                model = alternative
+        if model != preferred:
+            self.rerouted += 1
+        self.routed[f"{task}:{model}"] = self.routed.get(f"{task}:{model}", 0) + 1
+        return model
+
+    def _may_reroute_for_latency(self, task: str, alternative: str) -> bool:
+        # Slowness alone never moves a task off the primary unless it opted into the fast model;
+        # only the error-rate failover does
+        return alternative == self.primary or task in self.fast_tasks
+
+    def hedge_delay(self, model: str, task: str) -> Optional[float]:
+        """Seconds after which a call to `model` should be hedged, or None when it should not be."""
+        if not self.hedge:
+            return None
+        latencies = sorted(latency for latency in self._window(model, task).recent() if latency is not None)
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        now = time.monotonic()
+        cutoff = now - WINDOW_SECONDS
+        while self.hedge_times and self.hedge_times[0] < cutoff:
+            self.hedge_times.popleft()
+        while self.calls and self.calls[0] < cutoff:
+            self.calls.popleft()
+        if len(self.hedge_times) >= self.hedge_budget * max(1, len(self.calls)):
+            return None
+        return max(self.hedge_min_delay, _quantile(latencies, self.hedge_quantile))
+
+    async def run(self, model: str, task: str, priority: Priority, call: Callable[[str], Awaitable[T]]) -> Tuple[T, str]:
+        """
+        Runs `call(model)`, hedging to the other model once the call is slower than usual.
+        Returns the result and the model that produced it. Batch work is never hedged.
+        """
+        self.calls.append(time.monotonic())
+        alternative = self.other(model)
+        delay = self.hedge_delay(model, task) if alternative and priority < Priority.BATCH else None
+        if delay is None:
+            return await self._timed(model, task, call), model
+
+        first = asyncio.create_task(self._timed(model, task, call))
+        tasks = {first: model}
+        answered = False
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if not done:
+                self.hedges += 1
+                self.hedge_times.append(time.monotonic())
+                logger.debug(f"Hedging {task} call to {alternative} after {delay * 1000:.0f}ms on {model}")
+                tasks[asyncio.create_task(self._timed(alternative, task, call))] = alternative
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task_done in done:
+                    if task_done.exception() is None:
+                        if task_done is not first:
+                            self.hedge_wins += 1
+                        answered = True
+                        return task_done.result(), tasks[task_done]
+                    # Keep the primary's error if both fail
+                    if error is None or task_done is first:
+                        error = task_done.exception()
+            raise error
+        finally:
+            for task_pending in tasks:
+                if not task_pending.done():
+                    # Only a call that lost the race says something about its model's latency
+                    task_pending.cancel(_HEDGE_LOST if answered else None)
+
+    async def _timed(self, model: str, task: str, call: Callable[[str], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError as e:
+            # Lost a hedge race: it took at least this long. Other cancellations (client gone,
+            # request deadline) can come at any time and are not recorded
+            if e.args == (_HEDGE_LOST,):
+                self._window(model, task).add(time.perf_counter() - started)
+            raise
+        except DeadlineExceeded:
+            # The caller ran out of time; says nothing about the model
+            raise
+        except Exception:
+            self._window(model, task).add(None)
+            raise
+        self._window(model, task).add(time.perf_counter() - started)
+        return result
+
+    def healthy(self, model: str, task: str) -> str:
+        """`model`, or the other model if `model` is failing, for calls that cannot be hedged (streams)."""
+        alternative = self.other(model)
+        if alternative:
+            mine = self._window(model, task).summary()
+            if mine["samples"] >= self.hedge_min_samples and mine["error_rate"] > self.max_error_rate:
+                return alternative
+        return model
+
+    def stats(self) -> Dict[str, object]:
+        windows = {}
+        for (model, task), window in self.windows.items():
+            summary = window.summary()
+            if not summary["samples"]:
+                continue
+            windows.setdefault(model, {})[task] = {
+                "samples": summary["samples"],
+                "error_rate": round(summary["error_rate"], 3),
+                "p50_ms": round(summary["p50"] * 1000, 1) if summary["p50"] is not None else None,
+                "p95_ms": round(summary["p95"] * 1000, 1) if summary["p95"] is not None else None,
+            }
+        return {
+            "primary": self.primary,
+            "fast": self.fast,
+            "fast_tasks": sorted(self.fast_tasks),
+            "routed": dict(self.routed),
+            "rerouted": self.rerouted,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "models": windows,
+        }
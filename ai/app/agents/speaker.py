@@ -1,53 +1,111 @@
 import os
+import sys
 import base64
+import asyncio
 from io import BytesIO
+from typing import AsyncIterator, Optional
 from gtts import gTTS
 import logging
 
+from app.phrases import all_phrases
+from app.languages import LANGUAGES, tts_code
+from app.utils.concurrency import run_blocking
+from app.utils.metrics import span, record_fallback
+from app.utils.text import split_sentences
+from app.utils.tts_cache import get_tts_cache
+
 logger = logging.getLogger(__name__)
 
+
 class SpeakerAgent:
     def __init__(self):
-        pass
+        self.cache = get_tts_cache()
 
-    def text_to_speech(self, text: str, language: str = "en") -> str:
+    async def text_to_speech(self, text: str, language: str = "en") -> Optional[str]:
         """
         Converts text to speech and returns base64 encoded audio.
         """
         try:
-            # Map full language names to gTTS codes
-            lang_map = {
-                "English": "en",
-                "Hindi": "hi",
-                "Bengali": "bn",
-                "Tamil": "ta",
-                "Telugu": "te",
-                "Marathi": "mr",
-                "Gujarati": "gu",
-                "Kannada": "kn",
-                "Malayalam": "ml",
-                "Urdu": "ur"
-            }
-            lang_code = lang_map.get(language, "en")
-            
-            # Generate speech
-            tts = gTTS(text=text, lang=lang_code, slow=False)
-            
-            # Save to memory
-            mp3_fp = BytesIO()
-            tts.write_to_fp(mp3_fp)
-            mp3_fp.seek(0)
+            audio_bytes = await self.synthesize(text, language)
             
             # Encode to base64
-            audio_base64 = base64.b64encode(mp3_fp.read()).decode("utf-8")
+            with span("base64"):
+                audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
             return audio_base64
             
         except Exception as e:
             logger.error(f"TTS Error: {e}")
+            record_fallback("tts")
             return None
 
+    async def synthesize(self, text: str, language: str = "en") -> bytes:
+        """
+        Returns MP3 audio for the text. The reply is split into sentences, only
+        sentences missing from the TTS cache are synthesized (concurrently, on the
+        bounded TTS pool since gTTS does blocking network I/O), and the MP3
+        segments are concatenated in order.
+        """
+        lang_code = tts_code(language)
+        sentences = split_sentences(text) or [text]
+        segments = await asyncio.gather(*(self._sentence_audio(sentence, lang_code) for sentence in sentences))
+        return b"".join(segments)
+
+    async def synthesize_stream(self, text: str, language: str = "en") -> AsyncIterator[bytes]:
+        """
+        Yields MP3 segments in sentence order as soon as each is ready.
+        All sentences are synthesized concurrently; the first bytes go out after the first sentence.
+        """
+        lang_code = tts_code(language)
+        sentences = split_sentences(text) or [text]
+        tasks = [asyncio.create_task(self._sentence_audio(sentence, lang_code)) for sentence in sentences]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _sentence_audio(self, sentence: str, lang_code: str) -> bytes:
+        audio = await self.cache.get(sentence, lang_code)
+        if audio is None:
+            with span("tts"):
+                audio = await run_blocking("tts", self._synthesize, sentence, lang_code)
+            await self.cache.set(sentence, lang_code, audio)
+        return audio
+
+    def _synthesize(self, text: str, lang_code: str) -> bytes:
+        # Generate speech
+        tts = gTTS(text=text, lang=lang_code, slow=False)
+        
+        # Save to memory
+        mp3_fp = BytesIO()
+        tts.write_to_fp(mp3_fp)
+        return mp3_fp.getvalue()
+
+    async def warm_up(self) -> int:
+        """Pre-renders the persona's fixed phrases for every supported language. Returns how many are cached."""
+        cached = 0
+        for language in LANGUAGES:
+            if not language.tts:
+                continue
+            for phrase in all_phrases(language.name):
+                for sentence in split_sentences(phrase):
+                    try:
+                        await self._sentence_audio(sentence, language.tts)
+                        cached += 1
+                    except Exception as e:
+                        logger.error(f"TTS warm-up failed for {language.name}: {e}")
+        return cached
+
 # Singleton
 speaker_agent = SpeakerAgent()
 
 def get_speaker_agent() -> SpeakerAgent:
     return speaker_agent
+
+if __name__ == "__main__":
+    # python -m app.agents.speaker warmup
+    if sys.argv[1:] != ["warmup"]:
+        raise SystemExit("Usage: python -m app.agents.speaker warmup")
+    count = asyncio.run(get_speaker_agent().warm_up())
+    print(f"Cached {count} phrase(s) in {os.getenv('TTS_CACHE_DIR', 'tts_cache')}")
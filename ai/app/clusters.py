@@ -0,0 +1,454 @@
+import os
+import json
+import time
+import uuid
+import heapq
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.cache import normalize_text
+from app.utils.shared_state import connect, shared_path
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Character n-gram size for shingles; 4-grams survive reordering ("main road pothole" / "pothole on main road")
+SHINGLE_SIZE = 4
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+_HASH_SEED = np.uint64(0xCBF29CE484222325)
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Most LSH candidates scored exactly per lookup
+MAX_CANDIDATES = 64
+# Entries remembered per LSH bucket; the newest reports of a popular cluster are enough to find it
+MAX_BUCKET_SIZE = 32
+
+def _shingles(text: str) -> np.ndarray:
+    """Unique 32-bit hashes of the character n-grams of the normalized text."""
+    codes = np.frombuffer(f" {normalize_text(text)} ".encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    windows = len(codes) - SHINGLE_SIZE + 1
+    if windows <= 0:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.full(windows, _HASH_SEED, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for offset in range(SHINGLE_SIZE):
+            hashes = hashes * _HASH_MULTIPLIER + codes[offset:offset + windows]
+    return np.unique(hashes >> np.uint64(32))
+
+def labels_key(labels: List[str], multi_label: bool = False) -> str:
+    """Analyses are only reused between requests that asked for the same labels."""
+    return json.dumps([sorted(label.strip() for label in labels), multi_label])
+
+class _Entry:
+    __slots__ = ("entry_id", "cluster_id", "signature", "added_at", "text", "location_hint", "labels_key", "analysis")
+
+    def __init__(self, entry_id, cluster_id, signature, added_at, text, location_hint, labels_key, analysis):
+        self.entry_id = entry_id
+        self.cluster_id = cluster_id
+        self.signature = signature
+        self.added_at = added_at
+        self.text = text
+        self.location_hint = location_hint
+        self.labels_key = labels_key
+        self.analysis = analysis
+
+class ClusterMatch:
+    """The closest recent complaint to a new one."""
+    def __init__(self, cluster_id: str, similarity: float, analysis: Optional[Dict[str, Any]] = None):
+        self.cluster_id = cluster_id
+        self.similarity = similarity
+        # The prior analysis, when similar enough to reuse and asked with the same labels
+        self.analysis = analysis
+
+class ComplaintIndex:
+    """
+    In-process near-duplicate index over recent complaints: MinHash signatures of character
+    n-grams of the text, bucketed by LSH bands so a lookup only compares against likely duplicates.
+    Location hints are kept beside the signature and compared on their own. Entries older than
+    `window_seconds` are evicted.
+    """
+    def __init__(
+        self,
+        window_seconds: float = 72 * 3600,
+        max_entries: int = 50000,
+        num_perm: int = 64,
+        bands: int = 16,
+        match_threshold: float = 0.5,
+        reuse_threshold: float = 0.8,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.match_threshold = match_threshold
+        self.reuse_threshold = reuse_threshold
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self.clusters: Dict[str, List[str]] = {}
+        self.dirty = False
+        # New entries not yet written to the shared log; None when the index is not shared
+        self.outbox: Optional[List[_Entry]] = None
+        self.lookups = 0
+        self.matches = 0
+        self.reuses = 0
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        # Text only: lookups happen before the LLM has supplied a location hint
+        shingles = _shingles(text)
+        if not len(shingles):
+            return None
+        # a, b and the shingles are below 2**32, so a * x + b fits in 64 bits
+        return ((self._a * shingles + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _nearest(self, signature: np.ndarray) -> Optional[Tuple[_Entry, float]]:
+        collisions: Dict[str, int] = {}
+        for band, key in enumerate(self._band_keys(signature)):
+            for entry_id in self.buckets[band].get(key, ()):
+                collisions[entry_id] = collisions.get(entry_id, 0) + 1
+        if not collisions:
+            return None
+        # Shared bands track similarity, so only the most-colliding candidates are scored; this keeps
+        # lookups fast even when a popular cluster holds thousands of reports
+        candidates = heapq.nlargest(MAX_CANDIDATES, collisions, key=collisions.get) if len(collisions) > MAX_CANDIDATES else collisions
+        entries = [self.entries[entry_id] for entry_id in candidates]
+        similarities = (np.stack([entry.signature for entry in entries]) == signature).mean(axis=1)
+        best = int(similarities.argmax())
+        return entries[best], float(similarities[best])
+
+    def match(self, text: str, labels_key: Optional[str] = None, location_hint: Optional[str] = None) -> Optional[ClusterMatch]:
+        """
+        Finds the cluster of the most similar recent complaint, if it is similar enough. Its analysis is
+        offered for reuse only when the labels match and, if `location_hint` is known, the locations agree.
+        """
+        self.evict()
+        self.lookups += 1
+        signature = self.signature(text)
+        nearest = self._nearest(signature) if signature is not None else None
+        if nearest is None or nearest[1] < self.match_threshold:
+            return None
+        entry, similarity = nearest
+        self.matches += 1
+        analysis = None
+        if entry.analysis is not None and similarity >= self.reuse_threshold and entry.labels_key == labels_key \
+                and _same_location(location_hint, entry.location_hint):
+            analysis = entry.analysis
+            self.reuses += 1
+        return ClusterMatch(entry.cluster_id, similarity, analysis)
+
+    def add(
+        self,
+        text: str,
+        location_hint: Optional[str] = None,
+        labels_key: Optional[str] = None,
+        analysis: Optional[Dict[str, Any]] = None,
+        added_at: Optional[float] = None
+    ) -> Tuple[Optional[str], float]:
+        """
+        Indexes a complaint, joining the cluster of its nearest neighbour or starting a new one.
+        `analysis` is kept for reuse by later duplicates. Returns (cluster_id, similarity to the neighbour).
+        """
+        self.evict()
+        signature = self.signature(text)
+        if signature is None:
+            return None, 0.0
+        nearest = self._nearest(signature)
+        if nearest is not None and nearest[1] >= self.match_threshold:
+            cluster_id, similarity = nearest[0].cluster_id, nearest[1]
+        else:
+            cluster_id, similarity = uuid.uuid4().hex, 0.0
+        entry = _Entry(
+            uuid.uuid4().hex, cluster_id, signature, added_at or time.time(),
+            text[:500], location_hint, labels_key, analysis
+        )
+        self._insert(entry)
+        if self.outbox is not None:
+            self.outbox.append(entry)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+        return cluster_id, similarity
+
+    def replay(self, entries: List[_Entry]) -> int:
+        """Inserts entries added by other workers (skipping ones already indexed). Returns how many were new."""
+        cutoff = time.time() - self.window_seconds
+        added = 0
+        for entry in entries:
+            if entry.entry_id in self.entries or entry.added_at < cutoff:
+                continue
+            self._insert(entry)
+            added += 1
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+        return added
+
+    def _insert(self, entry: _Entry):
+        self.entries[entry.entry_id] = entry
+        for band, key in enumerate(self._band_keys(entry.signature)):
+            bucket = self.buckets[band].setdefault(key, [])
+            bucket.append(entry.entry_id)
+            if len(bucket) > MAX_BUCKET_SIZE:
+                del bucket[0]
+        self.clusters.setdefault(entry.cluster_id, []).append(entry.entry_id)
+        self.dirty = True
+
+    def _remove(self, entry_id: str):
+        entry = self.entries.pop(entry_id)
+        for band, key in enumerate(self._band_keys(entry.signature)):
+            bucket = self.buckets[band].get(key)
+            if bucket and entry_id in bucket:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del self.buckets[band][key]
+        members = self.clusters[entry.cluster_id]
+        members.remove(entry_id)
+        if not members:
+            del self.clusters[entry.cluster_id]
+        self.dirty = True
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Drops complaints older than the window; entries are kept in insertion (time) order."""
+        cutoff = (now or time.time()) - self.window_seconds
+        removed = 0
+        while self.entries:
+            oldest = next(iter(self.entries.values()))
+            if oldest.added_at >= cutoff:
+                break
+            self._remove(oldest.entry_id)
+            removed += 1
+        return removed
+
+    def cluster(self, cluster_id: str) -> Optional[Dict[str, Any]]:
+        self.evict()
+        members = self.clusters.get(cluster_id)
+        if not members:
+            return None
+        entries = [self.entries[entry_id] for entry_id in members]
+        return {
+            "cluster_id": cluster_id,
+            "size": len(entries),
+            "first_seen": entries[0].added_at,
+            "last_seen": entries[-1].added_at,
+            "complaints": [
+                {"text": entry.text, "location_hint": entry.location_hint, "added_at": entry.added_at}
+                for entry in entries
+            ],
+        }
+
+    def cluster_size(self, cluster_id: Optional[str]) -> int:
+        return len(self.clusters.get(cluster_id, ())) if cluster_id else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "clusters": len(self.clusters),
+            "duplicate_clusters": sum(1 for members in self.clusters.values() if len(members) > 1),
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "reuses": self.reuses,
+            "window_seconds": self.window_seconds,
+        }
+
+    def _params(self) -> Dict[str, int]:
+        # "basis" changed when location hints were taken out of signatures; older snapshots and logs are discarded
+        return {"num_perm": self.num_perm, "bands": self.bands, "seed": self.seed, "shingle_size": SHINGLE_SIZE, "basis": "text"}
+
+    def snapshot_arrays(self) -> Dict[str, np.ndarray]:
+        """Copies the index into arrays for save(), so the write can happen off the event loop."""
+        entries = list(self.entries.values())
+        records = [
+            [entry.entry_id, entry.cluster_id, entry.text, entry.location_hint, entry.labels_key, entry.analysis]
+            for entry in entries
+        ]
+        self.dirty = False
+        return {
+            "signatures": np.stack([entry.signature for entry in entries]) if entries else np.empty((0, self.num_perm), dtype=np.uint64),
+            "added_at": np.array([entry.added_at for entry in entries], dtype=np.float64),
+            "records": np.array(json.dumps(records, ensure_ascii=False)),
+            "params": np.array(json.dumps(self._params())),
+        }
+
+    @staticmethod
+    def save(path: str, arrays: Dict[str, np.ndarray]):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write then rename, so a crash mid-write never leaves a truncated snapshot
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+
+    def restore(self, path: str) -> int:
+        """Loads a snapshot written by save(); expired entries are skipped. Returns how many were restored."""
+        data = np.load(path, allow_pickle=False)
+        if json.loads(str(data["params"])) != self._params():
+            logger.warning(f"Ignoring complaint index snapshot {path}: built with different parameters")
+            return 0
+        cutoff = time.time() - self.window_seconds
+        restored = 0
+        for signature, added_at, record in zip(data["signatures"], data["added_at"], json.loads(str(data["records"]))):
+            if added_at < cutoff:
+                continue
+            entry_id, cluster_id, text, location_hint, key, analysis = record
+            self._insert(_Entry(entry_id, cluster_id, signature, float(added_at), text, location_hint, key, analysis))
+            restored += 1
+        self.dirty = False
+        return restored
+
+def _same_location(wanted: Optional[str], stored: Optional[str]) -> bool:
+    """Unknown on either side does not prevent reuse."""
+    return not wanted or not stored or normalize_text(wanted) == normalize_text(stored)
+
+class ComplaintLog:
+    """
+    Complaints indexed by any worker process, in a shared SQLite table. Every worker writes the
+    entries it adds and replays the ones others added, so all of them cluster against the same
+    reports. The table also outlives restarts, taking the place of snapshots.
+    """
+    def __init__(self, db_path: str, params: Dict[str, int]):
+        self.lock = threading.Lock()
+        self.conn = connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS complaints (seq INTEGER PRIMARY KEY AUTOINCREMENT, entry_id TEXT NOT NULL, "
+            "cluster_id TEXT NOT NULL, signature BLOB NOT NULL, added_at REAL NOT NULL, text TEXT, location_hint TEXT, "
+            "labels_key TEXT, analysis TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS complaints_added_at ON complaints (added_at)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('params', ?)", (json.dumps(params),))
+        stored = self.conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()[0]
+        if json.loads(stored) != params:
+            logger.warning(f"Clearing shared complaint log {db_path}: built with different parameters")
+            self.conn.execute("DELETE FROM complaints")
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'params'", (json.dumps(params),))
+        self.conn.commit()
+        self.last_seq = 0
+
+    def exchange(self, outgoing: List[_Entry], cutoff: float) -> List[_Entry]:
+        """Writes `outgoing` and returns every entry newer than `cutoff` written since the last call."""
+        with self.lock:
+            if outgoing:
+                self.conn.executemany(
+                    "INSERT INTO complaints (entry_id, cluster_id, signature, added_at, text, location_hint, labels_key, analysis) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (entry.entry_id, entry.cluster_id, entry.signature.astype(np.uint64).tobytes(), entry.added_at,
+                         entry.text, entry.location_hint, entry.labels_key,
+                         json.dumps(entry.analysis, ensure_ascii=False) if entry.analysis is not None else None)
+                        for entry in outgoing
+                    ]
+                )
+                self.conn.commit()
+            rows = self.conn.execute(
+                "SELECT seq, entry_id, cluster_id, signature, added_at, text, location_hint, labels_key, analysis "
+                "FROM complaints WHERE seq > ? AND added_at >= ? ORDER BY seq",
+                (self.last_seq, cutoff)
+            ).fetchall()
+        if rows:
+            self.last_seq = rows[-1][0]
+        return [
+            _Entry(entry_id, cluster_id, np.frombuffer(signature, dtype=np.uint64), added_at, text, location_hint,
+                   key, json.loads(analysis) if analysis else None)
+            for _, entry_id, cluster_id, signature, added_at, text, location_hint, key, analysis in rows
+        ]
+
+    def trim(self, cutoff: float) -> int:
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM complaints WHERE added_at < ?", (cutoff,))
+            self.conn.commit()
+            return cursor.rowcount
+
+# Singleton instance; None when clustering is disabled
+complaint_index: Optional[ComplaintIndex] = None
+# Shared with the other worker processes, when configured (CLUSTER_SHARED_DB, or several workers)
+complaint_log: Optional[ComplaintLog] = None
+_index_loaded = False
+
+def get_complaint_index() -> Optional[ComplaintIndex]:
+    global complaint_index, complaint_log, _index_loaded
+    if not _index_loaded:
+        _index_loaded = True
+        window_hours = float(os.getenv("CLUSTER_WINDOW_HOURS", "72"))
+        if window_hours <= 0:
+            return None
+        complaint_index = ComplaintIndex(
+            window_seconds=window_hours * 3600,
+            max_entries=int(os.getenv("CLUSTER_MAX_ENTRIES", "50000")),
+            match_threshold=float(os.getenv("CLUSTER_MATCH_THRESHOLD", "0.5")),
+            reuse_threshold=float(os.getenv("CLUSTER_REUSE_THRESHOLD", "0.8"))
+        )
+        log_path = shared_path("CLUSTER_SHARED_DB", "clusters.sqlite3")
+        snapshot_path = os.getenv("CLUSTER_SNAPSHOT_PATH")
+        if log_path:
+            try:
+                complaint_log = ComplaintLog(log_path, complaint_index._params())
+                complaint_index.outbox = []
+                restored = complaint_index.replay(complaint_log.exchange([], time.time() - complaint_index.window_seconds))
+                logger.info(f"Loaded {restored} complaints from shared log {log_path}")
+            except Exception as e:
+                complaint_log = None
+                logger.error(f"Could not open shared complaint log {log_path}: {e}")
+        elif snapshot_path and os.path.exists(snapshot_path):
+            try:
+                restored = complaint_index.restore(snapshot_path)
+                logger.info(f"Restored {restored} complaints from {snapshot_path}")
+            except Exception as e:
+                logger.error(f"Could not restore complaint index {snapshot_path}: {e}")
+    return complaint_index
+
+async def sync_complaint_index():
+    """Publishes this worker's new complaints to the shared log and loads the other workers' (no-op when not shared)."""
+    index = get_complaint_index()
+    if index is None or complaint_log is None:
+        return
+    outgoing, index.outbox = index.outbox, []
+    try:
+        incoming = await asyncio.to_thread(complaint_log.exchange, outgoing, time.time() - index.window_seconds)
+    except Exception as e:
+        # Keep them for the next attempt
+        index.outbox = outgoing + index.outbox
+        logger.error(f"Could not sync the shared complaint log: {e}")
+        return
+    index.replay(incoming)
+
+async def save_complaint_index():
+    """Writes the index to CLUSTER_SNAPSHOT_PATH if it changed since the last snapshot."""
+    index = get_complaint_index()
+    path = os.getenv("CLUSTER_SNAPSHOT_PATH")
+    if complaint_log is not None:
+        # The shared log is already persistent; just flush what is pending
+        await sync_complaint_index()
+        return
+    if index is None or not path or not index.dirty:
+        return
+    try:
+        await asyncio.to_thread(ComplaintIndex.save, path, index.snapshot_arrays())
+    except Exception as e:
+        index.dirty = True
+        logger.error(f"Could not snapshot complaint index to {path}: {e}")
+
+async def run_index_snapshots():
+    """Snapshots the complaint index every CLUSTER_SNAPSHOT_INTERVAL seconds."""
+    interval = float(os.getenv("CLUSTER_SNAPSHOT_INTERVAL", "60"))
+    while True:
+        await asyncio.sleep(interval)
+        await save_complaint_index()
+        index = get_complaint_index()
+        if complaint_log is not None and index is not None:
+            try:
+                await asyncio.to_thread(complaint_log.trim, time.time() - index.window_seconds)
+            except Exception as e:
+                logger.error(f"Could not trim the shared complaint log: {e}")
@@ -0,0 +1,523 @@
+import os
+import json
+import hmac
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from typing import Any, BinaryIO, Dict, List, Optional, Set
+
+import httpx
+
+from app.schemas import TranscriptionJobResponse, TranscriptionResponse
+from app.languages import whisper_hint
+from app.utils.audio import AudioSource
+from app.utils.fetcher import get_audio_fetcher, AudioFetchError
+from app.utils.scheduler import Priority
+from app.utils.deadline import set_deadline, reset_deadline
+from app.utils.shared_state import connect
+from app.agents.listener import get_listener_agent
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Statuses a job can still leave
+PENDING_STATUSES = ("queued", "running")
+
+_COLUMNS = (
+    "id, status, audio_url, audio_path, filename, language, callback_url, metadata, attempts, max_attempts, "
+    "result, error, callback_status, callback_attempts, created_at, updated_at, finished_at"
+)
+
+class JobQueueFull(Exception):
+    """Too many jobs are already waiting."""
+
+class JobStore:
+    """
+    Transcription jobs in a local SQLite file, so queued work and results survive restarts.
+    Workers claim jobs with a lease; a job whose worker died is picked up again once its lease expires.
+    """
+    def __init__(self, db_path: str):
+        self.lock = threading.Lock()
+        # Shared by all worker processes: claims are single UPDATEs, so a job is leased to one worker
+        self.conn = connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                audio_url TEXT,
+                audio_path TEXT,
+                filename TEXT,
+                language TEXT,
+                callback_url TEXT,
+                metadata TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                next_run_at REAL NOT NULL,
+                lease_until REAL,
+                result TEXT,
+                error TEXT,
+                callback_status TEXT,
+                callback_attempts INTEGER NOT NULL DEFAULT 0,
+                next_callback_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, next_run_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_callbacks ON jobs (callback_status, next_callback_at)")
+        self.conn.commit()
+
+    def insert(self, job: Dict[str, Any], max_queued: int):
+        with self.lock:
+            queued = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if max_queued and queued >= max_queued:
+                raise JobQueueFull(f"{queued} transcription jobs already queued")
+            self.conn.execute(
+                "INSERT INTO jobs (id, status, audio_url, audio_path, filename, language, callback_url, metadata, "
+                "max_attempts, next_run_at, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["audio_url"], job["audio_path"], job["filename"], job["language"], job["callback_url"],
+                 json.dumps(job["metadata"]), job["max_attempts"], job["created_at"], job["created_at"], job["created_at"])
+            )
+            self.conn.commit()
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def claim(self, lease_seconds: float) -> Optional[sqlite3.Row]:
+        """Takes the next due job (or one whose worker's lease expired) and leases it."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE (status = 'queued' AND next_run_at <= ?) "
+                "OR (status = 'running' AND lease_until < ?) ORDER BY next_run_at LIMIT 1) "
+                f"RETURNING {_COLUMNS}",
+                (now + lease_seconds, now, now, now)
+            ).fetchone()
+            self.conn.commit()
+            return row
+
+    def extend_lease(self, job_id: str, lease_seconds: float) -> bool:
+        """Extends a running job's lease. False when the job is no longer running (cancelled or deleted meanwhile)."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id)
+            )
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+    def finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        """Records a final status; a callback becomes due if the job has a callback URL."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ?, finished_at = ?, "
+                "callback_status = CASE WHEN callback_url IS NULL THEN NULL ELSE 'pending' END, next_callback_at = ? "
+                # A job cancelled meanwhile stays cancelled
+                "WHERE id = ? AND status = 'running'",
+                (status, result, error, now, now, now, job_id)
+            )
+            self.conn.commit()
+
+    def retry_later(self, job_id: str, error: str, delay: float):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, lease_until = NULL, next_run_at = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                (error, now + delay, now, job_id)
+            )
+            self.conn.commit()
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancels a job that has not finished. Returns the status it had ('queued' or 'running'), or None."""
+        with self.lock:
+            for status in PENDING_STATUSES:
+                cursor = self.conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', lease_until = NULL, updated_at = ?, finished_at = ? "
+                    "WHERE id = ? AND status = ?",
+                    (time.time(), time.time(), job_id, status)
+                )
+                self.conn.commit()
+                if cursor.rowcount:
+                    return status
+            return None
+
+    def delete(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self.conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.conn.commit()
+            return row
+
+    def claim_callback(self, lease_seconds: float) -> Optional[sqlite3.Row]:
+        """Takes the next due callback, pushing its due time out while it is being delivered."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "UPDATE jobs SET next_callback_at = ? WHERE id = (SELECT id FROM jobs WHERE callback_status = 'pending' "
+                f"AND next_callback_at <= ? ORDER BY next_callback_at LIMIT 1) RETURNING {_COLUMNS}",
+                (now + lease_seconds, now)
+            ).fetchone()
+            self.conn.commit()
+            return row
+
+    def callback_result(self, job_id: str, delivered: bool, give_up: bool, delay: float):
+        with self.lock:
+            status = "delivered" if delivered else "failed" if give_up else "pending"
+            self.conn.execute(
+                "UPDATE jobs SET callback_status = ?, callback_attempts = callback_attempts + 1, next_callback_at = ? WHERE id = ?",
+                (status, time.time() + delay, job_id)
+            )
+            self.conn.commit()
+
+    def expired(self, cutoff: float) -> List[sqlite3.Row]:
+        """Finished jobs older than the cutoff whose callback is no longer pending."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ? "
+                "AND (callback_status IS NULL OR callback_status != 'pending')",
+                (cutoff,)
+            ).fetchall()
+            self.conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+            self.conn.commit()
+            return rows
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            callbacks = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE callback_status = 'pending'").fetchone()[0]
+        counts = {status: 0 for status in ("queued", "running", "completed", "failed", "cancelled")}
+        counts.update({row[0]: row[1] for row in rows})
+        counts["callbacks_pending"] = callbacks
+        return counts
+
+def job_response(row: sqlite3.Row) -> TranscriptionJobResponse:
+    return TranscriptionJobResponse(
+        job_id=row["id"],
+        status=row["status"],
+        attempts=row["attempts"],
+        max_attempts=row["max_attempts"],
+        audio_url=row["audio_url"],
+        language=row["language"],
+        metadata=json.loads(row["metadata"] or "{}"),
+        result=TranscriptionResponse.model_validate_json(row["result"]) if row["result"] else None,
+        error=row["error"],
+        callback_status=row["callback_status"],
+        created_at=row["created_at"],
+        updated_at=row["updated_at"],
+        finished_at=row["finished_at"]
+    )
+
+def _remove_file(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove job audio {path}: {e}")
+
+def _copy_upload(file: BinaryIO, path: str):
+    file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file, out, 1024 * 1024)
+
+class TranscriptionJobQueue:
+    """
+    Runs transcription jobs on a pool of background workers, separate from request handling,
+    so long recordings do not hold HTTP connections and job throughput is tuned on its own.
+    Failed attempts are retried with backoff; results are kept for `retention_seconds` and
+    posted to the job's callback URL (signed with HMAC-SHA256 when a secret is configured).
+    """
+    def __init__(
+        self,
+        store: JobStore,
+        audio_dir: str,
+        workers: int = 2,
+        max_attempts: int = 3,
+        retry_backoff: float = 10.0,
+        job_timeout: float = 600.0,
+        lease_seconds: float = 60.0,
+        retention_seconds: float = 24 * 3600,
+        max_queued: int = 1000,
+        callback_attempts: int = 5,
+        callback_secret: Optional[str] = None,
+        poll_interval: float = 1.0
+    ):
+        self.store = store
+        self.audio_dir = audio_dir
+        os.makedirs(audio_dir, exist_ok=True)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.job_timeout = job_timeout
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.max_queued = max_queued
+        self.callback_attempts = callback_attempts
+        self.callback_secret = callback_secret
+        self.poll_interval = poll_interval
+        self.wakeup = asyncio.Event()
+        self.tasks: List[asyncio.Task] = []
+        # Job id -> worker task running it in this process, so cancelling a job stops its transcription
+        self.running: Dict[str, asyncio.Task] = {}
+        # Running jobs cancelled through DELETE /jobs/{id}, as opposed to a worker being stopped
+        self.cancelled_ids: Set[str] = set()
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def submit(
+        self,
+        audio_url: Optional[str] = None,
+        file: Optional[BinaryIO] = None,
+        filename: Optional[str] = None,
+        language: Optional[str] = None,
+        callback_url: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> TranscriptionJobResponse:
+        job_id = uuid.uuid4().hex
+        audio_path = None
+        if file is not None:
+            extension = os.path.splitext(filename or "")[1][:6] or ".mp3"
+            audio_path = os.path.join(self.audio_dir, f"{job_id}{extension}")
+            await asyncio.to_thread(_copy_upload, file, audio_path)
+        job = {
+            "id": job_id,
+            "audio_url": audio_url,
+            "audio_path": audio_path,
+            "filename": filename or "audio.mp3",
+            "language": language,
+            "callback_url": callback_url,
+            "metadata": metadata or {},
+            "max_attempts": self.max_attempts,
+            "created_at": time.time(),
+        }
+        try:
+            await asyncio.to_thread(self.store.insert, job, self.max_queued)
+        except Exception:
+            _remove_file(audio_path)
+            raise
+        self.wakeup.set()
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[TranscriptionJobResponse]:
+        row = await asyncio.to_thread(self.store.get, job_id)
+        return job_response(row) if row else None
+
+    async def cancel_or_delete(self, job_id: str) -> Optional[str]:
+        """
+        Cancels a job that has not finished, or forgets a finished one. Returns what happened.
+        A running job is stopped by its worker, here or in another process (at its next lease renewal),
+        which then removes the audio; until then the worker may still be reading it.
+        """
+        previous = await asyncio.to_thread(self.store.cancel, job_id)
+        if previous == "running":
+            self._stop(job_id)
+            return "cancelled"
+        if previous == "queued":
+            row = await asyncio.to_thread(self.store.get, job_id)
+            _remove_file(row["audio_path"] if row else None)
+            return "cancelled"
+        row = await asyncio.to_thread(self.store.delete, job_id)
+        if row is None:
+            return None
+        _remove_file(row["audio_path"])
+        return "deleted"
+
+    def _stop(self, job_id: str):
+        """Stops a job this process is running because it was cancelled."""
+        task = self.running.get(job_id)
+        if task and not task.done():
+            # Tells its worker this cancel is the user's, not a shutdown
+            self.cancelled_ids.add(job_id)
+            task.cancel()
+
+    def start(self):
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=5.0))
+        self.tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._deliver_callbacks()))
+        self.tasks.append(asyncio.create_task(self._sweep()))
+        logger.info(f"Started {self.workers} transcription job worker(s)")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def _idle(self):
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self.wakeup.clear()
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                row = await asyncio.to_thread(self.store.claim, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Job worker {number} could not claim a job: {e}")
+                row = None
+            if row is None:
+                await self._idle()
+                continue
+            task = asyncio.create_task(self._run(row))
+            self.running[row["id"]] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                user_cancelled = row["id"] in self.cancelled_ids
+                if asyncio.current_task().cancelling() or not user_cancelled:
+                    # The worker itself is being stopped; the lease lets another worker resume the job
+                    task.cancel()
+                    raise
+                logger.info(f"Job {row['id']} cancelled")
+                # Its transcription has stopped reading the audio
+                _remove_file(row["audio_path"])
+            finally:
+                self.running.pop(row["id"], None)
+                self.cancelled_ids.discard(row["id"])
+
+    async def _run(self, row: sqlite3.Row):
+        job_id = row["id"]
+        if row["attempts"] > row["max_attempts"]:
+            # Its worker died on every attempt (e.g. the process kept crashing)
+            await self._finish(row, "failed", error=row["error"] or "Gave up after repeated interrupted attempts")
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        token = set_deadline(time.monotonic() + self.job_timeout)
+        source = None
+        try:
+            current = await asyncio.to_thread(self.store.get, job_id)
+            if current is None or current["status"] != "running":
+                # Cancelled (possibly through another process) since it was claimed
+                logger.info(f"Job {job_id} cancelled before it started")
+                _remove_file(row["audio_path"])
+                return
+            if row["audio_path"]:
+                file = open(row["audio_path"], "rb")
+                source = AudioSource(row["filename"], file, os.path.getsize(row["audio_path"]))
+            else:
+                source = (await get_audio_fetcher().fetch(row["audio_url"])).source
+            result = await get_listener_agent().transcribe(
+                source, language_hint=whisper_hint(row["language"]), priority=Priority.BATCH
+            )
+            await self._finish(row, "completed", result=result.model_dump_json())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            permanent = isinstance(e, (AudioFetchError, FileNotFoundError)) and not getattr(e, "retryable", False)
+            if permanent or row["attempts"] >= row["max_attempts"]:
+                logger.error(f"Job {job_id} failed after {row['attempts']} attempt(s): {error}")
+                await self._finish(row, "failed", error=error)
+            else:
+                delay = self.retry_backoff * (2 ** (row["attempts"] - 1))
+                logger.warning(f"Job {job_id} attempt {row['attempts']} failed ({error}), retrying in {delay:.0f}s")
+                await asyncio.to_thread(self.store.retry_later, job_id, error, delay)
+        finally:
+            reset_deadline(token)
+            heartbeat.cancel()
+            if source:
+                source.close()
+
+    async def _finish(self, row: sqlite3.Row, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        await asyncio.to_thread(self.store.finish, row["id"], status, result, error)
+        # The audio is only needed for retries
+        _remove_file(row["audio_path"])
+        if row["callback_url"]:
+            self.wakeup.set()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                running = await asyncio.to_thread(self.store.extend_lease, job_id, self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"Could not extend lease of job {job_id}: {e}")
+                continue
+            if not running:
+                # Cancelled through another worker process, which left the rest to this one
+                self._stop(job_id)
+                return
+
+    async def _deliver_callbacks(self):
+        while True:
+            try:
+                row = await asyncio.to_thread(self.store.claim_callback, 60.0)
+            except Exception as e:
+                logger.error(f"Could not claim a job callback: {e}")
+                row = None
+            if row is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            delivered = await self._post_callback(row)
+            attempts = row["callback_attempts"] + 1
+            give_up = not delivered and attempts >= self.callback_attempts
+            if give_up:
+                logger.error(f"Giving up on callback for job {row['id']} after {attempts} attempt(s)")
+            await asyncio.to_thread(self.store.callback_result, row["id"], delivered, give_up, self.retry_backoff * (2 ** (attempts - 1)))
+
+    async def _post_callback(self, row: sqlite3.Row) -> bool:
+        body = job_response(row).model_dump_json().encode()
+        headers = {"Content-Type": "application/json"}
+        if self.callback_secret:
+            signature = hmac.new(self.callback_secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Samadhaan-Signature"] = f"sha256={signature}"
+        try:
+            response = await self.client.post(row["callback_url"], content=body, headers=headers)
+            if response.is_success:
+                return True
+            logger.warning(f"Callback for job {row['id']} returned {response.status_code}")
+        except httpx.HTTPError as e:
+            logger.warning(f"Callback for job {row['id']} failed: {e}")
+        return False
+
+    async def _sweep(self):
+        """Deletes finished jobs (and any leftover audio) past the retention period."""
+        interval = min(3600.0, max(10.0, self.retention_seconds / 10))
+        while True:
+            try:
+                rows = await asyncio.to_thread(self.store.expired, time.time() - self.retention_seconds)
+                for row in rows:
+                    _remove_file(row["audio_path"])
+                if rows:
+                    logger.info(f"Expired {len(rows)} finished transcription jobs")
+            except Exception as e:
+                logger.error(f"Job retention sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def stats(self) -> Dict[str, Any]:
+        counts = await asyncio.to_thread(self.store.counts)
+        return {"workers": self.workers, "running_here": len(self.running), **counts}
+
+# Singleton instance
+job_queue: Optional[TranscriptionJobQueue] = None
+
+def get_job_queue() -> TranscriptionJobQueue:
+    global job_queue
+    if job_queue is None:
+        job_queue = TranscriptionJobQueue(
+            JobStore(os.getenv("JOBS_DB", "data/jobs.sqlite3")),
+            audio_dir=os.getenv("JOBS_AUDIO_DIR", "data/jobs"),
+            workers=int(os.getenv("TRANSCRIBE_JOB_WORKERS", "2")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+            retry_backoff=float(os.getenv("JOB_RETRY_BACKOFF", "10")),
+            job_timeout=float(os.getenv("JOB_TIMEOUT", "600")),
+            retention_seconds=float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600,
+            max_queued=int(os.getenv("JOB_MAX_QUEUED", "1000")),
+            callback_attempts=int(os.getenv("JOB_CALLBACK_ATTEMPTS", "5")),
+            callback_secret=os.getenv("JOB_CALLBACK_SECRET") or None
+        )
+    return job_queue
@@ -0,0 +1,163 @@
+"""
+Languages the service handles, with the codes each backend expects, and a local detector
+(Unicode script plus marker words) so language is never inferred with an LLM call.
+"""
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional
+
+class Language(NamedTuple):
+    name: str
+    # ISO 639 code
+    code: str
+    # Whisper `language` parameter; None where Whisper has no model for it (auto-detect instead)
+    whisper: Optional[str]
+    # gTTS voice; None where gTTS has none
+    tts: Optional[str]
+    script: str
+    native: str
+
+LANGUAGES: List[Language] = [
+    Language("English", "en", "en", "en", "Latin", "English"),
+    Language("Hindi", "hi", "hi", "hi", "Devanagari", "हिन्दी"),
+    Language("Bengali", "bn", "bn", "bn", "Bengali", "বাংলা"),
+    Language("Tamil", "ta", "ta", "ta", "Tamil", "தமிழ்"),
+    Language("Telugu", "te", "te", "te", "Telugu", "తెలుగు"),
+    Language("Marathi", "mr", "mr", "mr", "Devanagari", "मराठी"),
+    Language("Gujarati", "gu", "gu", "gu", "Gujarati", "ગુજરાતી"),
+    Language("Kannada", "kn", "kn", "kn", "Kannada", "ಕನ್ನಡ"),
+    Language("Malayalam", "ml", "ml", "ml", "Malayalam", "മലയാളം"),
+    Language("Punjabi", "pa", "pa", "pa", "Gurmukhi", "ਪੰਜਾਬੀ"),
+    Language("Odia", "or", None, None, "Oriya", "ଓଡ଼ିଆ"),
+    Language("Urdu", "ur", "ur", "ur", "Arabic", "اردو"),
+    # Closest supported models: Maithili is written in Devanagari and close enough to Hindi for both
+    Language("Maithili", "mai", "hi", "hi", "Devanagari", "मैथिली"),
+]
+
+DEFAULT_LANGUAGE = LANGUAGES[0]
+
+_LOOKUP: Dict[str, Language] = {}
+for _language in LANGUAGES:
+    for _key in (_language.name, _language.code, _language.native):
+        _LOOKUP[_key.casefold()] = _language
+# Other spellings clients and Whisper use
+_LOOKUP.update({"oriya": _LOOKUP["or"], "panjabi": _LOOKUP["pa"], "bangla": _LOOKUP["bn"]})
+
+def get_language(value: Optional[str]) -> Optional[Language]:
+    """Resolves a language name, ISO code or native name (case-insensitive), e.g. "Hindi", "hi", "हिन्दी"."""
+    if not value:
+        return None
+    return _LOOKUP.get(value.strip().casefold())
+
+def whisper_hint(value: Optional[str]) -> Optional[str]:
+    """Whisper language code for a client-supplied language, or None to let Whisper detect it."""
+    language = get_language(value)
+    return language.whisper if language else None
+
+def tts_code(value: Optional[str]) -> str:
+    """gTTS voice for a language, falling back to English."""
+    language = get_language(value)
+    return language.tts if language and language.tts else DEFAULT_LANGUAGE.tts
+
+# Unicode blocks of the scripts we serve
+_SCRIPT_RANGES = [
+    (0x0900, 0x097F, "Devanagari"),
+    (0x0980, 0x09FF, "Bengali"),
+    (0x0A00, 0x0A7F, "Gurmukhi"),
+    (0x0A80, 0x0AFF, "Gujarati"),
+    (0x0B00, 0x0B7F, "Oriya"),
+    (0x0B80, 0x0BFF, "Tamil"),
+    (0x0C00, 0x0C7F, "Telugu"),
+    (0x0C80, 0x0CFF, "Kannada"),
+    (0x0D00, 0x0D7F, "Malayalam"),
+    (0x0600, 0x06FF, "Arabic"),
+    (0x0750, 0x077F, "Arabic"),
+    (0xFB50, 0xFDFF, "Arabic"),
+    (0xFE70, 0xFEFF, "Arabic"),
+]
+
+def _marker_set(words: str) -> frozenset:
+    return frozenset(unicodedata.normalize("NFC", word) for word in words.split())
+
+# Frequent function words that tell apart languages sharing a script
+_MARKERS: Dict[str, Dict[str, frozenset]] = {
+    "Devanagari": {
+        "Hindi": _marker_set("है हैं नहीं और में का की के को से पर यह वह हम मेरा मेरी हमारे था थी रहा रही गया कोई बहुत पानी सड़क"),
+        "Marathi": _marker_set("आहे आहेत नाही आणि मध्ये च्या ला ची चा चे हे ते आम्ही माझा माझी आमच्या होता होती झाले खूप पाणी रस्ता"),
+        "Maithili": _marker_set("अछि छैक छल छथि नहि हमर हमरा अहाँ सभ केँ मे सँ कें भेल गेल छी रहल"),
+    },
+    "Latin": {
+        "English": _marker_set("the is are was and of to in on at for not no there this that my our it with from please near since"),
+        # Romanized Hindi, as typed in SMS and WhatsApp
+        "Hindi": _marker_set("hai hain nahi nahin aur mein mai ka ki ke ko se par yeh ye woh hum mera meri hamare hamara tha thi raha rahi gaya koi bahut paani pani sadak kuch kya"),
+    },
+}
+_SCRIPT_LANGUAGES = {
+    "Bengali": "Bengali", "Gurmukhi": "Punjabi", "Gujarati": "Gujarati", "Oriya": "Odia",
+    "Tamil": "Tamil", "Telugu": "Telugu", "Kannada": "Kannada", "Malayalam": "Malayalam", "Arabic": "Urdu",
+}
+# Devanagari vowel signs are not \w, so words are cut at separators instead
+_SEPARATORS = re.compile(r"[\s\d.,;:!?()\[\]{}\"'“”‘’/\\|।॥،۔؟-]+")
+
+def _words(text: str) -> List[str]:
+    return [word for word in _SEPARATORS.split(unicodedata.normalize("NFC", text).casefold()) if word]
+
+# Below this many letters there is too little text to judge
+MIN_LETTERS = 3
+# Most confidence for a guess from the script alone, without marker words: below detected_name's
+# minimum, so "Yes" or "OK thanks" never switch a session's language
+GUESS_CONFIDENCE = 0.3
+
+class Detection(NamedTuple):
+    language: Language
+    confidence: float
+
+def _script(ch: str) -> Optional[str]:
+    point = ord(ch)
+    if ch.isascii():
+        return "Latin" if ch.isalpha() else None
+    for start, end, script in _SCRIPT_RANGES:
+        if start <= point <= end:
+            return script
+    return None
+
+def detect_language(text: str) -> Optional[Detection]:
+    """
+    Detects the language of a text locally in microseconds. The dominant Unicode script decides
+    most languages outright; Devanagari (Hindi/Marathi/Maithili) and Latin (English/romanized Hindi)
+    are split by counting marker words. Returns None when the text is too short or mixed to tell.
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    counts: Dict[str, int] = {}
+    for ch in text:
+        script = _script(ch)
+        if script:
+            counts[script] = counts.get(script, 0) + 1
+    letters = sum(counts.values())
+    if letters < MIN_LETTERS:
+        return None
+    script = max(counts, key=counts.get)
+    share = counts[script] / letters
+
+    if script in _SCRIPT_LANGUAGES:
+        return Detection(get_language(_SCRIPT_LANGUAGES[script]), round(share, 3))
+
+    words = _words(text)
+    hits = {name: sum(word in markers for word in words) for name, markers in _MARKERS[script].items()}
+    default = "Hindi" if script == "Devanagari" else "English"
+    # Marathi's ळ is rare in Hindi
+    if script == "Devanagari" and "ळ" in text:
+        hits["Marathi"] += 1
+    best = max(hits, key=hits.get)
+    total = sum(hits.values())
+    if not total:
+        # No markers at all: the script's main language is only a guess
+        return Detection(get_language(default), round(share * GUESS_CONFIDENCE, 3))
+    if hits[best] == hits[default]:
+        best = default
+    return Detection(get_language(best), round(share * hits[best] / total, 3))
+
+def detected_name(text: str, min_confidence: float = 0.5) -> Optional[str]:
+    """Name of the detected language when the detector is reasonably sure, else None."""
+    detection = detect_language(text)
+    return detection.language.name if detection and detection.confidence >= min_confidence else None
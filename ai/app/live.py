@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import WebSocket
+
+from app.schemas import LiveTranscriptEvent, TranscriptionResponse
+from app.agents.listener import get_listener_agent
+from app.utils.preprocess import SAMPLE_RATE
+from app.utils.vad import SpeechSegment, VoiceActivityDetector
+from app.utils.scheduler import Priority
+from app.utils.deadline import set_deadline, reset_deadline
+from app.utils.metrics import observe
+
+import logging
+logger = logging.getLogger(__name__)
+
+class LiveStream:
+    """
+    One live transcription: PCM frames in, utterances cut by the VAD, each transcribed as soon as it ends.
+    Finals are sent in utterance order; partials of a long utterance in progress are sent when they are
+    still current. Disconnecting cancels whatever is still being transcribed.
+    """
+    def __init__(self, owner: "LiveTranscriber", websocket: WebSocket, language_hint: Optional[str], sample_rate: int):
+        self.owner = owner
+        self.websocket = websocket
+        self.language_hint = language_hint
+        self.sample_rate = sample_rate
+        self.vad = owner.new_detector()
+        self.send_lock = asyncio.Lock()
+        self.leftover = b""
+        # Utterances handed to transcription, in order; None ends the stream
+        self.pending: asyncio.Queue = asyncio.Queue()
+        self.results: List[Tuple[SpeechSegment, Optional[TranscriptionResponse]]] = []
+        self.next_segment = 0
+        self.partial: Optional[asyncio.Task] = None
+        self.partial_samples = 0
+        self.tasks: List[asyncio.Task] = []
+        self.sender = asyncio.create_task(self._send_finals())
+
+    async def send(self, event: LiveTranscriptEvent):
+        async with self.send_lock:
+            await self.websocket.send_text(event.model_dump_json(exclude_none=True))
+
+    def feed(self, data: bytes):
+        """Takes a binary message of 16-bit little-endian mono PCM at the stream's sample rate."""
+        data = self.leftover + data
+        usable = len(data) - len(data) % 2
+        self.leftover = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype="<i2")
+        if self.sample_rate != SAMPLE_RATE and len(samples):
+            count = max(1, round(len(samples) * SAMPLE_RATE / self.sample_rate))
+            positions = np.linspace(0, len(samples) - 1, count)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+        for segment in self.vad.feed(samples):
+            self._finalize(segment)
+        self._maybe_partial()
+
+    def _finalize(self, segment: SpeechSegment):
+        index = self.next_segment
+        self.next_segment += 1
+        self.partial_samples = 0
+        task = asyncio.create_task(self._transcribe(segment, Priority.TRANSCRIPTION))
+        self.tasks.append(task)
+        self.pending.put_nowait((index, segment, task))
+        self.owner.segments += 1
+
+    def _maybe_partial(self):
+        if not self.owner.partial_interval or not self.vad.speaking:
+            return
+        if self.partial is not None and not self.partial.done():
+            return
+        length = self.vad.position - self.vad.speech_start
+        if length - self.partial_samples < self.owner.partial_interval:
+            return
+        self.partial_samples = length
+        self.partial = asyncio.create_task(self._send_partial(self.next_segment, self.vad.current()))
+        self.tasks.append(self.partial)
+
+    async def _send_partial(self, index: int, segment: SpeechSegment):
+        try:
+            # Behind finals for Groq quota: a late partial is only dropped
+            result = await self._transcribe(segment, Priority.CLASSIFICATION)
+        except Exception as e:
+            logger.debug(f"Partial transcript failed: {e}")
+            return
+        if index != self.next_segment or not result.text.strip():
+            # The utterance has ended meanwhile; its final is on the way
+            return
+        self.owner.partials += 1
+        try:
+            await self.send(LiveTranscriptEvent(
+                type="partial", segment=index, start=round(segment.start, 2), end=round(segment.end, 2), text=result.text.strip()
+            ))
+        except Exception as e:
+            logger.debug(f"Could not send partial transcript: {e}")
+
+    async def _transcribe(self, segment: SpeechSegment, priority: Priority) -> TranscriptionResponse:
+        token = set_deadline(time.monotonic() + self.owner.segment_timeout)
+        try:
+            return await get_listener_agent().transcribe_pcm(segment.samples, self.language_hint, offset=segment.start, priority=priority)
+        finally:
+            reset_deadline(token)
+
+    async def _send_finals(self):
+        while True:
+            item = await self.pending.get()
+            if item is None:
+                return
+            index, segment, task = item
+            try:
+                result, error = await task, None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Live transcription of utterance {index} failed: {e}")
+                self.owner.failed += 1
+                result, error = None, "Transcription failed"
+            self.results.append((segment, result))
+            await self.send(LiveTranscriptEvent(
+                type="final", segment=index, start=round(segment.start, 2), end=round(segment.end, 2),
+                text=result.text.strip() if result else "", language=result.language if result else None,
+                confidence=result.confidence if result else None, detail=error
+            ))
+
+    async def finish(self) -> TranscriptionResponse:
+        """Ends the stream: transcribes the utterance in progress, waits for every final and combines them."""
+        for segment in self.vad.flush():
+            self._finalize(segment)
+        self.pending.put_nowait(None)
+        await self.sender
+        texts = [result.text.strip() for _, result in self.results if result and result.text.strip()]
+        languages = [result.language for _, result in self.results if result and result.language]
+        segments = [piece for _, result in self.results if result for piece in result.segments]
+        return TranscriptionResponse(
+            text=" ".join(texts),
+            language=max(set(languages), key=languages.count) if languages else None,
+            confidence=sum(s.confidence for s in segments) / len(segments) if segments else 0.0,
+            model_name=get_listener_agent().model_name,
+            duration=round(self.vad.duration, 2),
+            segments=segments
+        )
+
+    def cancel(self):
+        for task in self.tasks + [self.sender]:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Already logged or sent; keeps asyncio from reporting it as unretrieved
+                task.exception()
+
+class LiveTranscriber:
+    """
+    Serves live transcription over WebSockets: at most `max_streams` at once, each at most
+    `max_seconds` of audio, closed after `idle_timeout` seconds without a message.
+    """
+    def __init__(
+        self,
+        max_streams: int = 32,
+        max_seconds: float = 600.0,
+        idle_timeout: float = 30.0,
+        segment_timeout: float = 30.0,
+        partial_seconds: float = 2.0,
+        vad_params: Optional[Dict[str, float]] = None
+    ):
+        self.max_streams = max_streams
+        self.max_seconds = max_seconds
+        self.idle_timeout = idle_timeout
+        self.segment_timeout = segment_timeout
+        # Samples of new speech between interim transcripts of one utterance (0: finals only)
+        self.partial_interval = int(partial_seconds * SAMPLE_RATE)
+        self.vad_params = vad_params or {}
+        self.active = 0
+        self.streams = 0
+        self.rejected = 0
+        self.segments = 0
+        self.partials = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        # Seconds from the client's "stop" to the complete transcript
+        self.tails: Deque[float] = deque(maxlen=1024)
+
+    def new_detector(self) -> VoiceActivityDetector:
+        return VoiceActivityDetector(**self.vad_params)
+
+    async def serve(self, websocket: WebSocket, language_hint: Optional[str], sample_rate: int):
+        """
+        Runs one stream. The client sends binary PCM frames and finally {"type": "stop"};
+        the server answers with "ready", then "partial"/"final" events, then "done" with the whole transcript.
+        """
+        await websocket.accept()
+        if self.active >= self.max_streams or not 8000 <= sample_rate <= 48000:
+            self.rejected += 1
+            detail = "Too many live streams, retry shortly" if self.active >= self.max_streams else "sample_rate must be 8000-48000"
+            await websocket.send_text(LiveTranscriptEvent(type="error", detail=detail).model_dump_json(exclude_none=True))
+            # 1013: try again later; 1003: unsupported data
+            await websocket.close(code=1013 if self.active >= self.max_streams else 1003)
+            return
+
+        self.active += 1
+        self.streams += 1
+        stream = LiveStream(self, websocket, language_hint, sample_rate)
+        try:
+            await stream.send(LiveTranscriptEvent(type="ready", detail=f"pcm_s16le mono {sample_rate} Hz"))
+            while True:
+                try:
+                    message = await asyncio.wait_for(websocket.receive(), self.idle_timeout)
+                except TimeoutError:
+                    logger.info(f"Live stream idle for {self.idle_timeout:.0f}s, finishing it")
+                    break
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes"):
+                    stream.feed(message["bytes"])
+                    if stream.vad.duration >= self.max_seconds:
+                        await stream.send(LiveTranscriptEvent(type="error", detail=f"Stream longer than {self.max_seconds:.0f}s, finishing it"))
+                        break
+                elif message.get("text") and _is_stop(message["text"]):
+                    break
+
+            stopped = time.perf_counter()
+            transcript = await stream.finish()
+            tail = time.perf_counter() - stopped
+            self.tails.append(tail)
+            observe("live_finish", tail)
+            await stream.send(LiveTranscriptEvent(type="done", transcript=transcript))
+            await websocket.close()
+        except Exception as e:
+            # Mostly a client that went away mid-send
+            logger.info(f"Live stream ended early: {e}")
+        finally:
+            stream.cancel()
+            self.audio_seconds += stream.vad.duration
+            self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        tails = sorted(self.tails)
+        return {
+            "active": self.active,
+            "streams": self.streams,
+            "rejected": self.rejected,
+            "segments": self.segments,
+            "partials": self.partials,
+            "failed_segments": self.failed,
+            "audio_seconds": round(self.audio_seconds, 1),
+            "finish_p50_ms": round(tails[len(tails) // 2] * 1000, 1) if tails else None,
+            "finish_p95_ms": round(tails[min(len(tails) - 1, int(len(tails) * 0.95))] * 1000, 1) if tails else None,
+        }
+
+def _is_stop(text: str) -> bool:
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return text.strip().lower() == "stop"
+    return isinstance(message, dict) and message.get("type") == "stop"
+
+# Singleton instance
+live_transcriber: Optional[LiveTranscriber] = None
+
+def get_live_transcriber() -> LiveTranscriber:
+    global live_transcriber
+    if live_transcriber is None:
+        live_transcriber = LiveTranscriber(
+            max_streams=int(os.getenv("STREAM_MAX_CONNECTIONS", "32")),
+            max_seconds=float(os.getenv("STREAM_MAX_SECONDS", "600")),
+            idle_timeout=float(os.getenv("STREAM_IDLE_TIMEOUT", "30")),
+            segment_timeout=float(os.getenv("STREAM_SEGMENT_TIMEOUT", "30")),
+            partial_seconds=float(os.getenv("STREAM_PARTIAL_SECONDS", "2")),
+            vad_params={
+                "threshold_db": float(os.getenv("AUDIO_SILENCE_DB", "-45")),
+                "margin_db": float(os.getenv("VAD_MARGIN_DB", "10")),
+                "pause_ms": float(os.getenv("VAD_PAUSE_MS", "600")),
+                "max_segment_seconds": float(os.getenv("VAD_MAX_SEGMENT_SECONDS", "20")),
+            }
+        )
+    return live_transcriber
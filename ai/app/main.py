@@ -1,49 +1,93 @@
 import os
+import json
+import time
+import asyncio
+from urllib.parse import quote
+from typing import Dict, List, Optional, Tuple
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, UploadFile, File, Body, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Body, Form, Header, Request, WebSocket
 from dotenv import load_dotenv
 
 import logging
 load_dotenv()
 
-logging.basicConfig(
-    filename='server_debug.log',
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from app.utils.logs import configure_logging
+configure_logging()
 logger = logging.getLogger(__name__)
 
 logger.info("Server starting up...")
 
 from app.schemas import (
     TranscriptionResponse,
+    TranscriptionBatchRequest,
     ClassificationRequest,
     ClassificationResponse,
     ExtractionRequest,
     ClassificationResponse,
     ExtractionRequest,
     ExtractionResponse,
+    AnalysisRequest,
+    AnalysisResponse,
+    IntakeResponse,
+    TranscriptionJobResponse,
     ChatRequest,
-    ChatResponse
+    ChatResponse,
+    SessionCreateRequest,
+    SessionResponse
 )
-from app.utils.audio import download_audio, save_upload, delete_temp_file
+from app.utils.audio import UploadRoute, upload_source, run_temp_sweeper
+from app.utils.fetcher import get_audio_fetcher, close_audio_fetcher, AudioFetchError
+from app.utils.audio_store import STATIC_DIR, AudioStaticFiles, store_audio, run_audio_expiry
 from app.agents.listener import get_listener_agent
-from app.agents.brain import get_brain_agent
+from app.agents.brain import get_brain_agent, FINISH_TOKEN
+from app.agents.speaker import get_speaker_agent
+from app.utils.text import SentenceSplitter, MarkerFilter
+from app.utils.concurrency import shutdown_executors
+from app.utils.cache import get_result_cache
+from app.utils.scheduler import Priority, get_scheduler
+from app.utils.singleflight import single_flight_stats
+from app.utils.metrics import HTTP_SECONDS, render_metrics
+from app.utils.admission import AdmissionMiddleware, get_admission_controller
+from app.utils.deadline import DeadlineExceeded, detached_context
+from app.sessions import ChatSession, get_session_store
+from app.pipeline import run_voice_intake, analyze_with_clusters
+from app.languages import whisper_hint, detected_name
+from app.clusters import get_complaint_index, save_complaint_index, run_index_snapshots, sync_complaint_index
+from app.jobs import get_job_queue, JobQueueFull
+from app.live import get_live_transcriber
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Load models on startup
-    print("Loading models...")
+    logger.info("Loading models...")
     get_listener_agent()
     get_brain_agent()
-    print("Models loaded.")
+    get_session_store()
+    get_complaint_index()
+    logger.info("Models loaded.")
+    sweeper = asyncio.create_task(run_temp_sweeper())
+    audio_expiry = asyncio.create_task(run_audio_expiry())
+    index_snapshots = asyncio.create_task(run_index_snapshots())
+    # Picks up jobs left queued (or interrupted) by a previous run
+    get_job_queue().start()
+    if os.getenv("TTS_WARMUP_ON_STARTUP", "0") in ("1", "true", "yes"):
+        # Pre-render the persona's fixed phrases in the background
+        asyncio.create_task(get_speaker_agent().warm_up())
     yield
-    # Cleanup if needed
+    sweeper.cancel()
+    audio_expiry.cancel()
+    index_snapshots.cancel()
+    await get_job_queue().stop()
+    await save_complaint_index()
+    await close_audio_fetcher()
+    shutdown_executors()
 
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, Response
 
 app = FastAPI(title="Brain Service", lifespan=lifespan)
+# Uploads stay in memory up to AUDIO_SPOOL_MAX_BYTES; set before any route is declared
+app.router.route_class = UploadRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,9 +97,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (e.g. /sessions/{session_id}) to keep the label set bounded
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_SECONDS.labels(request.method, path, str(status)).observe(time.perf_counter() - started)
+
+# Outermost, so overload is refused before any other work (or reading the body) happens
+app.add_middleware(AdmissionMiddleware)
+
 # Ensure static directory exists
-os.makedirs("static", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+os.makedirs(STATIC_DIR, exist_ok=True)
+app.mount("/static", AudioStaticFiles(directory=STATIC_DIR), name="static")
 
 @app.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe(
@@ -63,101 +124,584 @@ async def transcribe(
     file: UploadFile = File(None),
     language: str = Form(None)
 ):
-    temp_path = None
+    source = None
     try:
         if audio_url:
-            temp_path = download_audio(audio_url)
+            source = (await get_audio_fetcher().fetch(audio_url)).source
         elif file:
-            content = await file.read()
-            print(f"DEBUG: Received file {file.filename}, size: {len(content)} bytes")
-            temp_path = save_upload(content, file.filename)
+            source = upload_source(file.filename, file.file)
+            logger.debug(f"Received file {file.filename}, size: {source.size} bytes")
         else:
             raise HTTPException(status_code=400, detail="Missing audio_url or file upload")
 
         listener = get_listener_agent()
-        # Convert full language name to ISO code if possible
-        lang_map = {
-            "English": "en",
-            "Hindi": "hi",
-            "Bengali": "bn",
-            "Tamil": "ta",
-            "Punjabi": "pa",
-            "Marathi": "mr",
-            "Gujarati": "gu",
-            "Kannada": "kn",
-            "Telugu": "te",
-            "Malayalam": "ml",
-            "Odia": "or",
-            "Urdu": "ur",
-            "Maithili": "mai",
-        }
-        language_hint = lang_map.get(language)
-        
-        text, language_detected, confidence, model_name = listener.transcribe(temp_path, language_hint=language_hint)
+        language_hint = whisper_hint(language)
         
-        return TranscriptionResponse(
-            text=text, 
-            language=language_detected, 
-            confidence=confidence, 
-            model_name=model_name
-        )
+        return await listener.transcribe(source, language_hint=language_hint)
     
+    except HTTPException:
+        raise
+    except AudioFetchError as e:
+        raise HTTPException(status_code=502 if e.retryable else 400, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         import traceback
         error_msg = traceback.format_exc()
         logger.error(f"Transcription error: {error_msg}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if temp_path:
-            delete_temp_file(temp_path)
+        if source:
+            source.close()
+
+@app.post("/transcribe/batch", response_model=List[TranscriptionResponse])
+async def transcribe_batch(request: TranscriptionBatchRequest):
+    """Fetches several audio URLs concurrently (e.g. a multi-media WhatsApp message) and transcribes each."""
+    results = []
+    try:
+        results = await get_audio_fetcher().fetch_many(request.audio_urls)
+        listener = get_listener_agent()
+        language_hint = whisper_hint(request.language)
+        return await asyncio.gather(*(
+            listener.transcribe(result.source, language_hint=language_hint) for result in results
+        ))
+    except AudioFetchError as e:
+        raise HTTPException(status_code=502 if e.retryable else 400, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        import traceback
+        logger.error(f"Batch transcription error: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for result in results:
+            result.source.close()
+
+@app.websocket("/transcribe/stream")
+async def transcribe_stream(websocket: WebSocket, language: Optional[str] = None, sample_rate: int = 16000):
+    """
+    Live transcription: send 16-bit mono PCM as binary messages while the user speaks, then {"type": "stop"}.
+    Each utterance is transcribed as soon as a pause ends it, so little is left to do after "stop".
+    """
+    await get_live_transcriber().serve(websocket, whisper_hint(language), sample_rate)
+
+@app.get("/transcribe/stream/stats")
+async def live_transcription_stats():
+    """Live streams, utterances transcribed and time from "stop" to the full transcript."""
+    return get_live_transcriber().stats()
+
+@app.post("/jobs/transcribe", response_model=TranscriptionJobResponse, status_code=202)
+async def submit_transcription_job(
+    response: Response,
+    audio_url: str = Form(None),
+    file: UploadFile = File(None),
+    language: str = Form(None),
+    callback_url: str = Form(None),
+    metadata: str = Form(None)
+):
+    """
+    Queues a long recording for transcription in the background and returns its job right away.
+    Poll GET /jobs/{job_id}, or pass `callback_url` to have the finished job POSTed there.
+    `metadata` (a JSON object) is echoed back, e.g. to tie the result to a complaint.
+    """
+    if not audio_url and not file:
+        raise HTTPException(status_code=400, detail="Missing audio_url or file upload")
+    try:
+        extra = json.loads(metadata) if metadata else {}
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    if not isinstance(extra, dict):
+        raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    try:
+        job = await get_job_queue().submit(
+            audio_url=audio_url,
+            file=file.file if file and not audio_url else None,
+            filename=file.filename if file else None,
+            language=language,
+            callback_url=callback_url,
+            metadata=extra
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
+    except Exception as e:
+        import traceback
+        logger.error(f"Job submission error: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+    response.headers["Location"] = f"/jobs/{job.job_id}"
+    return job
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """Jobs per status, pending callbacks and worker count."""
+    return await get_job_queue().stats()
+
+@app.get("/jobs/{job_id}", response_model=TranscriptionJobResponse)
+async def get_transcription_job(job_id: str):
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def delete_transcription_job(job_id: str):
+    """Cancels a job that has not finished yet, or deletes a finished one and its result."""
+    outcome = await get_job_queue().cancel_or_delete(job_id)
+    if outcome is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return {"job_id": job_id, outcome: True}
+
+def _cache_enabled(cache_bypass: Optional[str]) -> bool:
+    """A truthy X-Cache-Bypass header forces a fresh LLM call (the result is still stored)."""
+    return not (cache_bypass and cache_bypass.strip().lower() in ("1", "true", "yes"))
 
 @app.post("/classify", response_model=ClassificationResponse)
-async def classify(request: ClassificationRequest):
+async def classify(
+    request: ClassificationRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
     try:
         brain = get_brain_agent()
-        result = brain.classify_complaint(
+        result = await brain.classify_complaint(
             text=request.text,
             labels=request.labels,
-            multi_label=request.multi_label
+            multi_label=request.multi_label,
+            use_cache=_cache_enabled(x_cache_bypass)
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/extract", response_model=ExtractionResponse)
-async def extract(request: ExtractionRequest):
+async def extract(
+    request: ExtractionRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
     try:
         brain = get_brain_agent()
-        result = brain.extract_complaint_data(
+        result = await brain.extract_complaint_data(
             text=request.text,
-            labels=request.labels
+            labels=request.labels,
+            use_cache=_cache_enabled(x_cache_bypass)
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-from app.agents.speaker import get_speaker_agent
+@app.post("/analyze", response_model=AnalysisResponse)
+async def analyze(
+    request: AnalysisRequest,
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """
+    Classification scores and extracted fields from a single model call, plus the near-duplicate
+    cluster of recent complaints this one belongs to.
+    """
+    try:
+        result = await analyze_with_clusters(
+            text=request.text,
+            labels=request.labels,
+            multi_label=request.multi_label,
+            use_cache=_cache_enabled(x_cache_bypass)
+        )
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/intake/voice", response_model=IntakeResponse)
+async def intake_voice(
+    audio_url: str = Form(None),
+    file: UploadFile = File(None),
+    language: str = Form(None),
+    labels: List[str] = Form(...),
+    multi_label: bool = Form(False),
+    stream: bool = Form(False)
+):
+    """
+    Voice complaint in one call: fetch, preprocess, transcribe and analyze, with per-stage timings.
+    `labels` may be repeated or comma-separated. With `stream=true` the answer is Server-Sent Events:
+    `transcript` first, then `analysis`, then `done` with the timings.
+    """
+    if not audio_url and not file:
+        raise HTTPException(status_code=400, detail="Missing audio_url or file upload")
+    labels = [label.strip() for value in labels for label in value.split(",") if label.strip()]
+    if not labels:
+        raise HTTPException(status_code=400, detail="At least one label is required")
+    source = upload_source(file.filename, file.file) if file and not audio_url else None
+    events = run_voice_intake(source, audio_url, whisper_hint(language), labels, multi_label)
+
+    if stream:
+        async def stream_events():
+            try:
+                async for event, data in events:
+                    yield _sse(event, data)
+            except AudioFetchError as e:
+                yield _sse("error", {"detail": str(e)})
+            except Exception:
+                import traceback
+                logger.error(f"Voice intake error: {traceback.format_exc()}")
+                yield _sse("error", {"detail": "Voice intake failed"})
+        return StreamingResponse(
+            stream_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    try:
+        result = {event: data async for event, data in events}
+        return IntakeResponse(transcript=result["transcript"], analysis=result["analysis"], timings=result["done"]["timings"])
+    except AudioFetchError as e:
+        raise HTTPException(status_code=502 if e.retryable else 400, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        import traceback
+        logger.error(f"Voice intake error: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/classify/batch", response_model=List[ClassificationResponse])
+async def classify_batch(
+    requests: List[ClassificationRequest],
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """Classifies many complaints at once; results are returned in request order."""
+    try:
+        brain = get_brain_agent()
+        return await brain.classify_batch(requests, use_cache=_cache_enabled(x_cache_bypass))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/extract/batch", response_model=List[ExtractionResponse])
+async def extract_batch(
+    requests: List[ExtractionRequest],
+    x_cache_bypass: Optional[str] = Header(None)
+):
+    """Extracts structured data for many complaints at once; results are returned in request order."""
+    try:
+        brain = get_brain_agent()
+        return await brain.extract_batch(requests, use_cache=_cache_enabled(x_cache_bypass))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/classify/cascade/stats")
+async def cascade_stats():
+    """Local classifier hit rate, escalation reasons and agreement with the LLM."""
+    return get_brain_agent().cascade.stats.report()
+
+@app.get("/clusters/stats")
+async def cluster_stats():
+    await sync_complaint_index()
+    index = get_complaint_index()
+    return index.stats() if index else {"enabled": False}
+
+@app.get("/clusters/{cluster_id}")
+async def get_cluster(cluster_id: str):
+    """Recent complaints in a near-duplicate cluster, oldest first."""
+    await sync_complaint_index()
+    index = get_complaint_index()
+    cluster = index.cluster(cluster_id) if index else None
+    if cluster is None:
+        raise HTTPException(status_code=404, detail="Cluster not found or expired")
+    return cluster
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return get_result_cache().stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage and per-route latency, token usage, fallbacks, queue depth, coalescing."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Groq quota state: queue depth per model and priority, waits, retries and rate limits."""
+    return get_scheduler().stats()
+
+@app.get("/routing/stats")
+async def routing_stats():
+    """Per-task model choice, recent latency and error rate per model, and hedged calls."""
+    return get_brain_agent().router.stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """In-flight and queued requests, rejections, cancellations and Retry-After estimate per endpoint group."""
+    return get_admission_controller().stats()
+
+@app.get("/singleflight/stats")
+async def singleflight_stats():
+    """How many duplicate in-flight classify/extract/transcribe requests were coalesced."""
+    return single_flight_stats()
+
+@app.get("/cache/tts/stats")
+async def tts_cache_stats():
+    return get_speaker_agent().cache.stats()
+
+# Background session updates, kept referenced until they finish
+_session_tasks = set()
+
+async def _open_session(request: ChatRequest) -> Tuple[Optional[ChatSession], List[Dict[str, str]], str]:
+    """Returns (session, history, language) for a chat turn, from the session when one is given."""
+    # An explicit language wins; otherwise the turn's own language (detected locally) switches it
+    explicit = "language" in request.model_fields_set
+    detected = None if explicit else detected_name(request.text)
+    if not request.session_id:
+        return None, request.history, detected or request.language
+    session = await get_session_store().get(request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    language = request.language if explicit else detected or session.language
+    get_brain_agent().restore_chat_context(session.session_id, session.summary, session.history[:session.summary_covered])
+    return session, session.history, language
+
+async def _record_turn(session: Optional[ChatSession], text: str, response_text: str, language: str):
+    """Appends a completed turn to the session and refreshes its derived state."""
+    if session is None:
+        return
+    store = get_session_store()
+    summary, covered = get_brain_agent().context.snapshot(session.session_id)
+    detected = detected_name(text)
+
+    def apply(current: ChatSession):
+        current.history.append({"role": "user", "content": text})
+        current.history.append({"role": "assistant", "content": response_text.replace(FINISH_TOKEN, "").strip()})
+        current.language = language
+        current.detected_language = detected or current.detected_language
+        current.finished = current.finished or FINISH_TOKEN in response_text
+        if summary and covered >= current.summary_covered:
+            current.summary, current.summary_covered = summary, covered
+
+    # Atomic, so a concurrent update from another worker (e.g. field extraction) is not lost
+    current = await store.update(session.session_id, apply)
+    if current is None:
+        # Expired mid-turn: save what this turn saw
+        current = session
+        apply(current)
+        await store.save(current)
+    if current.labels:
+        task = asyncio.create_task(_refresh_session_fields(current.session_id), context=detached_context())
+        _session_tasks.add(task)
+        task.add_done_callback(_session_tasks.discard)
+
+async def _refresh_session_fields(session_id: str):
+    """Re-extracts complaint fields from everything the citizen has said so far."""
+    store = get_session_store()
+    try:
+        session = await store.get(session_id)
+        if session is None:
+            return
+        said = " ".join(msg["content"] for msg in session.history if msg.get("role") == "user")
+        extraction = await get_brain_agent().extract_complaint_data(said, session.labels, priority=Priority.BATCH)
+        extracted = extraction.model_dump(exclude={"model_name", "language"})
+        await store.update(session_id, lambda current: setattr(current, "extracted", extracted))
+    except Exception as e:
+        logger.error(f"Session field extraction failed for {session_id}: {e}")
+
+@app.post("/sessions", response_model=SessionResponse)
+async def create_session(request: Optional[SessionCreateRequest] = None):
+    """Starts a server-side chat session; pass its session_id to /chat instead of the full history."""
+    request = request or SessionCreateRequest()
+    session = await get_session_store().create(language=request.language, labels=request.labels)
+    return SessionResponse(**session.model_dump())
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str):
+    session = await get_session_store().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return SessionResponse(**session.model_dump())
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    await get_session_store().delete(session_id)
+    get_brain_agent().context.forget(session_id)
+    return {"deleted": True}
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     try:
         brain = get_brain_agent()
         speaker = get_speaker_agent()
         
-        response_text = brain.chat(request.text, request.history, request.language)
+        session, history, language = await _open_session(request)
+        conversation_id = session.session_id if session else None
+        messages, context = brain.build_chat_context(request.text, history, language, conversation_id)
+        details = {}
+        response_text = await brain.complete_chat(messages, language, details)
+        await _record_turn(session, request.text, response_text, language)
+        # The [FINISH] marker is for the client, not to be spoken
+        spoken_text = response_text.replace(FINISH_TOKEN, "").strip()
         
-        # Generate TTS
-        audio_base64 = speaker.text_to_speech(response_text, request.language)
+        audio_base64 = None
+        audio_url = None
+        if request.audio_mode == "base64":
+            audio_base64 = await speaker.text_to_speech(spoken_text, language)
+        elif request.audio_mode == "url":
+            try:
+                audio_bytes = await speaker.synthesize(spoken_text, language)
+                audio_path = await store_audio(audio_bytes)
+                audio_url = str(http_request.url_for("static", path=audio_path))
+            except Exception as e:
+                logger.error(f"TTS Error: {e}")
         
         return ChatResponse(
             response=response_text,
             audio_base64=audio_base64,
-            model_name=brain.llm.model_name
+            audio_url=audio_url,
+            model_name=details["model_name"],
+            prompt_tokens_saved=context.tokens_saved,
+            session_id=conversation_id
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        logger.error(f"Chat Error: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/audio")
+async def chat_audio(request: ChatRequest):
+    """
+    Returns the spoken reply directly as an audio/mpeg stream, sentence by sentence.
+    The reply text is sent percent-encoded in the X-Chat-Response header.
+    """
+    try:
+        brain = get_brain_agent()
+        speaker = get_speaker_agent()
+        session, history, language = await _open_session(request)
+        conversation_id = session.session_id if session else None
+        details = {}
+        response_text = await brain.chat(request.text, history, language, conversation_id, details)
+        await _record_turn(session, request.text, response_text, language)
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         logger.error(f"Chat Error: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    spoken_text = response_text.replace(FINISH_TOKEN, "").strip()
+    headers = {
+        "X-Chat-Response": quote(response_text),
+        "X-Chat-Finished": "true" if FINISH_TOKEN in response_text else "false",
+        "X-Model-Name": details["model_name"],
+        "Cache-Control": "no-store",
+    }
+    if conversation_id:
+        headers["X-Session-Id"] = conversation_id
+    return StreamingResponse(
+        speaker.synthesize_stream(spoken_text, language),
+        media_type="audio/mpeg",
+        headers=headers
+    )
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _chat_stream_events(request: ChatRequest, session: Optional[ChatSession], history: List[Dict[str, str]], language: str):
+    """
+    Streams LLM tokens as they arrive and synthesizes each completed sentence
+    while later tokens are still being generated. Audio chunks are emitted in order.
+    """
+    brain = get_brain_agent()
+    speaker = get_speaker_agent()
+    events: asyncio.Queue = asyncio.Queue()
+    pending_audio: asyncio.Queue = asyncio.Queue()
+    marker = MarkerFilter(FINISH_TOKEN)
+    splitter = SentenceSplitter()
+    reply_parts = []
+    details = {}
+
+    async def queue_sentence(sentence: str):
+        task = asyncio.create_task(speaker.text_to_speech(sentence, language))
+        await pending_audio.put((sentence, task))
+
+    conversation_id = session.session_id if session else None
+    messages, context = brain.build_chat_context(request.text, history, language, conversation_id)
+
+    async def produce_tokens():
+        try:
+            async for token in brain.stream_chat(messages, language, details):
+                visible = marker.feed(token)
+                if not visible:
+                    continue
+                reply_parts.append(visible)
+                await events.put(("token", {"text": visible}))
+                for sentence in splitter.feed(visible):
+                    await queue_sentence(sentence)
+            tail = marker.flush()
+            if tail:
+                reply_parts.append(tail)
+                await events.put(("token", {"text": tail}))
+                for sentence in splitter.feed(tail):
+                    await queue_sentence(sentence)
+            remainder = splitter.flush()
+            if remainder:
+                await queue_sentence(remainder)
+        finally:
+            await pending_audio.put(None)
+
+    async def deliver_audio():
+        index = 0
+        try:
+            while True:
+                item = await pending_audio.get()
+                if item is None:
+                    break
+                sentence, task = item
+                audio_base64 = await task
+                await events.put(("audio", {"index": index, "text": sentence, "audio_base64": audio_base64}))
+                index += 1
+        finally:
+            await events.put(None)
+
+    workers = [asyncio.create_task(produce_tokens()), asyncio.create_task(deliver_audio())]
+    try:
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            yield _sse(*item)
+        # A failed stream_chat still ends the event queue; re-raise it rather than record a truncated reply
+        await asyncio.gather(*workers)
+        response_text = "".join(reply_parts).strip()
+        await _record_turn(session, request.text, response_text + (f" {FINISH_TOKEN}" if marker.found else ""), language)
+        yield _sse("done", {
+            "response": response_text,
+            "finished": marker.found,
+            "model_name": details.get("model_name", brain.llm.model_name),
+            "prompt_tokens_saved": context.tokens_saved,
+            "session_id": conversation_id
+        })
+    except Exception:
+        import traceback
+        logger.error(f"Chat Stream Error: {traceback.format_exc()}")
+        yield _sse("error", {"detail": "Chat stream failed"})
+    finally:
+        for worker in workers:
+            if not worker.done():
+                worker.cancel()
+            elif not worker.cancelled():
+                # Already logged above; keeps asyncio from reporting it as unretrieved
+                worker.exception()
+        while not pending_audio.empty():
+            item = pending_audio.get_nowait()
+            if item is not None:
+                item[1].cancel()
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Server-Sent Events variant of /chat.
+    Emits `token` events as text arrives, `audio` events (one per sentence, in order)
+    and a final `done` event with the full reply and whether [FINISH] was detected.
+    """
+    session, history, language = await _open_session(request)
+    return StreamingResponse(
+        _chat_stream_events(request, session, history, language),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 if __name__ == "__main__":
     import uvicorn
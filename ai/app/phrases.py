@@ -0,0 +1,35 @@
+"""
+Fixed phrases the voice agent speaks in every conversation, per language.
+The chat persona is told to use them verbatim so their audio can be pre-rendered and cached.
+"""
+from typing import Dict, List
+
+CLOSING_QUESTION: Dict[str, str] = {
+    "English": "Is there anything else I can help you with?",
+    "Hindi": "क्या मैं आपकी किसी और चीज़ में मदद कर सकता हूँ?",
+    "Bengali": "আমি কি আপনাকে আর কিছুতে সাহায্য করতে পারি?",
+    "Tamil": "வேறு ஏதாவது உதவி தேவையா?",
+    "Telugu": "నేను మీకు ఇంకా ఏమైనా సహాయం చేయగలనా?",
+    "Marathi": "मी तुम्हाला आणखी कशात मदत करू शकतो का?",
+    "Gujarati": "શું હું તમને બીજી કોઈ બાબતમાં મદદ કરી શકું?",
+    "Kannada": "ನಾನು ನಿಮಗೆ ಇನ್ನೇನಾದರೂ ಸಹಾಯ ಮಾಡಬಹುದೇ?",
+    "Malayalam": "ഞാൻ നിങ്ങളെ മറ്റെന്തെങ്കിലും സഹായിക്കണോ?",
+    "Urdu": "کیا میں آپ کی کسی اور چیز میں مدد کر سکتا ہوں؟",
+}
+
+FILED_CONFIRMATION: Dict[str, str] = {
+    "English": "Thank you, your complaint has been filed and is being processed for verification.",
+    "Hindi": "धन्यवाद, आपकी शिकायत दर्ज कर ली गई है और सत्यापन के लिए प्रक्रिया में है।",
+    "Bengali": "ধন্যবাদ, আপনার অভিযোগ নথিভুক্ত করা হয়েছে এবং যাচাইয়ের জন্য প্রক্রিয়াধীন রয়েছে।",
+    "Tamil": "நன்றி, உங்கள் புகார் பதிவு செய்யப்பட்டு சரிபார்ப்புக்காக செயலாக்கப்படுகிறது.",
+    "Telugu": "ధన్యవాదాలు, మీ ఫిర్యాదు నమోదు చేయబడింది మరియు ధృవీకరణ కోసం ప్రాసెస్ చేయబడుతోంది.",
+    "Marathi": "धन्यवाद, तुमची तक्रार नोंदवली गेली आहे आणि पडताळणीसाठी प्रक्रिया सुरू आहे.",
+    "Gujarati": "આભાર, તમારી ફરિયાદ નોંધાઈ ગઈ છે અને ચકાસણી માટે પ્રક્રિયા હેઠળ છે.",
+    "Kannada": "ಧನ್ಯವಾದಗಳು, ನಿಮ್ಮ ದೂರನ್ನು ದಾಖಲಿಸಲಾಗಿದೆ ಮತ್ತು ಪರಿಶೀಲನೆಗಾಗಿ ಪ್ರಕ್ರಿಯೆಗೊಳಿಸಲಾಗುತ್ತಿದೆ.",
+    "Malayalam": "നന്ദി, നിങ്ങളുടെ പരാതി രജിസ്റ്റർ ചെയ്തു, പരിശോധനയ്ക്കായി നടപടികൾ പുരോഗമിക്കുന്നു.",
+    "Urdu": "شکریہ، آپ کی شکایت درج کر لی گئی ہے اور تصدیق کے لیے کارروائی جاری ہے۔",
+}
+
+def all_phrases(language: str) -> List[str]:
+    """Every fixed phrase available for a language."""
+    return [table[language] for table in (CLOSING_QUESTION, FILED_CONFIRMATION) if language in table]
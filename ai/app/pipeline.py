@@ -0,0 +1,93 @@
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.utils.audio import AudioSource
+from app.utils.fetcher import get_audio_fetcher
+from app.agents.listener import get_listener_agent
+from app.agents.brain import get_brain_agent
+from app.schemas import AnalysisResponse
+from app.clusters import get_complaint_index, labels_key, sync_complaint_index
+
+import logging
+logger = logging.getLogger(__name__)
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+async def analyze_with_clusters(text: str, labels: List[str], multi_label: bool = False, use_cache: bool = True) -> AnalysisResponse:
+    """
+    Analyzes a complaint and files it into its near-duplicate cluster.
+    A near-identical recent complaint asked with the same labels supplies the analysis without an LLM call.
+    """
+    index = get_complaint_index()
+    if index is None:
+        return await get_brain_agent().analyze_complaint(text, labels, multi_label, use_cache=use_cache)
+
+    key = labels_key(labels, multi_label)
+    # With several workers, see what the others indexed first (no-op otherwise)
+    await sync_complaint_index()
+    match = index.match(text, key) if use_cache else None
+    if match and match.analysis:
+        result = AnalysisResponse(**match.analysis)
+    else:
+        result = await get_brain_agent().analyze_complaint(text, labels, multi_label, use_cache=use_cache)
+        # Duplicates may have arrived at other workers during the LLM call
+        await sync_complaint_index()
+    reused = bool(match and match.analysis)
+
+    # Fallback answers (confidence 0) are indexed for clustering but never reused
+    analysis = result.model_dump(include=set(AnalysisResponse.model_fields) - {"cluster_id", "cluster_size", "similarity", "reused"})
+    cluster_id, similarity = index.add(text, result.location_hint, key, analysis if result.confidence > 0 else None)
+    await sync_complaint_index()
+    return result.model_copy(update={
+        "cluster_id": cluster_id,
+        "cluster_size": index.cluster_size(cluster_id),
+        "similarity": round(similarity, 3),
+        "reused": reused,
+    })
+
+async def run_voice_intake(
+    source: Optional[AudioSource],
+    audio_url: Optional[str],
+    language_hint: Optional[str],
+    labels: List[str],
+    multi_label: bool = False
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Voice complaint intake in one pass: fetch -> preprocess -> transcribe -> analyze.
+    Yields ("transcript", ...) as soon as the text is known, then ("analysis", ...) and
+    finally ("done", {"timings": ...}) with per-stage timings in milliseconds.
+    The LLM connection is warmed up while the audio is fetched and transcribed.
+    """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    brain = get_brain_agent()
+    warm_up = asyncio.create_task(brain.warm_up())
+    fetched = None
+    try:
+        if audio_url:
+            stage = time.perf_counter()
+            fetched = (await get_audio_fetcher().fetch(audio_url)).source
+            timings["fetch_ms"] = _elapsed_ms(stage)
+            source = fetched
+
+        transcript = await get_listener_agent().transcribe(source, language_hint=language_hint, timings=timings)
+        yield "transcript", transcript.model_dump()
+
+        analysis = None
+        if transcript.text.strip():
+            stage = time.perf_counter()
+            analysis = await analyze_with_clusters(transcript.text, labels, multi_label)
+            timings["analyze_ms"] = _elapsed_ms(stage)
+        yield "analysis", analysis.model_dump() if analysis else None
+
+        timings = {name: round(value, 1) for name, value in timings.items()}
+        timings["total_ms"] = _elapsed_ms(started)
+        logger.info(f"Voice intake timings: {timings}")
+        yield "done", {"timings": timings}
+    finally:
+        if fetched:
+            fetched.close()
+        if not warm_up.done():
+            warm_up.cancel()
@@ -1,11 +1,38 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Literal
+from typing import Any, List, Dict, Optional, Literal
+
+class TranscriptionSegment(BaseModel):
+    start: float
+    end: float
+    text: str
+    confidence: Optional[float] = None
 
 class TranscriptionResponse(BaseModel):
     text: str
     language: Optional[str] = None
     confidence: Optional[float] = 0.0
     model_name: str
+    duration: Optional[float] = None
+    segments: List[TranscriptionSegment] = []
+
+class LiveTranscriptEvent(BaseModel):
+    # ready, partial (utterance still in progress), final (utterance finished), done or error
+    type: Literal["ready", "partial", "final", "done", "error"]
+    # Utterance number within the stream, from 0
+    segment: Optional[int] = None
+    # Seconds from the start of the stream
+    start: Optional[float] = None
+    end: Optional[float] = None
+    text: Optional[str] = None
+    language: Optional[str] = None
+    confidence: Optional[float] = None
+    # The whole stream's transcript, on "done"
+    transcript: Optional[TranscriptionResponse] = None
+    detail: Optional[str] = None
+
+class TranscriptionBatchRequest(BaseModel):
+    audio_urls: List[str] = Field(..., min_length=1)
+    language: Optional[str] = None
 
 class ClassificationRequest(BaseModel):
     text: str
@@ -30,12 +57,84 @@ class ExtractionResponse(BaseModel):
     language: Optional[str] = None
     model_name: str
 
+class AnalysisRequest(BaseModel):
+    text: str
+    labels: List[str]
+    multi_label: bool = False
+
+class AnalysisResponse(BaseModel):
+    top_label: str
+    scores: Dict[str, float]
+    category: str
+    confidence: float
+    urgency: Literal["low", "medium", "high"]
+    location_hint: Optional[str] = None
+    summary: str = Field(..., max_length=300)
+    language: Optional[str] = None
+    model_name: str
+    # Near-duplicate cluster of recent complaints this one belongs to
+    cluster_id: Optional[str] = None
+    cluster_size: Optional[int] = None
+    # Estimated similarity to the closest earlier complaint (0 when it started a new cluster)
+    similarity: Optional[float] = None
+    # True when the analysis was copied from a near-identical earlier complaint instead of calling the LLM
+    reused: bool = False
+
+class IntakeResponse(BaseModel):
+    transcript: TranscriptionResponse
+    # None when nothing intelligible was said
+    analysis: Optional[AnalysisResponse] = None
+    # Milliseconds per stage: fetch_ms, preprocess_ms, transcribe_ms, analyze_ms, total_ms
+    timings: Dict[str, float] = {}
+
+class TranscriptionJobResponse(BaseModel):
+    job_id: str
+    # queued, running, completed, failed or cancelled
+    status: str
+    attempts: int = 0
+    max_attempts: int
+    audio_url: Optional[str] = None
+    language: Optional[str] = None
+    metadata: Dict[str, Any] = {}
+    result: Optional[TranscriptionResponse] = None
+    # Last error; kept while a failed attempt is being retried
+    error: Optional[str] = None
+    # pending, delivered or failed; None without a callback URL
+    callback_status: Optional[str] = None
+    created_at: float
+    updated_at: float
+    finished_at: Optional[float] = None
+
 class ChatRequest(BaseModel):
     text: str
     history: List[Dict[str, str]] = []
     language: str = "English"
+    # When set, history is kept on the server and `history` is ignored
+    session_id: Optional[str] = None
+    # "base64": audio inline in the JSON body; "url": audio published under /static and linked; "none": text only
+    audio_mode: Literal["base64", "url", "none"] = "base64"
 
 class ChatResponse(BaseModel):
     response: str
     audio_base64: Optional[str] = None
+    audio_url: Optional[str] = None
     model_name: str
+    prompt_tokens_saved: Optional[int] = None
+    session_id: Optional[str] = None
+
+class SessionCreateRequest(BaseModel):
+    language: str = "English"
+    # Labels to extract complaint fields against as the conversation progresses
+    labels: List[str] = []
+
+class SessionResponse(BaseModel):
+    session_id: str
+    language: str
+    detected_language: Optional[str] = None
+    labels: List[str] = []
+    history: List[Dict[str, str]] = []
+    extracted: Dict[str, Any] = {}
+    summary: Optional[str] = None
+    finished: bool = False
+    created_at: float
+    updated_at: float
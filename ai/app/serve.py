@@ -0,0 +1,161 @@
+"""
+Runs the service on several worker processes sharing one listening socket.
+
+The app is imported once in this process before the workers are forked (preloaded), so they start
+quickly and share its memory copy-on-write. Each worker then runs its own event loop, lifespan and
+upstream connections. State that must be common to all workers lives in SQLite (see
+app.utils.shared_state), and Prometheus metrics are collected across workers.
+
+    python -m app.serve --workers 4 --port 8000
+
+Workers that die are restarted. SIGTERM or SIGINT shuts them down gracefully, waiting up to
+--graceful-timeout seconds. Without os.fork (Windows), uvicorn's own multi-process mode is used,
+without preloading.
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+from typing import Dict
+
+def _prepare_environment(workers: int):
+    # Read by the app at import time, so set before anything from app is imported
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    if workers > 1:
+        metrics_dir = os.environ.setdefault(
+            "PROMETHEUS_MULTIPROC_DIR", os.path.join(os.getenv("SHARED_STATE_DIR", "data"), "metrics")
+        )
+        # Counters from a previous run would otherwise be added to this one's
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+class Supervisor:
+    """Forks the workers, restarts any that die and stops them all on SIGTERM/SIGINT."""
+    def __init__(self, app, sock: socket.socket, workers: int, graceful_timeout: float, log_level: str):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}
+        self.stopping = False
+
+    def spawn(self, number: int):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = number
+            return
+        # In the worker: never return into the supervisor's loop
+        code = 0
+        try:
+            self._serve()
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            from app.utils.logs import stop_logging
+            stop_logging()
+            os._exit(code)
+
+    def _serve(self):
+        import uvicorn
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan="on")
+        # Handles SIGTERM/SIGINT itself: stops accepting, finishes requests, runs the lifespan shutdown
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for number in range(self.workers):
+            self.spawn(number)
+        print(f"Started {self.workers} workers: {', '.join(map(str, self.children))}", flush=True)
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid and pid in self.children:
+                number = self.children.pop(pid)
+                self._forget_metrics(pid)
+                if not self.stopping:
+                    print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting", flush=True)
+                    # A worker failing at startup should not turn into a fork loop
+                    time.sleep(1)
+                    self.spawn(number)
+                continue
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self):
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+                self._forget_metrics(pid)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            print(f"Worker {pid} did not stop in time, killing it", flush=True)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    @staticmethod
+    def _forget_metrics(pid: int):
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid)
+
+def run(host: str = "0.0.0.0", port: int = 8000, workers: int = 1, graceful_timeout: float = 30.0, log_level: str = "info"):
+    _prepare_environment(workers)
+    if workers <= 1 or not hasattr(os, "fork"):
+        import uvicorn
+        uvicorn.run("app.main:app", host=host, port=port, workers=workers, log_level=log_level)
+        return
+    sock = _bind(host, port)
+    # Preload: heavy imports and module-level setup happen once, before forking
+    from app.main import app
+    print(f"Listening on http://{host}:{port}", flush=True)
+    Supervisor(app, sock, workers, graceful_timeout, log_level).run()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+                        help="Worker processes (default WEB_CONCURRENCY or 1); about one per core")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    run(args.host, args.port, args.workers, args.graceful_timeout, args.log_level)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import os
+import abc
+import time
+import uuid
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.utils.shared_state import connect, shared_path
+
+import logging
+logger = logging.getLogger(__name__)
+
+class ChatSession(BaseModel):
+    """Server-side conversation state, so clients only send the new utterance each turn."""
+    session_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+    language: str = "English"
+    detected_language: Optional[str] = None
+    labels: List[str] = []
+    history: List[Dict[str, str]] = []
+    # Complaint fields extracted so far (category, urgency, location_hint, summary, ...)
+    extracted: Dict[str, Any] = {}
+    # Running conversation summary and how many history messages it covers
+    summary: Optional[str] = None
+    summary_covered: int = 0
+    finished: bool = False
+
+class SessionStore(abc.ABC):
+    """Base class for session backends. Subclasses implement _load/_save/_delete."""
+    def __init__(self, ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @asynccontextmanager
+    async def locked(self, session_id: str):
+        """Serializes read-modify-write cycles on one session within this process."""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        async with lock:
+            yield
+
+    async def create(self, **fields) -> ChatSession:
+        session = ChatSession(**fields)
+        await self.save(session)
+        return session
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        return await self._load(session_id)
+
+    async def save(self, session: ChatSession):
+        session.updated_at = time.time()
+        await self._save(session)
+
+    async def delete(self, session_id: str):
+        await self._delete(session_id)
+
+    async def update(self, session_id: str, mutate: Callable[[ChatSession], None]) -> Optional[ChatSession]:
+        """
+        Applies `mutate` to the stored session and saves it, with no other update in between.
+        Returns the saved session, or None if it no longer exists. `mutate` must not await.
+        """
+        async with self.locked(session_id):
+            session = await self._load(session_id)
+            if session is None:
+                return None
+            mutate(session)
+            await self.save(session)
+            return session
+
+    @abc.abstractmethod
+    async def _load(self, session_id: str) -> Optional[ChatSession]:
+        ...
+
+    @abc.abstractmethod
+    async def _save(self, session: ChatSession):
+        ...
+
+    @abc.abstractmethod
+    async def _delete(self, session_id: str):
+        ...
+
+class MemorySessionStore(SessionStore):
+    """In-process sessions with TTL eviction on access."""
+    def __init__(self, ttl_seconds: float = 3600, max_sessions: int = 10000):
+        super().__init__(ttl_seconds)
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl_seconds
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.updated_at >= cutoff and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[session_id]
+
+    async def _load(self, session_id: str) -> Optional[ChatSession]:
+        self._evict()
+        session = self.sessions.get(session_id)
+        return session.model_copy(deep=True) if session else None
+
+    async def _save(self, session: ChatSession):
+        self.sessions[session.session_id] = session.model_copy(deep=True)
+        self.sessions.move_to_end(session.session_id)
+        self._evict()
+
+    async def _delete(self, session_id: str):
+        self.sessions.pop(session_id, None)
+
+class SQLiteSessionStore(SessionStore):
+    """Persistent sessions in a local SQLite file, surviving restarts and shared by all worker processes."""
+    def __init__(self, db_path: str, ttl_seconds: float = 3600):
+        super().__init__(ttl_seconds)
+        self.lock = threading.Lock()
+        self.conn = connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        self.conn.commit()
+        self.saves = 0
+
+    def _load_sync(self, session_id: str) -> Optional[ChatSession]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data, expires_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return ChatSession.model_validate_json(row[0])
+
+    def _save_sync(self, session: ChatSession):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session.session_id, session.model_dump_json(), session.updated_at + self.ttl_seconds)
+            )
+            self.saves += 1
+            if self.saves % 100 == 1:
+                self.conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+            self.conn.commit()
+
+    def _update_sync(self, session_id: str, mutate: Callable[[ChatSession], None]) -> Optional[ChatSession]:
+        with self.lock:
+            # Holds the write lock from read to write, so updates from other workers cannot interleave
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT data, expires_at FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row is None or row[1] < time.time():
+                    self.conn.rollback()
+                    return None
+                session = ChatSession.model_validate_json(row[0])
+                mutate(session)
+                session.updated_at = time.time()
+                self.conn.execute(
+                    "UPDATE sessions SET data = ?, expires_at = ? WHERE id = ?",
+                    (session.model_dump_json(), session.updated_at + self.ttl_seconds, session_id)
+                )
+                self.conn.commit()
+                return session
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    async def update(self, session_id: str, mutate: Callable[[ChatSession], None]) -> Optional[ChatSession]:
+        async with self.locked(session_id):
+            return await asyncio.to_thread(self._update_sync, session_id, mutate)
+
+    def _delete_sync(self, session_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self.conn.commit()
+
+    async def _load(self, session_id: str) -> Optional[ChatSession]:
+        return await asyncio.to_thread(self._load_sync, session_id)
+
+    async def _save(self, session: ChatSession):
+        await asyncio.to_thread(self._save_sync, session)
+
+    async def _delete(self, session_id: str):
+        await asyncio.to_thread(self._delete_sync, session_id)
+
+# Singleton instance
+session_store: Optional[SessionStore] = None
+
+def get_session_store() -> SessionStore:
+    global session_store
+    if session_store is None:
+        ttl_seconds = float(os.getenv("SESSION_TTL", "3600"))
+        max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+        # With several workers sessions default to SQLite, since any worker may serve the next turn
+        db_path = shared_path("SESSION_STORE_DB", "sessions.sqlite3")
+        if db_path:
+            session_store = SQLiteSessionStore(db_path, ttl_seconds)
+        else:
+            session_store = MemorySessionStore(ttl_seconds, max_sessions)
+    return session_store
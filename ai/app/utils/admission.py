@@ -0,0 +1,278 @@
+import os
+import json
+import math
+import time
+import asyncio
+from typing import Dict, Optional
+
+from app.utils.deadline import set_deadline, reset_deadline
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Which admission group each endpoint belongs to; anything else (stats, sessions, static files) is not limited
+ROUTE_GROUPS = {
+    "/transcribe": "transcribe",
+    "/transcribe/batch": "transcribe",
+    "/intake/voice": "transcribe",
+    "/classify": "llm",
+    "/extract": "llm",
+    "/analyze": "llm",
+    "/classify/batch": "llm",
+    "/extract/batch": "llm",
+    "/chat": "chat",
+    "/chat/audio": "chat",
+    "/chat/stream": "chat",
+}
+
+# (concurrent requests, waiting requests, deadline seconds) per group; see get_admission_controller
+DEFAULT_GROUPS = {
+    "transcribe": (8, 32, 120.0),
+    "llm": (32, 128, 30.0),
+    "chat": (32, 64, 60.0),
+}
+
+class Rejected(Exception):
+    def __init__(self, status: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+class AdmissionGroup:
+    """
+    A concurrency limit with a bounded wait queue. Requests beyond the queue are refused
+    immediately (429) and requests that wait longer than `queue_timeout` are refused (503),
+    both with a Retry-After estimated from recent service times.
+    """
+    def __init__(self, name: str, limit: int, queue: int, timeout: float, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+        self.cancelled = 0
+        self.deadline_exceeded = 0
+        # Moving average of how long an admitted request holds its slot
+        self.avg_service = 1.0
+
+    def retry_after(self) -> float:
+        """Rough time until a newly queued request would be admitted."""
+        return max(1.0, self.avg_service * (self.waiting + 1) / self.limit)
+
+    async def enter(self, deadline: float):
+        if self.semaphore.locked() and self.waiting >= self.queue:
+            self.rejected["queue_full"] += 1
+            raise Rejected(429, f"Too many {self.name} requests queued", self.retry_after())
+        self.waiting += 1
+        try:
+            wait = min(self.queue_timeout, deadline - time.monotonic())
+            # Not wait_for: it can time out after the acquire succeeded, leaking the permit
+            async with asyncio.timeout(max(0.0, wait)):
+                await self.semaphore.acquire()
+        except TimeoutError:
+            self.rejected["queue_timeout"] += 1
+            raise Rejected(503, f"Timed out waiting for a {self.name} slot", self.retry_after()) from None
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def leave(self, held: float):
+        self.in_flight -= 1
+        self.semaphore.release()
+        self.avg_service += (held - self.avg_service) * 0.1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "limit": self.limit,
+            "queue_limit": self.queue,
+            "in_flight": self.in_flight,
+            "queued": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "cancelled": self.cancelled,
+            "deadline_exceeded": self.deadline_exceeded,
+            "avg_service_ms": round(self.avg_service * 1000, 1),
+            "retry_after": math.ceil(self.retry_after()),
+        }
+
+class AdmissionController:
+    def __init__(self, groups: Dict[str, AdmissionGroup], max_body_bytes: int = 0):
+        self.groups = groups
+        self.max_body_bytes = max_body_bytes
+
+    def group_for(self, path: str) -> Optional[AdmissionGroup]:
+        name = ROUTE_GROUPS.get(path.rstrip("/") or "/")
+        return self.groups.get(name) if name else None
+
+    def stats(self) -> Dict[str, object]:
+        return {name: group.stats() for name, group in self.groups.items()}
+
+class _RequestWatcher:
+    """
+    Wraps an HTTP request's receive/send. Once the body has been read, the only message left
+    is http.disconnect, so a background reader can notice the client leaving while the app works.
+    """
+    def __init__(self, receive, send):
+        self._receive = receive
+        self._send = send
+        self.disconnected = asyncio.Event()
+        self.body_read = asyncio.Event()
+        self.response_started = False
+        self.response_complete = False
+
+    async def receive(self):
+        if self.body_read.is_set():
+            await self.disconnected.wait()
+            return {"type": "http.disconnect"}
+        message = await self._receive()
+        if message["type"] == "http.disconnect":
+            self.disconnected.set()
+        elif not message.get("more_body", False):
+            self.body_read.set()
+        return message
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.response_started = True
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            self.response_complete = True
+        await self._send(message)
+
+    async def watch(self):
+        await self.body_read.wait()
+        while not self.disconnected.is_set():
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                self.disconnected.set()
+
+async def _respond(send, status: int, detail: str, headers: Optional[Dict[str, str]] = None):
+    body = json.dumps({"detail": detail}).encode()
+    raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    raw_headers += [(name.encode(), value.encode()) for name, value in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+def _request_timeout(headers: Dict[bytes, bytes], default: float) -> float:
+    """X-Request-Timeout (seconds) lets the caller shorten, but not extend, the group's deadline."""
+    value = headers.get(b"x-request-timeout")
+    if value:
+        try:
+            return max(0.1, min(default, float(value)))
+        except ValueError:
+            pass
+    return default
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware in front of the expensive endpoints. It applies per-group concurrency
+    limits with bounded queues, refuses oversized bodies before they are read, sets the
+    request deadline that upstream calls observe, and cancels work when the client disconnects.
+    """
+    def __init__(self, app, controller: Optional["AdmissionController"] = None):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        controller = self.controller or get_admission_controller()
+        group = controller.group_for(scope["path"])
+        if group is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        if controller.max_body_bytes:
+            try:
+                length = int(headers.get(b"content-length", b"0"))
+            except ValueError:
+                length = 0
+            if length > controller.max_body_bytes:
+                return await _respond(send, 413, f"Request body larger than {controller.max_body_bytes} bytes")
+
+        deadline = time.monotonic() + _request_timeout(headers, group.timeout)
+        try:
+            await group.enter(deadline)
+        except Rejected as e:
+            logger.warning(f"Rejected {scope['path']}: {e.detail}")
+            return await _respond(send, e.status, e.detail, {"Retry-After": str(math.ceil(e.retry_after))})
+
+        started = time.monotonic()
+        token = set_deadline(deadline)
+        try:
+            await self._run(group, scope, receive, send, deadline)
+        finally:
+            reset_deadline(token)
+            group.leave(time.monotonic() - started)
+
+    async def _run(self, group: AdmissionGroup, scope, receive, send, deadline: float):
+        watcher = _RequestWatcher(receive, send)
+        # The app task copies the current context, so it sees the request deadline
+        app_task = asyncio.create_task(self.app(scope, watcher.receive, watcher.send))
+        disconnect_task = asyncio.create_task(watcher.watch())
+        try:
+            timeout = deadline - time.monotonic()
+            while True:
+                done, _ = await asyncio.wait(
+                    {app_task, disconnect_task},
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if app_task in done:
+                    return app_task.result()
+                if disconnect_task in done:
+                    if watcher.response_complete:
+                        # Server-side "disconnect" after the response was sent; let the app finish
+                        await app_task
+                        return
+                    group.cancelled += 1
+                    logger.info(f"Client disconnected, cancelling {scope['path']}")
+                    await _cancel(app_task)
+                    return
+                if not watcher.response_started:
+                    group.deadline_exceeded += 1
+                    logger.warning(f"Deadline exceeded for {scope['path']}")
+                    await _cancel(app_task)
+                    await _respond(send, 504, "Request deadline exceeded")
+                    return
+                # A streaming response already under way runs to completion (or disconnect)
+                timeout = None
+        finally:
+            disconnect_task.cancel()
+            if not app_task.done():
+                await _cancel(app_task)
+
+async def _cancel(task: asyncio.Task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.debug(f"Cancelled request raised {type(e).__name__}: {e}")
+
+# Singleton instance
+admission_controller: Optional[AdmissionController] = None
+
+def get_admission_controller() -> AdmissionController:
+    global admission_controller
+    if admission_controller is None:
+        queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+        groups = {}
+        for name, (limit, queue, timeout) in DEFAULT_GROUPS.items():
+            prefix = f"ADMISSION_{name.upper()}"
+            groups[name] = AdmissionGroup(
+                name,
+                limit=max(1, int(os.getenv(f"{prefix}_LIMIT", str(limit)))),
+                queue=max(0, int(os.getenv(f"{prefix}_QUEUE", str(queue)))),
+                timeout=float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),
+                queue_timeout=queue_timeout
+            )
+        admission_controller = AdmissionController(groups, max_body_bytes=int(os.getenv("MAX_BODY_BYTES", str(50 * 1024 * 1024))))
+    return admission_controller
@@ -1,40 +1,88 @@
 import os
-import requests
+import time
 import uuid
-from typing import Optional
+import asyncio
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Optional
+
+from contextlib import aclosing
+from fastapi import Request
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException
+from starlette.formparsers import MultiPartException, MultiPartParser, parse_options_header
+
+import logging
+logger = logging.getLogger(__name__)
 
 TEMP_DIR = "temp"
 
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR)
 
-def download_audio(url: str) -> str:
-    """Downloads audio from a URL and returns the local file path."""
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    file_extension = url.split('.')[-1] if '.' in url else 'mp3'
+# Audio is kept in memory up to this size and only spills to disk (in TEMP_DIR) above it
+SPOOL_MAX_BYTES = int(os.getenv("AUDIO_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+
+class SpooledMultiPartParser(MultiPartParser):
+    """Keeps uploaded files in memory up to SPOOL_MAX_BYTES instead of Starlette's 1MB default."""
+    spool_max_size = SPOOL_MAX_BYTES
+
+class UploadRequest(Request):
+    """
+    A request whose multipart body is parsed with SpooledMultiPartParser. Other bodies are left to Starlette.
+    Overrides Request._get_form, which form() awaits in Starlette 0.46 to 1.x (the range FastAPI requires).
+    """
+    async def _get_form(self, **limits):
+        content_type, _ = parse_options_header(self.headers.get("Content-Type"))
+        if self._form is None and content_type == b"multipart/form-data":
+            try:
+                async with aclosing(self.stream()) as stream:
+                    self._form = await SpooledMultiPartParser(self.headers, stream, **limits).parse()
+            except MultiPartException as e:
+                raise HTTPException(status_code=400, detail=e.message)
+        return await super()._get_form(**limits)
+
+class UploadRoute(APIRoute):
+    """Route class that hands endpoints an UploadRequest; set as the app router's route_class."""
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def upload_handler(request: Request):
+            return await handler(UploadRequest(request.scope, request.receive))
+        return upload_handler
+
+class AudioSource:
+    """
+    Audio held as a file-like object (in memory, or spilled to disk when large)
+    that can be handed straight to the transcription request.
+    """
+    def __init__(self, filename: str, file: BinaryIO, size: Optional[int] = None):
+        self.filename = filename
+        self.file = file
+        self.size = size
+
+    def close(self):
+        try:
+            self.file.close()
+        except Exception as e:
+            logger.warning(f"Error closing audio buffer {self.filename}: {e}")
+
+def filename_from_url(url: str) -> str:
+    path = url.split('?')[0]
+    file_extension = path.split('.')[-1] if '.' in path.split('/')[-1] else 'mp3'
     # Sanitize extension
     if len(file_extension) > 5:
         file_extension = 'mp3'
-        
-    file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.{file_extension}")
-    
-    with open(file_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-            
-    return file_path
-
-def save_upload(file_content: bytes, filename: str) -> str:
-    """Saves uploaded file bytes and returns the local file path."""
-    file_extension = filename.split('.')[-1] if '.' in filename else 'mp3'
-    file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.{file_extension}")
-    
-    with open(file_path, 'wb') as f:
-        f.write(file_content)
-        
-    return file_path
+    return f"audio.{file_extension}"
+
+def spooled_buffer() -> SpooledTemporaryFile:
+    return SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=TEMP_DIR)
+
+def upload_source(filename: Optional[str], file: BinaryIO) -> AudioSource:
+    """Wraps an uploaded file (already spooled by the multipart parser) without copying it."""
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return AudioSource(filename or "audio.mp3", file, size)
 
 def delete_temp_file(file_path: str):
     """Safely deletes a temporary file."""
@@ -42,4 +90,47 @@ def delete_temp_file(file_path: str):
         try:
             os.remove(file_path)
         except Exception as e:
-            print(f"Error deleting temp file {file_path}: {e}")
+            logger.warning(f"Error deleting temp file {file_path}: {e}")
+
+def write_atomic(path: str, data: bytes):
+    """
+    Writes to a unique temp file in the same directory, then renames it over `path`, so readers never see
+    a partial file and concurrent writers (threads or processes) never share a temp file. Last writer wins.
+    """
+    # Not mkstemp: its 0600 mode would carry over to files served from static/
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, "xb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        delete_temp_file(temp_path)
+        raise
+
+def sweep_temp_dir(max_age_seconds: float, directory: str = TEMP_DIR) -> int:
+    """Deletes files in the directory older than max_age_seconds and returns how many were removed."""
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    if not os.path.isdir(directory):
+        return 0
+    for entry in os.scandir(directory):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                delete_temp_file(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+async def run_temp_sweeper():
+    """Periodically removes orphaned temp files left behind by crashed or aborted requests."""
+    interval = float(os.getenv("TEMP_SWEEP_INTERVAL", "600"))
+    max_age = float(os.getenv("TEMP_MAX_AGE", "3600"))
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_temp_dir, max_age)
+            if removed:
+                logger.info(f"Temp sweeper removed {removed} orphaned files")
+        except Exception as e:
+            logger.error(f"Temp sweeper error: {e}")
+        await asyncio.sleep(interval)
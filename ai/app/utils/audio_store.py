@@ -0,0 +1,55 @@
+import os
+import asyncio
+import hashlib
+
+from fastapi.staticfiles import StaticFiles
+
+from app.utils.audio import write_atomic, sweep_temp_dir
+from app.utils.metrics import span
+
+import logging
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+AUDIO_SUBDIR = "audio"
+AUDIO_DIR = os.path.join(STATIC_DIR, AUDIO_SUBDIR)
+
+# How long generated reply audio stays available (and cacheable by clients)
+AUDIO_URL_TTL = int(os.getenv("AUDIO_URL_TTL", "3600"))
+
+os.makedirs(AUDIO_DIR, exist_ok=True)
+
+def _store(data: bytes) -> str:
+    name = f"{hashlib.sha256(data).hexdigest()}.mp3"
+    # Rewriting identical content is harmless and also extends the lifetime of an already published file
+    write_atomic(os.path.join(AUDIO_DIR, name), data)
+    return name
+
+async def store_audio(data: bytes) -> str:
+    """Publishes MP3 bytes under a content-hash name and returns the path relative to /static."""
+    with span("audio_write"):
+        name = await asyncio.to_thread(_store, data)
+    return f"{AUDIO_SUBDIR}/{name}"
+
+class AudioStaticFiles(StaticFiles):
+    """
+    StaticFiles already sends ETag and Last-Modified. Audio files are content-addressed
+    and never change, so they are also marked immutable for the lifetime of the file.
+    """
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if path.startswith(AUDIO_SUBDIR + "/") and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = f"public, max-age={AUDIO_URL_TTL}, immutable"
+        return response
+
+async def run_audio_expiry():
+    """Deletes published reply audio once it is older than AUDIO_URL_TTL."""
+    interval = min(300, max(10, AUDIO_URL_TTL // 4))
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_temp_dir, AUDIO_URL_TTL, AUDIO_DIR)
+            if removed:
+                logger.info(f"Expired {removed} reply audio files")
+        except Exception as e:
+            logger.error(f"Audio expiry error: {e}")
+        await asyncio.sleep(interval)
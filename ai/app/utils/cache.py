@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.utils.metrics import RESULT_CACHE_LOOKUPS
+from app.utils.shared_state import connect, shared_path
+
+import logging
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Normalizes complaint text so trivially different submissions share a cache entry."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+def make_key(kind: str, text: str, labels: List[str], model_name: str, prompt_version: str, multi_label: bool = False) -> str:
+    """Builds a content-addressed cache key for an LLM result."""
+    payload = json.dumps({
+        "kind": kind,
+        "text": normalize_text(text),
+        "labels": sorted(label.strip() for label in labels),
+        "multi_label": multi_label,
+        "model": model_name,
+        "prompt": prompt_version,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class _DiskTier:
+    """SQLite-backed tier so cached results survive restarts and are shared by all worker processes."""
+    def __init__(self, db_path: str):
+        self.lock = threading.Lock()
+        self.conn = connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any], expires_at: float):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self.conn.commit()
+
+    def purge_expired(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),))
+            self.conn.commit()
+
+class ResultCache:
+    """
+    Two-tier cache for LLM results: an in-memory LRU with TTL in front of an
+    optional SQLite tier. Values are plain dicts (model_dump of the response).
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.disk = _DiskTier(db_path) if db_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk:
+            self.disk.purge_expired()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self.get_any([key])
+
+    async def get_any(self, keys: List[str]) -> Optional[Dict[str, Any]]:
+        """The value of the first of `keys` that is cached, counted as one lookup."""
+        for key in keys:
+            value = await self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                RESULT_CACHE_LOOKUPS.labels("hits").inc()
+                return value
+        self.misses += 1
+        RESULT_CACHE_LOOKUPS.labels("misses").inc()
+        return None
+
+    async def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at >= time.time():
+                self.memory.move_to_end(key)
+                return value
+            del self.memory[key]
+
+        if self.disk:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self._remember(key, value, time.time() + self.ttl_seconds)
+                self.disk_hits += 1
+                return value
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value, expires_at)
+            except Exception as e:
+                logger.error(f"Result cache write failed: {e}")
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float):
+        self.memory[key] = (expires_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+            "persistent": self.disk is not None,
+        }
+
+# Singleton instance
+result_cache: Optional[ResultCache] = None
+
+def get_result_cache() -> ResultCache:
+    global result_cache
+    if result_cache is None:
+        result_cache = ResultCache(
+            max_entries=int(os.getenv("RESULT_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", "86400")),
+            # With several workers the SQLite tier defaults on, so a result computed by one serves all
+            db_path=shared_path("RESULT_CACHE_DB", "results.sqlite3")
+        )
+    return result_cache
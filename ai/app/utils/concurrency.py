@@ -0,0 +1,53 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+# Default number of in-flight calls allowed per upstream dependency.
+# Each can be overridden with <NAME>_CONCURRENCY, e.g. LLM_CONCURRENCY=32.
+DEFAULT_LIMITS = {
+    "llm": 16,
+    "transcription": 8,
+    "tts": 4,
+    "download": 16,
+    "ffmpeg": 4,
+}
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+def get_limit(name: str) -> int:
+    """Returns the configured concurrency limit for a dependency."""
+    value = os.getenv(f"{name.upper()}_CONCURRENCY")
+    if value:
+        return max(1, int(value))
+    return DEFAULT_LIMITS.get(name, 8)
+
+def get_semaphore(name: str) -> asyncio.Semaphore:
+    """Returns the shared semaphore bounding concurrent calls to a dependency."""
+    if name not in _semaphores:
+        _semaphores[name] = asyncio.Semaphore(get_limit(name))
+    return _semaphores[name]
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """Returns a dedicated, bounded thread pool for blocking work of a dependency."""
+    if name not in _executors:
+        _executors[name] = ThreadPoolExecutor(
+            max_workers=get_limit(name),
+            thread_name_prefix=name
+        )
+    return _executors[name]
+
+async def run_blocking(name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs a blocking function on the dependency's thread pool so it never
+    stalls the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(name), partial(func, *args, **kwargs))
+
+def shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
@@ -0,0 +1,46 @@
+import time
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# Absolute time.monotonic() by which the current request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before an upstream call could finish."""
+
+def set_deadline(deadline: Optional[float]) -> contextvars.Token:
+    return _deadline.set(deadline)
+
+def reset_deadline(token: contextvars.Token):
+    _deadline.reset(token)
+
+def time_left() -> Optional[float]:
+    """Seconds until the current request's deadline, or None when it has none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+@asynccontextmanager
+async def within_deadline(operation: str):
+    """Bounds the block by the request deadline, raising DeadlineExceeded instead of starting or finishing late."""
+    remaining = time_left()
+    if remaining is None:
+        yield
+        return
+    if remaining <= 0:
+        raise DeadlineExceeded(f"No time left for {operation}")
+    timeout = asyncio.timeout(remaining)
+    try:
+        async with timeout:
+            yield
+    except TimeoutError:
+        if timeout.expired():
+            raise DeadlineExceeded(f"Deadline passed during {operation}") from None
+        raise
+
+def detached_context() -> contextvars.Context:
+    """A copy of the current context without the request deadline, for background tasks that outlive the request."""
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
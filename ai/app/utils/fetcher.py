@@ -0,0 +1,155 @@
+import os
+import time
+import random
+import asyncio
+import httpx
+from typing import List, Optional
+
+from app.utils.audio import AudioSource, spooled_buffer, filename_from_url
+from app.utils.concurrency import get_semaphore
+from app.utils.metrics import span
+from app.utils.deadline import time_left, within_deadline
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Content types accepted as audio. Containers like mp4/webm/ogg are often served as video/*.
+ALLOWED_CONTENT_TYPES = ("audio/", "video/", "application/octet-stream", "binary/octet-stream", "application/ogg")
+
+class AudioFetchError(Exception):
+    """Raised when a remote audio file cannot be fetched or is rejected."""
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class FetchResult:
+    def __init__(self, url: str, source: AudioSource, content_type: Optional[str], elapsed_ms: float, attempts: int):
+        self.url = url
+        self.source = source
+        self.content_type = content_type
+        self.elapsed_ms = elapsed_ms
+        self.attempts = attempts
+
+    @property
+    def size(self) -> int:
+        return self.source.size
+
+class AudioFetcher:
+    """
+    Downloads remote audio over a shared keep-alive connection pool, with
+    connect/read timeouts, a size cap, content-type checks and retry with backoff.
+    """
+    def __init__(
+        self,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_bytes: int = 25 * 1024 * 1024,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_connections: int = 32
+    ):
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60
+            )
+        )
+
+    async def fetch(self, url: str) -> FetchResult:
+        """Downloads `url`, retrying transient failures. The download and its retries are bounded by the request deadline (DeadlineExceeded)."""
+        started = time.perf_counter()
+        attempt = 0
+        async with within_deadline("audio download"):
+            while True:
+                attempt += 1
+                try:
+                    async with get_semaphore("download"):
+                        with span("download"):
+                            source, content_type = await self._download(url)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    logger.info(f"Fetched {source.size} bytes from {url} in {elapsed_ms:.1f} ms ({attempt} attempt(s))")
+                    return FetchResult(url, source, content_type, elapsed_ms, attempt)
+                except AudioFetchError as e:
+                    delay = self.backoff * (2 ** (attempt - 1)) * (1 + random.random())
+                    remaining = time_left()
+                    # No retry that could not finish before the request's deadline
+                    if not e.retryable or attempt > self.retries or (remaining is not None and delay >= remaining):
+                        raise
+                    logger.warning(f"Fetch of {url} failed ({e}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+    async def fetch_many(self, urls: List[str]) -> List[FetchResult]:
+        """Fetches several URLs concurrently (e.g. multi-media WhatsApp messages), preserving order."""
+        results = await asyncio.gather(*(self.fetch(url) for url in urls), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            for result in results:
+                if isinstance(result, FetchResult):
+                    result.source.close()
+            raise errors[0]
+        return results
+
+    async def _download(self, url: str):
+        buffer = spooled_buffer()
+        size = 0
+        try:
+            async with self.client.stream("GET", url) as response:
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise AudioFetchError(f"Upstream returned {response.status_code}", retryable=True)
+                if response.status_code >= 400:
+                    raise AudioFetchError(f"Upstream returned {response.status_code}")
+
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                if content_type and not content_type.startswith(ALLOWED_CONTENT_TYPES):
+                    raise AudioFetchError(f"Unsupported content type: {content_type}")
+
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                    raise AudioFetchError(f"Audio is larger than the {self.max_bytes} byte limit")
+
+                async for chunk in response.aiter_bytes(chunk_size=65536):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AudioFetchError(f"Audio is larger than the {self.max_bytes} byte limit")
+                    buffer.write(chunk)
+        except httpx.TimeoutException as e:
+            buffer.close()
+            raise AudioFetchError(f"Timed out fetching audio: {type(e).__name__}", retryable=True)
+        except httpx.TransportError as e:
+            buffer.close()
+            raise AudioFetchError(f"Could not fetch audio: {e}", retryable=True)
+        except BaseException:
+            buffer.close()
+            raise
+        buffer.seek(0)
+        return AudioSource(filename_from_url(url), buffer, size), content_type or None
+
+    async def aclose(self):
+        await self.client.aclose()
+
+# Singleton instance
+audio_fetcher: Optional[AudioFetcher] = None
+
+def get_audio_fetcher() -> AudioFetcher:
+    global audio_fetcher
+    if audio_fetcher is None:
+        audio_fetcher = AudioFetcher(
+            connect_timeout=float(os.getenv("AUDIO_FETCH_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("AUDIO_FETCH_READ_TIMEOUT", "30")),
+            max_bytes=int(os.getenv("AUDIO_FETCH_MAX_BYTES", str(25 * 1024 * 1024))),
+            retries=int(os.getenv("AUDIO_FETCH_RETRIES", "2")),
+            backoff=float(os.getenv("AUDIO_FETCH_BACKOFF", "0.5"))
+        )
+    return audio_fetcher
+
+async def close_audio_fetcher():
+    global audio_fetcher
+    if audio_fetcher is not None:
+        await audio_fetcher.aclose()
+        audio_fetcher = None
@@ -0,0 +1,46 @@
+import os
+import atexit
+import logging
+from queue import SimpleQueue
+from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+
+from app.utils.shared_state import worker_count
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# With several worker processes writing one file, each line says which one
+WORKER_LOG_FORMAT = '%(asctime)s - [%(process)d] %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[QueueListener] = None
+
+def configure_logging() -> QueueListener:
+    """
+    Routes all logging through a queue so request handlers never block on file I/O;
+    a background thread writes the records to LOG_FILE (default server_debug.log,
+    empty for stderr) at LOG_LEVEL (default INFO).
+    """
+    global _listener
+    log_file = os.getenv("LOG_FILE", "server_debug.log")
+    handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(WORKER_LOG_FORMAT if worker_count() > 1 else LOG_FORMAT))
+
+    queue = SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(QueueHandler(queue))
+
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    listener.start()
+    _listener = listener
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    # Workers forked by app.serve do not inherit the writer thread; each starts its own
+    os.register_at_fork(after_in_child=listener.start)
+    return listener
+
+def stop_logging():
+    """Writes out queued records, for processes that leave with os._exit (forked workers)."""
+    if _listener is not None:
+        _listener.stop()
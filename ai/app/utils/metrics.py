@@ -0,0 +1,169 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, REGISTRY
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Stages span from sub-millisecond (base64, JSON parse) to tens of seconds (long transcriptions)
+_STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "samadhaan_stage_seconds",
+    "Time spent in each processing stage",
+    ["stage"],
+    buckets=_STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "samadhaan_stage_errors_total",
+    "Stages that raised an exception",
+    ["stage"]
+)
+HTTP_SECONDS = Histogram(
+    "samadhaan_http_request_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=_STAGE_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "samadhaan_llm_tokens_total",
+    "Tokens reported by the LLM provider",
+    ["model", "direction"]
+)
+# A real counter (not read from ResultCache.stats) so it sums across worker processes
+RESULT_CACHE_LOOKUPS = Counter(
+    "samadhaan_result_cache_lookups",
+    "Result cache lookups",
+    ["result"]
+)
+FALLBACKS = Counter(
+    "samadhaan_fallbacks_total",
+    "Requests answered with a fallback after an upstream failure",
+    ["operation"]
+)
+
+@contextmanager
+def span(stage: str):
+    """Times a stage into samadhaan_stage_seconds (and counts it as an error if it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+def observe(stage: str, seconds: float):
+    """Records a stage timed by hand, e.g. across the yields of a stream."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+def record_usage(model: str, usage: Optional[Dict[str, Any]]):
+    """Counts token usage from a LangChain usage_metadata dict."""
+    if not usage:
+        return
+    LLM_TOKENS.labels(model, "prompt").inc(usage.get("input_tokens") or 0)
+    LLM_TOKENS.labels(model, "completion").inc(usage.get("output_tokens") or 0)
+
+def record_fallback(operation: str):
+    FALLBACKS.labels(operation).inc()
+
+class _StatsCollector:
+    """Exposes the in-process stats (scheduler, coalescing, caches) at scrape time."""
+    def describe(self):
+        # Nothing to declare up front; keeps registration from running collect()
+        return []
+
+    def collect(self):
+        # Imported lazily: these modules import this one
+        from app.utils.scheduler import get_scheduler
+        from app.utils.singleflight import single_flight_stats
+        from app.utils.admission import get_admission_controller
+        from app import jobs, live
+        from app.agents import brain
+
+        scheduler = get_scheduler().stats()
+        queued = GaugeMetricFamily("samadhaan_scheduler_queue_depth", "Groq calls waiting for quota", labels=["model", "priority"])
+        for model, lane in scheduler["models"].items():
+            for priority, count in lane["queued"].items():
+                queued.add_metric([model, priority], count)
+        yield queued
+        waits = GaugeMetricFamily("samadhaan_scheduler_avg_wait_seconds", "Average wait for Groq quota", labels=["priority"])
+        admitted = CounterMetricFamily("samadhaan_scheduler_admitted", "Groq calls admitted", labels=["priority"])
+        retries = CounterMetricFamily("samadhaan_scheduler_retries", "Groq calls retried", labels=["priority"])
+        for priority, stats in scheduler["priorities"].items():
+            waits.add_metric([priority], stats["avg_wait_ms"] / 1000)
+            admitted.add_metric([priority], stats["admitted"])
+            retries.add_metric([priority], stats["retries"])
+        yield waits
+        yield admitted
+        yield retries
+
+        collapsed = CounterMetricFamily("samadhaan_singleflight_collapsed", "Duplicate in-flight requests coalesced", labels=["operation"])
+        for name, stats in single_flight_stats().items():
+            collapsed.add_metric([name], stats["collapsed"])
+        yield collapsed
+
+        admission = get_admission_controller().stats()
+        in_flight = GaugeMetricFamily("samadhaan_admission_in_flight", "Requests being served", labels=["group"])
+        waiting = GaugeMetricFamily("samadhaan_admission_queued", "Requests waiting for a slot", labels=["group"])
+        rejected = CounterMetricFamily("samadhaan_admission_rejected", "Requests refused by admission control", labels=["group", "reason"])
+        abandoned = CounterMetricFamily("samadhaan_admission_abandoned", "Requests cut short", labels=["group", "reason"])
+        for group, stats in admission.items():
+            in_flight.add_metric([group], stats["in_flight"])
+            waiting.add_metric([group], stats["queued"])
+            for reason, count in stats["rejected"].items():
+                rejected.add_metric([group, reason], count)
+            abandoned.add_metric([group, "client_disconnect"], stats["cancelled"])
+            abandoned.add_metric([group, "deadline"], stats["deadline_exceeded"])
+        yield in_flight
+        yield waiting
+        yield rejected
+        yield abandoned
+
+        if brain.brain_agent is not None:
+            routing = brain.brain_agent.router.stats()
+            routed = CounterMetricFamily("samadhaan_llm_routed", "LLM calls per task and chosen model", labels=["task", "model"])
+            for key, count in routing["routed"].items():
+                task, model = key.split(":", 1)
+                routed.add_metric([task, model], count)
+            yield routed
+            hedges = CounterMetricFamily("samadhaan_llm_hedges", "Slow LLM calls duplicated on the other model", labels=["outcome"])
+            hedges.add_metric(["sent"], routing["hedges"])
+            hedges.add_metric(["won"], routing["hedge_wins"])
+            yield hedges
+
+        if jobs.job_queue is not None:
+            counts = jobs.job_queue.store.counts()
+            job_states = GaugeMetricFamily("samadhaan_transcription_jobs", "Transcription jobs by status", labels=["status"])
+            for status, count in counts.items():
+                job_states.add_metric([status], count)
+            yield job_states
+
+        if live.live_transcriber is not None:
+            streams = live.live_transcriber.stats()
+            yield GaugeMetricFamily("samadhaan_live_streams", "Live transcription WebSockets open", value=streams["active"])
+            utterances = CounterMetricFamily("samadhaan_live_utterances", "Utterances cut from live streams and sent for transcription", labels=["outcome"])
+            utterances.add_metric(["sent"], streams["segments"])
+            utterances.add_metric(["failed"], streams["failed_segments"])
+            yield utterances
+
+_stats_collector = _StatsCollector()
+REGISTRY.register(_stats_collector)
+
+def render_metrics():
+    """
+    Returns (body, content type) for the /metrics endpoint. With several workers (PROMETHEUS_MULTIPROC_DIR,
+    set by app.serve) counters and histograms are summed across all of them; the collector's values
+    (queues, admission, routing, jobs, live streams) are those of the worker answering the scrape.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_stats_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,208 @@
+import os
+import io
+import wave
+import shutil
+import asyncio
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import ffmpeg
+import numpy as np
+
+from app.utils.concurrency import get_semaphore
+
+import logging
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+# Block size for streaming a file into ffmpeg's stdin
+_FEED_BYTES = 1024 * 1024
+
+_FORMATS = {
+    # name: (container, codec, extension)
+    "opus": ("ogg", "libopus", "ogg"),
+    "mp3": ("mp3", "libmp3lame", "mp3"),
+    "flac": ("flac", "flac", "flac"),
+}
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+def preprocessing_enabled() -> bool:
+    return os.getenv("AUDIO_PREPROCESS", "1") not in ("0", "false", "no") and ffmpeg_available()
+
+async def _run_ffmpeg(args: List[str], data: Union[bytes, BinaryIO]) -> bytes:
+    """Runs ffmpeg on `data`: bytes, or a file streamed from the start in blocks so it is never held in memory whole."""
+    async with get_semaphore("ffmpeg"):
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        feeder = None
+        try:
+            if isinstance(data, (bytes, bytearray)):
+                stdout, stderr = await process.communicate(data)
+            else:
+                feeder = asyncio.create_task(_feed(process, data))
+                stdout, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+                await feeder
+                await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        finally:
+            if feeder is not None and not feeder.done():
+                feeder.cancel()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='ignore').strip()[:300]}")
+    return stdout
+
+async def _feed(process: asyncio.subprocess.Process, file: BinaryIO):
+    try:
+        file.seek(0)
+        while True:
+            block = await asyncio.to_thread(file.read, _FEED_BYTES)
+            if not block:
+                break
+            process.stdin.write(block)
+            await process.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpeg stopped reading (e.g. it could not decode the input); its exit status says why
+        pass
+    finally:
+        process.stdin.close()
+        file.seek(0)
+
+async def decode_pcm(data: Union[bytes, BinaryIO]) -> np.ndarray:
+    """Decodes any input format to 16 kHz mono 16-bit PCM samples."""
+    args = (
+        ffmpeg
+        .input("pipe:0")
+        .output("pipe:1", format="s16le", acodec="pcm_s16le", ac=1, ar=SAMPLE_RATE)
+        .global_args("-hide_banner", "-loglevel", "error")
+        .compile()
+    )
+    return np.frombuffer(await _run_ffmpeg(args, data), dtype=np.int16)
+
+async def encode_pcm(samples: np.ndarray) -> Tuple[bytes, str]:
+    """
+    Encodes PCM samples to the compact upload format (AUDIO_TARGET_FORMAT, default opus at 24k).
+    Falls back to WAV if the ffmpeg build lacks the encoder. Returns (bytes, extension).
+    """
+    target = os.getenv("AUDIO_TARGET_FORMAT", "opus")
+    container, codec, extension = _FORMATS.get(target, _FORMATS["opus"])
+    args = (
+        ffmpeg
+        .input("pipe:0", format="s16le", ac=1, ar=SAMPLE_RATE)
+        .output("pipe:1", format=container, acodec=codec, audio_bitrate=os.getenv("AUDIO_TARGET_BITRATE", "24k"))
+        .global_args("-hide_banner", "-loglevel", "error")
+        .compile()
+    )
+    try:
+        return await _run_ffmpeg(args, samples.tobytes()), extension
+    except RuntimeError as e:
+        logger.warning(f"Encoding to {target} failed, sending WAV instead: {e}")
+        return pcm_to_wav(samples), "wav"
+
+def pcm_to_wav(samples: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+def frame_energy_db(samples: np.ndarray) -> np.ndarray:
+    """RMS level in dBFS of consecutive 30 ms frames."""
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:count * frame].astype(np.float32).reshape(count, frame) / 32768.0
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def trim_silence(samples: np.ndarray, threshold_db: float, padding: float = 0.2) -> Tuple[np.ndarray, float]:
+    """Trims leading and trailing silence. Returns (samples, seconds trimmed from the start)."""
+    energy = frame_energy_db(samples)
+    voiced = np.flatnonzero(energy > threshold_db)
+    if len(voiced) == 0:
+        return samples, 0.0
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    pad = int(SAMPLE_RATE * padding)
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame + pad)
+    return samples[start:end], start / SAMPLE_RATE
+
+def find_split_points(samples: np.ndarray, chunk_seconds: float, search_seconds: float = 10.0) -> List[int]:
+    """
+    Picks sample offsets close to every chunk_seconds boundary, choosing the quietest
+    frame within +/- search_seconds so cuts land in pauses rather than mid-word.
+    """
+    duration = len(samples) / SAMPLE_RATE
+    if duration <= chunk_seconds * 1.5:
+        return []
+    # A window wider than the chunk could reach back past the previous cut
+    search_seconds = min(search_seconds, chunk_seconds / 4)
+    energy = frame_energy_db(samples)
+    # Smooth over ~0.3 s so a single quiet frame inside a word is not chosen
+    window = 10
+    smoothed = np.convolve(energy, np.ones(window) / window, mode="same")
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    points = []
+    previous = 0
+    target = chunk_seconds
+    while target < duration - chunk_seconds * 0.5:
+        # Strictly after the previous cut, so no chunk is empty or repeated
+        low = max(previous + 1, int((target - search_seconds) / FRAME_SECONDS))
+        high = min(len(smoothed), int((target + search_seconds) / FRAME_SECONDS))
+        if high <= low:
+            break
+        best = low + int(np.argmin(smoothed[low:high]))
+        points.append(best * frame)
+        previous = best
+        target = best * FRAME_SECONDS + chunk_seconds
+    return points
+
+class AudioChunk:
+    def __init__(self, data: bytes, filename: str, offset: float, duration: float):
+        self.data = data
+        self.filename = filename
+        self.offset = offset
+        self.duration = duration
+
+async def prepare_chunks(data: Union[bytes, BinaryIO]) -> Optional[List[AudioChunk]]:
+    """
+    Transcodes audio to 16 kHz mono, trims leading/trailing silence, splits long
+    recordings at pauses and encodes each chunk compactly.
+    `data` may be a file (e.g. a spooled upload), which is streamed to ffmpeg rather than read into memory.
+    Returns None if the audio could not be decoded, so the caller can send it unchanged.
+    """
+    try:
+        samples = await decode_pcm(data)
+    except Exception as e:
+        logger.warning(f"Audio preprocessing skipped: {e}")
+        return None
+    if len(samples) == 0:
+        return None
+
+    threshold_db = float(os.getenv("AUDIO_SILENCE_DB", "-45"))
+    samples, trimmed = trim_silence(samples, threshold_db)
+
+    chunk_seconds = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "60"))
+    bounds = [0] + find_split_points(samples, chunk_seconds) + [len(samples)]
+    pieces = [samples[start:end] for start, end in zip(bounds, bounds[1:])]
+    encoded = await asyncio.gather(*(encode_pcm(piece) for piece in pieces))
+
+    return [
+        AudioChunk(
+            data=chunk_data,
+            filename=f"chunk{index}.{extension}",
+            offset=trimmed + start / SAMPLE_RATE,
+            duration=len(piece) / SAMPLE_RATE
+        )
+        for index, ((chunk_data, extension), start, piece) in enumerate(zip(encoded, bounds, pieces))
+    ]
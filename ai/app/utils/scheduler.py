@@ -0,0 +1,375 @@
+import os
+import re
+import json
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from enum import IntEnum
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import groq
+import httpx
+
+from app.utils.deadline import time_left, within_deadline
+from app.utils.shared_state import worker_count
+
+import logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class Priority(IntEnum):
+    """Lower value is served first when a model's quota is contended."""
+    CHAT = 0
+    TRANSCRIPTION = 1
+    CLASSIFICATION = 2
+    BATCH = 3
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parses Groq reset values like '7.66s', '2m59.56s' or '120ms' (plain numbers are seconds)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+def retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Seconds to wait according to Retry-After (or the token/request reset headers)."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        seconds = parse_duration(value)
+        if seconds is not None:
+            return seconds
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    resets = [parse_duration(headers.get(name)) for name in ("x-ratelimit-reset-tokens", "x-ratelimit-reset-requests")]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+class TokenBucket:
+    """Budget of `per_minute` units that refills continuously. A rate of 0 means unlimited."""
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        if not self.unlimited:
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units can be taken."""
+        pause = max(0.0, self.paused_until - time.monotonic())
+        if self.unlimited:
+            return pause
+        self._refill()
+        # A request larger than the whole budget waits for a full bucket rather than forever
+        short = min(amount, self.per_minute) - self.level
+        return max(pause, short * 60 / self.per_minute if short > 0 else 0.0)
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self._refill()
+            self.level -= min(amount, self.per_minute)
+
+    def sync(self, remaining: float):
+        """Lowers the local level to what the server reports as remaining."""
+        if not self.unlimited:
+            self._refill()
+            self.level = min(self.level, remaining)
+
+    def set_rate(self, per_minute: float):
+        if per_minute == self.per_minute:
+            return
+        self._refill()
+        self.level = per_minute if self.unlimited else min(self.level, per_minute)
+        self.per_minute = per_minute
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class _Lane:
+    """Quota and wait queue for one model."""
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # Without a configured TPM the limit is learned from x-ratelimit-limit-tokens
+        self.learn_tpm = tpm <= 0
+        self.queue: List[list] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.timer_at = 0.0
+        self.rate_limited = 0
+
+    def queued(self) -> Dict[str, int]:
+        counts = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, _, future in self.queue:
+            if not future.done():
+                counts[Priority(priority).name.lower()] += 1
+        return counts
+
+class _PriorityStats:
+    def __init__(self):
+        self.admitted = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "avg_wait_ms": round(self.wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
+
+class GroqScheduler:
+    """
+    Central admission point for Groq calls. Each model has request/min and token/min
+    buckets (kept in sync with Groq's rate-limit headers); when they run dry, waiting
+    calls are admitted strictly by priority, so background traffic cannot starve live
+    voice turns. Rate-limited and transient failures are retried with jittered backoff.
+    """
+    def __init__(
+        self,
+        default_rpm: float = 0,
+        default_tpm: float = 0,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 20.0,
+        chat_reserve: float = 0.1,
+        share: float = 1.0
+    ):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.limits = limits or {}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Fraction of each tokens/min budget only live chat turns may use
+        self.chat_reserve = chat_reserve
+        # Fraction of the account's quota this process may use; the rest belongs to the other workers
+        self.share = share
+        self.lanes: Dict[str, _Lane] = {}
+        self.sequence = itertools.count()
+        self.priority_stats = {priority: _PriorityStats() for priority in Priority}
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self.lanes.get(model)
+        if lane is None:
+            rpm, tpm = self.limits.get(model, (self.default_rpm, self.default_tpm))
+            lane = self.lanes[model] = _Lane(rpm * self.share, tpm * self.share)
+        return lane
+
+    async def acquire(self, model: str, priority: Priority, tokens: int = 0):
+        """Waits until the model's quota admits a call of about `tokens` tokens."""
+        lane = self._lane(model)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(lane.queue, [int(priority), next(self.sequence), tokens, future])
+        started = time.monotonic()
+        self._pump(model)
+        try:
+            # Give up waiting for quota once the request's deadline has passed
+            async with within_deadline(f"{model} quota"):
+                await future
+        finally:
+            if future.cancelled():
+                # Let the next waiter through if this one was holding up the head of the queue
+                self._pump(model)
+        waited = time.monotonic() - started
+        stats = self.priority_stats[priority]
+        stats.admitted += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        if waited > 0.001:
+            stats.throttled += 1
+
+    async def run(self, model: str, priority: Priority, call: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        Runs `call` once admitted, retrying rate limits and transient errors.
+        Waiting, the call and retries are all bounded by the request deadline (DeadlineExceeded).
+        """
+        attempt = 0
+        while True:
+            await self.acquire(model, priority, tokens)
+            try:
+                async with within_deadline(f"{model} call"):
+                    return await call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                remaining = time_left()
+                # No retry that could not finish before the request's deadline
+                if delay is None or attempt >= self.max_retries or (remaining is not None and delay >= remaining):
+                    raise
+                attempt += 1
+                self.priority_stats[priority].retries += 1
+                if isinstance(e, groq.RateLimitError):
+                    self.priority_stats[priority].rate_limited += 1
+                logger.warning(f"Groq call to {model} failed ({type(e).__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        backoff = min(self.max_backoff, self.backoff * (2 ** attempt))
+        if isinstance(error, groq.RateLimitError):
+            # The lane is already paused until the server's reset time (see observe);
+            # the jitter spreads the retries so they do not all land at once
+            return random.uniform(0, backoff)
+        if isinstance(error, (groq.APIConnectionError, groq.InternalServerError)):
+            return backoff * (1 + random.random()) / 2
+        return None
+
+    def _pump(self, model: str):
+        lane = self.lanes[model]
+        while lane.queue:
+            priority, _, tokens, future = lane.queue[0]
+            if future.done():
+                heapq.heappop(lane.queue)
+                continue
+            reserve = 0 if priority == Priority.CHAT else lane.tokens.per_minute * self.chat_reserve
+            delay = max(lane.requests.delay(1), lane.tokens.delay(tokens + reserve))
+            if delay > 0:
+                self._wake_later(model, lane, delay)
+                return
+            heapq.heappop(lane.queue)
+            lane.requests.take(1)
+            lane.tokens.take(tokens)
+            future.set_result(None)
+
+    def _wake_later(self, model: str, lane: _Lane, delay: float):
+        loop = asyncio.get_running_loop()
+        wake_at = loop.time() + delay
+        if lane.timer and not lane.timer.cancelled() and lane.timer_at <= wake_at and lane.timer_at > loop.time():
+            return
+        if lane.timer:
+            lane.timer.cancel()
+        lane.timer_at = wake_at
+        lane.timer = loop.call_later(delay, self._pump, model)
+
+    def observe(self, model: str, status_code: int, headers: httpx.Headers):
+        """Updates a model's buckets from the rate-limit headers of a Groq response."""
+        lane = self._lane(model)
+        limit_tokens = _float_header(headers, "x-ratelimit-limit-tokens")
+        if limit_tokens and lane.learn_tpm:
+            lane.tokens.set_rate(limit_tokens * self.share)
+        remaining_tokens = _float_header(headers, "x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            lane.tokens.sync(remaining_tokens)
+        remaining_requests = _float_header(headers, "x-ratelimit-remaining-requests")
+        if remaining_requests is not None and remaining_requests <= 0:
+            lane.requests.pause(parse_duration(headers.get("x-ratelimit-reset-requests")) or 1.0)
+        if status_code == 429:
+            pause = retry_after(headers) or self.backoff
+            lane.requests.pause(pause)
+            lane.rate_limited += 1
+            logger.warning(f"Groq rate limit hit for {model}, pausing for {pause:.2f}s")
+
+    def http_client(self, model: Optional[str] = None) -> httpx.AsyncClient:
+        """
+        An httpx client for the Groq SDK that reports every response's rate-limit headers.
+        The model is read from the JSON request body unless given; other requests are ignored.
+        """
+        async def on_response(response: httpx.Response):
+            try:
+                response_model = model or _request_model(response.request)
+                if response_model:
+                    self.observe(response_model, response.status_code, response.headers)
+            except Exception as e:
+                logger.warning(f"Could not read rate-limit headers: {e}")
+        return groq.DefaultAsyncHttpxClient(event_hooks={"response": [on_response]})
+
+    def queue_depth(self) -> int:
+        return sum(sum(lane.queued().values()) for lane in self.lanes.values())
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "quota_share": round(self.share, 3),
+            "models": {
+                model: {
+                    "queued": lane.queued(),
+                    "rpm": lane.requests.per_minute or None,
+                    "tpm": lane.tokens.per_minute or None,
+                    "tokens_available": None if lane.tokens.unlimited else round(lane.tokens.level),
+                    "rate_limited": lane.rate_limited,
+                }
+                for model, lane in self.lanes.items()
+            },
+            "priorities": {priority.name.lower(): self.priority_stats[priority].as_dict() for priority in Priority},
+        }
+
+def _float_header(headers: httpx.Headers, name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _request_model(request: httpx.Request) -> Optional[str]:
+    try:
+        return json.loads(request.content).get("model")
+    except Exception:
+        return None
+
+def _parse_limits(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parses GROQ_RATE_LIMITS, e.g. 'llama-3.3-70b-versatile=30:12000,whisper-large-v3-turbo=20:0'."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            model, rates = item.split("=", 1)
+            rpm, tpm = rates.split(":", 1)
+            limits[model.strip()] = (float(rpm), float(tpm))
+        except ValueError:
+            logger.warning(f"Ignoring malformed GROQ_RATE_LIMITS entry: {item}")
+    return limits
+
+# Singleton instance
+scheduler: Optional[GroqScheduler] = None
+
+def get_scheduler() -> GroqScheduler:
+    global scheduler
+    if scheduler is None:
+        scheduler = GroqScheduler(
+            default_rpm=float(os.getenv("GROQ_RPM", "0")),
+            default_tpm=float(os.getenv("GROQ_TPM", "0")),
+            limits=_parse_limits(os.getenv("GROQ_RATE_LIMITS", "")),
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", "3")),
+            backoff=float(os.getenv("GROQ_RETRY_BACKOFF", "0.5")),
+            max_backoff=float(os.getenv("GROQ_RETRY_MAX_BACKOFF", "20")),
+            chat_reserve=float(os.getenv("GROQ_CHAT_RESERVE", "0.1")),
+            # Each worker process gets an equal part of the limits
+            share=1 / worker_count()
+        )
+    return scheduler
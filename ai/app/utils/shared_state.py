@@ -0,0 +1,41 @@
+"""
+State shared by all worker processes of one deployment (see app.serve). Caches, sessions, complaint
+clusters and jobs live in SQLite databases in WAL mode, which any number of processes can read while
+one writes; each process keeps its own connection and, where it helps, an in-memory tier in front.
+"""
+import os
+import sqlite3
+from typing import Optional
+
+def worker_count() -> int:
+    """Worker processes serving the app: WEB_CONCURRENCY, set by app.serve (1 when run directly with uvicorn)."""
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+def shared_path(env_name: str, filename: str) -> Optional[str]:
+    """
+    The database path configured in `env_name`. When it is unset and several workers run, `filename`
+    under SHARED_STATE_DIR (default data/), so workers share one store instead of keeping a copy each.
+    """
+    value = os.getenv(env_name)
+    if value:
+        return value
+    if worker_count() > 1:
+        return os.path.join(os.getenv("SHARED_STATE_DIR", "data"), filename)
+    return None
+
+def connect(path: str, timeout: float = 10.0) -> sqlite3.Connection:
+    """
+    Opens a SQLite database for use from several threads and processes: WAL journal, so readers
+    never wait for a writer, and a busy timeout, so concurrent writers wait rather than fail.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Durable across process crashes; only an OS crash can lose the last commits
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+import logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, later
+    callers await the same result instead of issuing their own upstream request.
+    The call runs as its own task, so a caller that disconnects does not cancel it for the others;
+    once every caller has gone the call is cancelled so it stops spending upstream quota.
+    """
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Task] = {}
+        self.waiters: Dict[str, int] = {}
+        self.leaders = 0
+        self.collapsed = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self.calls[key] = task
+            self.waiters[key] = 0
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.leaders += 1
+        else:
+            self.collapsed += 1
+            logger.info(f"Coalesced duplicate in-flight request {key[:16]}")
+        self.waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.calls.get(key) is task and self.waiters[key] == 1 and not task.done():
+                self.abandoned += 1
+                task.cancel()
+            raise
+        finally:
+            if self.calls.get(key) is task:
+                self.waiters[key] -= 1
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+            del self.waiters[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "collapsed": self.collapsed, "abandoned": self.abandoned, "in_flight": len(self.calls)}
+
+_groups: Dict[str, SingleFlight] = {}
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Returns the named group (e.g. 'classify', 'extract', 'transcribe')."""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight()
+    return group
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,80 @@
+import re
+from typing import List, Optional
+
+# Sentence terminators for the scripts we serve: Latin, Devanagari/Bengali danda, Urdu.
+SENTENCE_END = re.compile(r'[.!?।॥۔؟]+["\')\]]*\s+')
+
+class SentenceSplitter:
+    """
+    Incrementally cuts streamed text into sentences.
+    Very short sentences are merged with the next one so TTS is not called on fragments.
+    """
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return remainder or None
+
+def split_sentences(text: str, min_chars: int = 1) -> List[str]:
+    """Splits a complete text into sentences using the same rules as streaming."""
+    splitter = SentenceSplitter(min_chars=min_chars)
+    sentences = splitter.feed(text)
+    remainder = splitter.flush()
+    if remainder:
+        sentences.append(remainder)
+    return sentences
+
+class MarkerFilter:
+    """
+    Removes a control marker (e.g. [FINISH]) from streamed text.
+    Text that could be the beginning of the marker is held back until it is resolved.
+    """
+    def __init__(self, marker: str):
+        self.marker = marker
+        self.pending = ""
+        self.found = False
+
+    def feed(self, text: str) -> str:
+        self.pending += text
+        if self.marker in self.pending:
+            self.found = True
+            self.pending = self.pending.replace(self.marker, "")
+        hold = 0
+        for size in range(min(len(self.marker) - 1, len(self.pending)), 0, -1):
+            if self.marker.startswith(self.pending[-size:]):
+                hold = size
+                break
+        visible = self.pending[:len(self.pending) - hold]
+        self.pending = self.pending[len(self.pending) - hold:]
+        return visible
+
+    def flush(self) -> str:
+        remainder = self.pending
+        self.pending = ""
+        return remainder
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate without a tokenizer: about four characters per token
+    for Latin text, closer to one token per character for Indic and other scripts.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return ascii_chars // 4 + other_chars + 1
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.utils.audio import write_atomic
+from app.utils.cache import normalize_text
+
+import logging
+logger = logging.getLogger(__name__)
+
+def tts_key(sentence: str, lang_code: str) -> str:
+    return hashlib.sha256(f"{lang_code}\n{normalize_text(sentence)}".encode("utf-8")).hexdigest()
+
+class TTSCache:
+    """
+    Synthesized audio per (normalized sentence, language): an in-memory LRU
+    in front of an optional directory of MP3 files that survives restarts.
+    """
+    def __init__(self, max_entries: int = 512, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    async def get(self, sentence: str, lang_code: str) -> Optional[bytes]:
+        key = tts_key(sentence, lang_code)
+        audio = self.memory.get(key)
+        if audio is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return audio
+        if self.directory:
+            audio = await asyncio.to_thread(_read_if_exists, self._path(key))
+            if audio is not None:
+                self._remember(key, audio)
+                self.hits += 1
+                self.disk_hits += 1
+                return audio
+        self.misses += 1
+        return None
+
+    async def set(self, sentence: str, lang_code: str, audio: bytes):
+        key = tts_key(sentence, lang_code)
+        self._remember(key, audio)
+        if self.directory:
+            try:
+                await asyncio.to_thread(write_atomic, self._path(key), audio)
+            except Exception as e:
+                logger.error(f"TTS cache write failed: {e}")
+
+    def _remember(self, key: str, audio: bytes):
+        self.memory[key] = audio
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+            "persistent": self.directory is not None,
+        }
+
+def _read_if_exists(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+# Singleton instance
+tts_cache: Optional[TTSCache] = None
+
+def get_tts_cache() -> TTSCache:
+    global tts_cache
+    if tts_cache is None:
+        tts_cache = TTSCache(
+            max_entries=int(os.getenv("TTS_CACHE_SIZE", "512")),
+            directory=os.getenv("TTS_CACHE_DIR", "tts_cache") or None
+        )
+    return tts_cache
@@ -0,0 +1,164 @@
+from typing import List, Optional
+
+import numpy as np
+
+from app.utils.preprocess import SAMPLE_RATE, FRAME_SECONDS, frame_energy_db
+
+FRAME = int(SAMPLE_RATE * FRAME_SECONDS)
+
+class SpeechSegment:
+    def __init__(self, samples: np.ndarray, start: float):
+        self.samples = samples
+        # Seconds from the start of the stream
+        self.start = start
+
+    @property
+    def end(self) -> float:
+        return self.start + len(self.samples) / SAMPLE_RATE
+
+class VoiceActivityDetector:
+    """
+    Cuts a live stream of 16 kHz mono PCM into utterances at pauses, frame by frame (30 ms).
+    A frame is speech when its level is above both `threshold_db` and the tracked background noise
+    plus `margin_db`. Speech starts after `start_ms` of consecutive speech frames and ends after
+    `pause_ms` of silence. Segments keep `padding_ms` of audio either side, are cut at the quietest
+    point once they reach `max_segment_seconds`, and are dropped with less than `min_speech_ms` of speech.
+    """
+    def __init__(
+        self,
+        threshold_db: float = -45.0,
+        margin_db: float = 10.0,
+        start_ms: float = 90,
+        pause_ms: float = 600,
+        padding_ms: float = 200,
+        min_speech_ms: float = 250,
+        max_segment_seconds: float = 20.0
+    ):
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.start_frames = max(1, round(start_ms / 1000 / FRAME_SECONDS))
+        self.pause_frames = max(1, round(pause_ms / 1000 / FRAME_SECONDS))
+        self.padding = int(SAMPLE_RATE * padding_ms / 1000)
+        self.min_speech_frames = max(1, round(min_speech_ms / 1000 / FRAME_SECONDS))
+        self.max_segment = int(SAMPLE_RATE * max_segment_seconds)
+        self.noise_db: Optional[float] = None
+        # Samples from absolute position `base` on; frames before `position` have been classified
+        self.buffer = np.zeros(0, dtype=np.int16)
+        self.base = 0
+        self.position = 0
+        self.voiced_run = 0
+        self.silence_run = 0
+        # Absolute sample where the current utterance starts; None between utterances
+        self.speech_start: Optional[int] = None
+        self.speech_end = 0
+        self.speech_frames = 0
+        self.energies: List[float] = []
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio received."""
+        return (self.base + len(self.buffer)) / SAMPLE_RATE
+
+    @property
+    def speaking(self) -> bool:
+        return self.speech_start is not None
+
+    def feed(self, samples: np.ndarray) -> List[SpeechSegment]:
+        """Adds samples and returns the utterances they completed."""
+        self.buffer = np.concatenate([self.buffer, samples.astype(np.int16, copy=False)])
+        available = (self.base + len(self.buffer) - self.position) // FRAME
+        if available <= 0:
+            return []
+        offset = self.position - self.base
+        energies = frame_energy_db(self.buffer[offset:offset + available * FRAME])
+        segments = []
+        for energy in energies:
+            segment = self._step(float(energy))
+            if segment is not None:
+                segments.append(segment)
+            self.position += FRAME
+        self._discard()
+        return segments
+
+    def flush(self) -> List[SpeechSegment]:
+        """Ends the stream, returning the utterance still in progress (if it has enough speech)."""
+        if self.speech_start is None:
+            return []
+        end = min(self.base + len(self.buffer), self.speech_end + self.padding)
+        segment = self._emit(end)
+        self.speech_start = None
+        return [segment] if segment is not None else []
+
+    def current(self) -> Optional[SpeechSegment]:
+        """The utterance in progress so far, for interim transcripts."""
+        if self.speech_start is None:
+            return None
+        return SpeechSegment(self.buffer[self.speech_start - self.base:self.position - self.base].copy(), self.speech_start / SAMPLE_RATE)
+
+    def _threshold(self) -> float:
+        if self.noise_db is None:
+            return self.threshold_db
+        return max(self.threshold_db, self.noise_db + self.margin_db)
+
+    def _step(self, energy: float) -> Optional[SpeechSegment]:
+        voiced = energy > self._threshold()
+        if self.speech_start is None:
+            if not voiced:
+                self.voiced_run = 0
+                # Falls at once to a quieter background, rises slowly to a louder one
+                if self.noise_db is None or energy < self.noise_db:
+                    self.noise_db = energy
+                else:
+                    self.noise_db += 0.02 * (energy - self.noise_db)
+                return None
+            self.voiced_run += 1
+            if self.voiced_run >= self.start_frames:
+                first = self.position - (self.voiced_run - 1) * FRAME
+                self.speech_start = max(self.base, first - self.padding)
+                self.speech_end = self.position + FRAME
+                self.speech_frames = self.voiced_run
+                self.silence_run = 0
+                self.energies = []
+            return None
+
+        self.energies.append(energy)
+        if voiced:
+            self.silence_run = 0
+            self.speech_frames += 1
+            self.speech_end = self.position + FRAME
+        else:
+            self.silence_run += 1
+            if self.silence_run >= self.pause_frames:
+                segment = self._emit(min(self.position + FRAME, self.speech_end + self.padding))
+                self.speech_start = None
+                self.voiced_run = 0
+                return segment
+        if self.position + FRAME - self.speech_start >= self.max_segment:
+            return self._split()
+        return None
+
+    def _split(self) -> Optional[SpeechSegment]:
+        """Cuts an over-long utterance at the quietest moment of its second half and carries on."""
+        half = len(self.energies) // 2
+        # Smooth over ~0.3 s so a single quiet frame inside a word is not chosen
+        window = min(10, len(self.energies) - half)
+        smoothed = np.convolve(self.energies[half:], np.ones(window) / window, mode="same")
+        cut = self.position + FRAME - (len(self.energies) - half - int(np.argmin(smoothed))) * FRAME
+        segment = self._emit(cut)
+        self.speech_start = cut
+        self.speech_frames = self.min_speech_frames
+        self.energies = self.energies[len(self.energies) - (self.position + FRAME - cut) // FRAME:]
+        return segment
+
+    def _emit(self, end: int) -> Optional[SpeechSegment]:
+        if self.speech_frames < self.min_speech_frames:
+            return None
+        samples = self.buffer[self.speech_start - self.base:end - self.base].copy()
+        return SpeechSegment(samples, self.speech_start / SAMPLE_RATE)
+
+    def _discard(self):
+        # Between utterances only the padding before the next one is needed
+        keep_from = self.speech_start if self.speech_start is not None else self.position - self.padding
+        if keep_from > self.base:
+            self.buffer = self.buffer[keep_from - self.base:]
+            self.base = keep_from
@@ -0,0 +1,143 @@
+"""
+Local stand-in for the Groq API (chat completions, streaming chat, Whisper transcriptions)
+with injected latency and error rates, for benchmarking without cloud calls.
+
+    python -m benchmarks.fake_groq --port 9900 --chat-latency-ms 300 --error-rate 0.01
+"""
+import re
+import json
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
+
+class FakeConfig:
+    def __init__(self, chat_latency_ms: float = 300, whisper_latency_ms: float = 500, jitter: float = 0.2,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, token_interval_ms: float = 15):
+        self.chat_latency_ms = chat_latency_ms
+        self.whisper_latency_ms = whisper_latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_interval_ms = token_interval_ms
+
+config = FakeConfig()
+app = FastAPI(title="Fake Groq")
+
+RATE_LIMIT_HEADERS = {
+    "x-ratelimit-limit-tokens": "1000000",
+    "x-ratelimit-remaining-tokens": "999000",
+    "x-ratelimit-remaining-requests": "100000",
+}
+
+async def _latency(base_ms: float):
+    await asyncio.sleep(max(0.0, base_ms * random.uniform(1 - config.jitter, 1 + config.jitter)) / 1000)
+
+def _injected_error():
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": "0.2", "x-ratelimit-reset-tokens": "0.2s"}
+        )
+    if roll < config.rate_limit_rate + config.error_rate:
+        return JSONResponse({"error": {"message": "Injected failure", "type": "internal_server_error"}}, status_code=500)
+    return None
+
+def _reply(messages) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    if "valid JSON" in prompt:
+        result = {
+            "top_label": "roads", "scores": {"roads": 0.9, "water": 0.1},
+            "category": "roads", "confidence": 0.85, "urgency": "high",
+            "location_hint": "Main Road", "summary": "Pothole reported on the main road.", "language": "English",
+        }
+        if '"results"' in prompt:
+            indexes = sorted({int(index) for index in re.findall(r"^\s*\[(\d+)\]", prompt, re.M)})
+            return json.dumps({"results": [dict(result, index=index) for index in indexes]})
+        return json.dumps(result)
+    if "running summary" in prompt:
+        return "The citizen reported a pothole on the main road."
+    # Echo part of the utterance so replies differ and the TTS cache does not absorb every sentence
+    topic = " ".join(prompt.split()[-6:]) or "your complaint"
+    return f"I have recorded your issue regarding {topic}. Is there anything else I can help you with?"
+
+def _usage(messages, reply: str):
+    prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+    completion_tokens = len(reply) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await _latency(config.chat_latency_ms)
+    error = _injected_error()
+    if error:
+        return error
+    messages = body.get("messages", [])
+    reply = _reply(messages)
+    usage = _usage(messages, reply)
+    model = body.get("model", "fake")
+
+    if body.get("stream"):
+        async def events():
+            for position, token in enumerate(re.findall(r"\S+\s*", reply)):
+                delta = {"role": "assistant", "content": token} if position == 0 else {"content": token}
+                chunk = {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(config.token_interval_ms / 1000)
+            chunk = {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream", headers=RATE_LIMIT_HEADERS)
+
+    return JSONResponse({
+        "id": "fake", "object": "chat.completion", "created": 0, "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+        "usage": usage,
+    }, headers=RATE_LIMIT_HEADERS)
+
+@app.post("/openai/v1/audio/transcriptions")
+async def transcriptions(
+    file: UploadFile = File(...),
+    model: str = Form(...),
+    language: str = Form(None),
+    response_format: str = Form(None)
+):
+    data = await file.read()
+    await _latency(config.whisper_latency_ms)
+    error = _injected_error()
+    if error:
+        return error
+    return JSONResponse({
+        "text": f"There is a large pothole on the main road ({len(data)} bytes of audio).",
+        "language": language or "english",
+        "duration": 3.0,
+        "segments": [{"id": 0, "start": 0.0, "end": 3.0, "text": "There is a large pothole on the main road.", "avg_logprob": -0.2}],
+    }, headers=RATE_LIMIT_HEADERS)
+
+@app.get("/openai/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "llama-3.3-70b-versatile"}, {"id": "whisper-large-v3-turbo"}]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9900)
+    parser.add_argument("--chat-latency-ms", type=float, default=300)
+    parser.add_argument("--whisper-latency-ms", type=float, default=500)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter (0.2 = +/-20%%)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    args = parser.parse_args()
+    config.__init__(args.chat_latency_ms, args.whisper_latency_ms, args.jitter, args.error_rate, args.rate_limit_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
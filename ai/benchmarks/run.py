@@ -0,0 +1,330 @@
+"""
+Load test for the service against local stand-ins for Groq and gTTS.
+
+Starts benchmarks.fake_groq and the service (benchmarks.serve) on free ports, runs a weighted
+mix of /transcribe, /classify, /extract and /chat requests at a fixed concurrency, and reports
+p50/p95/p99 latency, throughput, errors and the server's memory use.
+
+    python -m benchmarks.run --duration 30 --concurrency 32 --mix transcribe=1,classify=3,extract=2,chat=2
+    python -m benchmarks.run --save-baseline benchmarks/baselines/default.json
+    python -m benchmarks.run --baseline benchmarks/baselines/default.json   # exits 1 on regression
+"""
+import io
+import os
+import sys
+import json
+import time
+import wave
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LABELS = ["roads", "water", "sanitation", "electricity", "public safety"]
+COMPLAINTS = [
+    "There is a huge pothole on the main road near the bus stand",
+    "Water supply has been cut for three days in our colony",
+    "Garbage has not been collected from the market for a week",
+    "The street light outside the school is broken and it is dark at night",
+    "Sewage is overflowing onto the road near the temple",
+    "Live electric wire is hanging low near the park",
+    "Drinking water from the tap is muddy and smells bad",
+    "Stray dogs are attacking children near the playground",
+]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process and its workers in MiB (Linux /proc; None elsewhere)."""
+    total = None
+    for process in [pid] + _children(pid):
+        try:
+            with open(f"/proc/{process}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total = (total or 0) + int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    return total
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def _wav(seconds: float = 3.0, sample_rate: int = 16000) -> bytes:
+    """A short tone with silence around it, standing in for a voice note."""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    samples = np.sin(2 * np.pi * 220 * t) * 6000
+    samples[: sample_rate // 2] = 0
+    samples[-sample_rate // 2:] = 0
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+class Workload:
+    """Builds requests; `repeat_ratio` of texts/audio are reused to exercise caches and coalescing."""
+    def __init__(self, mix: Dict[str, float], repeat_ratio: float, chat_audio: str):
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.repeat_ratio = repeat_ratio
+        self.chat_audio = chat_audio
+        self.audio = _wav()
+        self.counter = 0
+
+    def _variant(self) -> int:
+        self.counter += 1
+        if self.counter > 1 and random.random() < self.repeat_ratio:
+            return random.randint(1, self.counter - 1)
+        return self.counter
+
+    def _text(self) -> str:
+        variant = self._variant()
+        return f"{COMPLAINTS[variant % len(COMPLAINTS)]} (ref {variant})"
+
+    async def send(self, client: httpx.AsyncClient) -> Tuple[str, int]:
+        name = random.choices(self.names, self.weights)[0]
+        if name == "transcribe":
+            # Vary the last sample so distinct requests are not coalesced
+            variant = self._variant().to_bytes(4, "little")
+            response = await client.post(
+                "/transcribe",
+                files={"file": ("complaint.wav", self.audio[:-4] + variant, "audio/wav")},
+                data={"language": "English"}
+            )
+        elif name == "classify":
+            response = await client.post("/classify", json={"text": self._text(), "labels": LABELS})
+        elif name == "extract":
+            response = await client.post("/extract", json={"text": self._text(), "labels": LABELS})
+        elif name == "analyze":
+            response = await client.post("/analyze", json={"text": self._text(), "labels": LABELS})
+        elif name == "chat":
+            response = await client.post("/chat", json={"text": self._text(), "audio_mode": self.chat_audio})
+        else:
+            raise ValueError(f"Unknown workload: {name}")
+        return name, response.status_code
+
+async def _run_load(base_url: str, workload: Workload, concurrency: int, duration: float, warmup: float, server_pid: Optional[int]):
+    samples: Dict[str, List[float]] = {name: [] for name in workload.names}
+    errors: Dict[str, int] = {name: 0 for name in workload.names}
+    memory: List[float] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        measure_from = started + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            while time.perf_counter() < stop_at:
+                sent = time.perf_counter()
+                try:
+                    name, status = await workload.send(client)
+                except httpx.HTTPError:
+                    name, status = "transport", 0
+                if sent < measure_from or name not in samples:
+                    continue
+                samples[name].append(time.perf_counter() - sent)
+                if status >= 400 or status == 0:
+                    errors[name] += 1
+
+        async def sample_memory():
+            while time.perf_counter() < stop_at:
+                rss = _rss_mb(server_pid) if server_pid else None
+                if rss is not None:
+                    memory.append(rss)
+                await asyncio.sleep(0.5)
+
+        await asyncio.gather(sample_memory(), *(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - measure_from
+    return samples, errors, memory, elapsed
+
+def _summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    ms = [value * 1000 for value in latencies]
+    return {
+        "count": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(ms, 50), 1),
+        "p95_ms": round(_percentile(ms, 95), 1),
+        "p99_ms": round(_percentile(ms, 99), 1),
+        "max_ms": round(max(ms), 1) if ms else 0.0,
+    }
+
+def build_report(samples, errors, memory, elapsed, config) -> Dict:
+    endpoints = {name: _summarize(values, errors[name], elapsed) for name, values in samples.items()}
+    all_latencies = [value for values in samples.values() for value in values]
+    return {
+        "config": config,
+        "duration_s": round(elapsed, 2),
+        "overall": _summarize(all_latencies, sum(errors.values()), elapsed),
+        "endpoints": endpoints,
+        "memory_mb": {
+            "start": round(memory[0], 1) if memory else None,
+            "peak": round(max(memory), 1) if memory else None,
+            "end": round(memory[-1], 1) if memory else None,
+        },
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+    }
+
+def print_report(report: Dict):
+    print(f"\n{'endpoint':<12}{'count':>8}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        print(f"{name:<12}{stats['count']:>8}{stats['errors']:>8}{stats['rps']:>9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    memory = report["memory_mb"]
+    if memory["peak"] is not None:
+        print(f"\nserver RSS: start {memory['start']} MiB, peak {memory['peak']} MiB, end {memory['end']} MiB")
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Returns human-readable regressions of p95/p99 latency, throughput and peak memory beyond `tolerance`."""
+    regressions = []
+    for name, base in baseline["endpoints"].items():
+        current = report["endpoints"].get(name)
+        if not current or not base["count"]:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {current[key]} vs baseline {base[key]}")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name} rps: {current['rps']} vs baseline {base['rps']}")
+        base_error_rate = base["errors"] / base["count"]
+        if current["count"] and current["errors"] / current["count"] > base_error_rate + 0.01:
+            regressions.append(f"{name} errors: {current['errors']}/{current['count']} vs baseline {base['errors']}/{base['count']}")
+    base_peak, peak = baseline["memory_mb"].get("peak"), report["memory_mb"].get("peak")
+    if base_peak and peak and peak > base_peak * (1 + tolerance):
+        regressions.append(f"peak RSS: {peak} MiB vs baseline {base_peak} MiB")
+    return regressions
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="transcribe=1,classify=3,extract=2,chat=2")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="Fraction of requests reusing earlier text/audio")
+    parser.add_argument("--chat-audio", default="base64", choices=["base64", "url", "none"])
+    parser.add_argument("--chat-latency-ms", type=float, default=300)
+    parser.add_argument("--whisper-latency-ms", type=float, default=500)
+    parser.add_argument("--tts-latency-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected Groq 500 rate")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Injected Groq 429 rate")
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1, help="Service worker processes (app.serve)")
+    parser.add_argument("--url", help="Benchmark an already running service instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url service, for memory sampling")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--save-baseline", help="Store the report as a baseline")
+    parser.add_argument("--baseline", help="Compare against a stored baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "save_baseline", "baseline", "url", "server_pid")}
+    processes = []
+    workdir = tempfile.TemporaryDirectory(prefix="samadhaan-bench-")
+    try:
+        if args.url:
+            base_url, server_pid = args.url.rstrip("/"), args.server_pid
+        else:
+            fake_port, service_port = _free_port(), _free_port()
+            fake = subprocess.Popen([
+                sys.executable, "-m", "benchmarks.fake_groq", "--port", str(fake_port),
+                "--chat-latency-ms", str(args.chat_latency_ms), "--whisper-latency-ms", str(args.whisper_latency_ms),
+                "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+            ], cwd=AI_DIR)
+            processes.append(fake)
+            _wait_ready(f"http://127.0.0.1:{fake_port}/openai/v1/models", fake)
+
+            env = dict(
+                os.environ,
+                PYTHONPATH=AI_DIR,
+                GROQ_API_KEY="benchmark",
+                GROQ_BASE_URL=f"http://127.0.0.1:{fake_port}",
+                FAKE_TTS_LATENCY_MS=str(args.tts_latency_ms),
+                FAKE_TTS_ERROR_RATE=str(args.tts_error_rate),
+                LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+            )
+            # Run from a scratch directory so temp/, static/, caches and logs stay out of the tree
+            service = subprocess.Popen([sys.executable, "-m", "benchmarks.serve", "--port", str(service_port), "--workers", str(args.workers)], cwd=workdir.name, env=env)
+            processes.append(service)
+            base_url, server_pid = f"http://127.0.0.1:{service_port}", service.pid
+            _wait_ready(f"{base_url}/cache/stats", service)
+
+        workload = Workload(_parse_mix(args.mix), args.repeat_ratio, args.chat_audio)
+        print(f"Benchmarking {base_url}: {args.concurrency} concurrent, {args.duration}s (+{args.warmup}s warm-up), mix {args.mix}")
+        samples, errors, memory, elapsed = asyncio.run(
+            _run_load(base_url, workload, args.concurrency, args.duration, args.warmup, server_pid)
+        )
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        workdir.cleanup()
+
+    report = build_report(samples, errors, memory, elapsed, config)
+    print_report(report)
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Runs the service with gTTS replaced by a local stand-in (blocking sleep plus fake MP3 bytes),
+so benchmarks exercise the TTS path without calling Google.
+
+    FAKE_TTS_LATENCY_MS=200 python -m benchmarks.serve --port 8000 [--workers 4]
+"""
+import os
+import time
+import random
+import argparse
+
+from gtts import gTTS, gTTSError
+
+def _fake_write_to_fp(self, fp):
+    latency = float(os.getenv("FAKE_TTS_LATENCY_MS", "200")) / 1000
+    time.sleep(latency * random.uniform(0.8, 1.2))
+    if random.random() < float(os.getenv("FAKE_TTS_ERROR_RATE", "0")):
+        raise gTTSError("Injected TTS failure")
+    # Roughly the size of real 24 kbps speech: ~1 KB per 10 characters
+    fp.write(b"\xff\xf3" + os.urandom(max(1, len(self.text) * 100)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    # Patched before app.serve forks, so every worker inherits it
+    gTTS.write_to_fp = _fake_write_to_fp
+    from app.serve import run
+    run(args.host, args.port, args.workers, log_level="warning")
+
+if __name__ == "__main__":
+    main()
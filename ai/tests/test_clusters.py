@@ -0,0 +1,34 @@
+"""ComplaintIndex near-duplicate matching and analysis reuse."""
+from app.clusters import ComplaintIndex, labels_key
+
+KEY = labels_key(["roads", "electricity"])
+ANALYSIS = {"category": "electricity", "location_hint": "MG Road"}
+
+def test_exact_resend_reuses_analysis_stored_with_a_location():
+    index = ComplaintIndex()
+    index.add("Street light broken", "MG Road", KEY, ANALYSIS)
+    match = index.match("Street light broken", KEY)
+    assert match.similarity == 1.0
+    assert match.analysis == ANALYSIS
+
+def test_near_duplicate_reuses_analysis():
+    index = ComplaintIndex()
+    text = "There is a large pothole on the main road near the bus stand, two bikes have already fallen"
+    cluster_id, _ = index.add(text, "Main road, bus stand", KEY, ANALYSIS)
+    match = index.match(text.replace("two bikes have", "two bikes had"), KEY)
+    assert match.cluster_id == cluster_id
+    assert match.similarity >= index.reuse_threshold
+    assert match.analysis == ANALYSIS
+
+def test_known_location_must_agree_for_reuse():
+    index = ComplaintIndex()
+    cluster_id, _ = index.add("Street light broken", "MG Road", KEY, ANALYSIS)
+    assert index.match("Street light broken", KEY, location_hint="mg road").analysis == ANALYSIS
+    elsewhere = index.match("Street light broken", KEY, location_hint="Park Street")
+    assert elsewhere.cluster_id == cluster_id
+    assert elsewhere.analysis is None
+
+def test_reuse_needs_the_same_labels():
+    index = ComplaintIndex()
+    index.add("Street light broken", "MG Road", KEY, ANALYSIS)
+    assert index.match("Street light broken", labels_key(["water"])).analysis is None
@@ -0,0 +1,141 @@
+"""AudioFetcher against a local HTTP stub: retries, rejections and the byte cap."""
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.utils.fetcher import AudioFetcher, AudioFetchError
+from app.utils.deadline import DeadlineExceeded, set_deadline
+
+AUDIO = b"ID3" + bytes(range(256)) * 16
+
+class StubHandler(BaseHTTPRequestHandler):
+    # path -> responses served in turn (the last one repeats): (status, content type, body, send content-length)
+    routes = {}
+    hits = {}
+    # Seconds to wait before answering
+    delay = 0.0
+
+    def do_GET(self):
+        responses = self.routes[self.path]
+        hit = self.hits.get(self.path, 0)
+        self.hits[self.path] = hit + 1
+        status, content_type, body, declare_length = responses[min(hit, len(responses) - 1)]
+        time.sleep(self.delay)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if declare_length:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # Without a content length (HTTP/1.0) the body runs until the connection closes
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubHandler.routes, StubHandler.hits, StubHandler.delay = {}, {}, 0.0
+
+    def route(path, *responses):
+        StubHandler.routes[path] = list(responses)
+        return f"http://127.0.0.1:{server.server_port}{path}"
+
+    yield route
+    server.shutdown()
+    server.server_close()
+
+def fetch(url, deadline=None, **params):
+    async def run():
+        params.setdefault("backoff", 0.01)
+        fetcher = AudioFetcher(retries=2, **params)
+        if deadline is not None:
+            set_deadline(time.monotonic() + deadline)
+        try:
+            return await fetcher.fetch(url)
+        finally:
+            await fetcher.aclose()
+    return asyncio.run(run())
+
+def ok(body=AUDIO, content_type="audio/mpeg", declare_length=True):
+    return (200, content_type, body, declare_length)
+
+def test_fetches_audio(stub):
+    result = fetch(stub("/a.mp3", ok()))
+    assert result.attempts == 1
+    assert result.content_type == "audio/mpeg"
+    assert result.source.filename == "audio.mp3"
+    assert result.size == len(AUDIO)
+    assert result.source.file.read() == AUDIO
+
+@pytest.mark.parametrize("status", [500, 502, 503, 429])
+def test_retries_server_errors_and_rate_limits(stub, status):
+    url = stub("/a.mp3", (status, "text/plain", b"busy", True), ok())
+    result = fetch(url)
+    assert result.attempts == 2
+    assert result.source.file.read() == AUDIO
+    assert StubHandler.hits["/a.mp3"] == 2
+
+def test_gives_up_after_retries(stub):
+    url = stub("/a.mp3", (503, "text/plain", b"down", True))
+    with pytest.raises(AudioFetchError) as error:
+        fetch(url)
+    assert error.value.retryable
+    assert StubHandler.hits["/a.mp3"] == 3
+
+@pytest.mark.parametrize("status", [400, 403, 404, 410])
+def test_client_errors_fail_at_once(stub, status):
+    url = stub("/a.mp3", (status, "text/plain", b"no", True), ok())
+    with pytest.raises(AudioFetchError, match=str(status)) as error:
+        fetch(url)
+    assert not error.value.retryable
+    assert StubHandler.hits["/a.mp3"] == 1
+
+def test_rejects_non_audio_content(stub):
+    url = stub("/a.mp3", ok(b"<html></html>", "text/html"))
+    with pytest.raises(AudioFetchError, match="content type") as error:
+        fetch(url)
+    assert not error.value.retryable
+    assert StubHandler.hits["/a.mp3"] == 1
+
+@pytest.mark.parametrize("content_type", ["audio/ogg; codecs=opus", "video/mp4", "application/octet-stream"])
+def test_accepts_audio_containers(stub, content_type):
+    assert fetch(stub("/a.ogg", ok(content_type=content_type))).size == len(AUDIO)
+
+def test_declared_size_over_cap(stub):
+    url = stub("/a.mp3", ok())
+    with pytest.raises(AudioFetchError, match="limit") as error:
+        fetch(url, max_bytes=len(AUDIO) - 1)
+    assert not error.value.retryable
+    assert StubHandler.hits["/a.mp3"] == 1
+
+def test_streamed_size_over_cap(stub):
+    # No content length, so the cap is enforced while reading
+    url = stub("/a.mp3", ok(declare_length=False))
+    with pytest.raises(AudioFetchError, match="limit"):
+        fetch(url, max_bytes=len(AUDIO) - 1)
+    assert StubHandler.hits["/a.mp3"] == 1
+
+def test_size_at_cap(stub):
+    assert fetch(stub("/a.mp3", ok(declare_length=False)), max_bytes=len(AUDIO)).size == len(AUDIO)
+
+def test_slow_download_stops_at_the_deadline(stub):
+    StubHandler.delay = 1.0
+    url = stub("/a.mp3", ok())
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        fetch(url, deadline=0.2)
+    assert time.monotonic() - started < 0.6
+
+def test_no_retry_past_the_deadline(stub):
+    url = stub("/a.mp3", (503, "text/plain", b"down", True), ok())
+    started = time.monotonic()
+    with pytest.raises(AudioFetchError):
+        fetch(url, deadline=0.5, backoff=2.0)
+    assert time.monotonic() - started < 0.4
+    assert StubHandler.hits["/a.mp3"] == 1
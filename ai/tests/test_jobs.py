@@ -0,0 +1,90 @@
+"""Transcription job cancellation across worker processes sharing one job database."""
+import io
+import os
+import asyncio
+
+from app import jobs
+from app.jobs import JobStore, TranscriptionJobQueue
+
+class SlowListener:
+    """Reads the job's audio, then takes a while to transcribe it."""
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    async def transcribe(self, source, **kwargs):
+        source.file.read()
+        self.started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+def queue(tmp_path) -> TranscriptionJobQueue:
+    # Each queue has its own connection, as each worker process does
+    return TranscriptionJobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), str(tmp_path / "audio"), workers=1,
+                                 lease_seconds=0.3, poll_interval=0.05)
+
+def test_cancel_from_another_process_stops_the_running_job(tmp_path, monkeypatch):
+    listener = SlowListener()
+    monkeypatch.setattr(jobs, "get_listener_agent", lambda: listener)
+
+    async def run():
+        worker, other = queue(tmp_path), queue(tmp_path)
+        job = await worker.submit(file=io.BytesIO(b"audio"), filename="a.mp3")
+        path = (await asyncio.to_thread(worker.store.get, job.job_id))["audio_path"]
+        worker.start()
+        await asyncio.wait_for(listener.started.wait(), 5)
+
+        outcome = await other.cancel_or_delete(job.job_id)
+        # The worker holding the job may still be reading its audio
+        kept = os.path.exists(path)
+        for _ in range(50):
+            if not os.path.exists(path):
+                break
+            await asyncio.sleep(0.05)
+        removed = not os.path.exists(path)
+        status = (await worker.get(job.job_id)).status
+        await worker.stop()
+        return outcome, kept, removed, status
+
+    outcome, kept, removed, status = asyncio.run(run())
+    assert outcome == "cancelled"
+    assert kept
+    assert removed
+    assert listener.cancelled
+    assert status == "cancelled"
+
+def test_cancel_in_the_same_process(tmp_path, monkeypatch):
+    listener = SlowListener()
+    monkeypatch.setattr(jobs, "get_listener_agent", lambda: listener)
+
+    async def run():
+        worker = queue(tmp_path)
+        job = await worker.submit(file=io.BytesIO(b"audio"), filename="a.mp3")
+        path = (await asyncio.to_thread(worker.store.get, job.job_id))["audio_path"]
+        worker.start()
+        await asyncio.wait_for(listener.started.wait(), 5)
+        outcome = await worker.cancel_or_delete(job.job_id)
+        await asyncio.sleep(0.1)
+        removed = not os.path.exists(path)
+        # The worker survives a cancelled job
+        alive = all(not task.done() for task in worker.tasks)
+        await worker.stop()
+        return outcome, removed, alive
+
+    outcome, removed, alive = asyncio.run(run())
+    assert outcome == "cancelled"
+    assert removed
+    assert listener.cancelled
+    assert alive
+
+def test_cancel_queued_job_removes_audio(tmp_path):
+    async def run():
+        worker = queue(tmp_path)
+        job = await worker.submit(file=io.BytesIO(b"audio"), filename="a.mp3")
+        path = (await asyncio.to_thread(worker.store.get, job.job_id))["audio_path"]
+        return await worker.cancel_or_delete(job.job_id), os.path.exists(path)
+
+    assert asyncio.run(run()) == ("cancelled", False)
@@ -0,0 +1,32 @@
+"""Local language detection and how chat sessions use it."""
+import asyncio
+
+import pytest
+
+from app.languages import detected_name
+
+@pytest.mark.parametrize("text, expected", [
+    ("There is a pothole on the main road", "English"),
+    ("mera naam Ravi hai aur sadak kharab hai", "Hindi"),
+    ("सड़क पर गड्ढा है", "Hindi"),
+    ("রাস্তায় গর্ত", "Bengali"),
+])
+def test_detects_with_evidence(text, expected):
+    assert detected_name(text) == expected
+
+@pytest.mark.parametrize("text", ["Yes", "OK thanks", "Ravi", "नमस्ते", "ok"])
+def test_no_evidence_is_not_a_detection(text):
+    assert detected_name(text) is None
+
+def test_short_reply_keeps_session_language(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    from app import main
+    from app.schemas import ChatRequest
+    from app.sessions import get_session_store
+
+    async def run():
+        session = await get_session_store().create(language="Hindi")
+        _, _, language = await main._open_session(ChatRequest(text="Yes", session_id=session.session_id))
+        return language
+
+    assert asyncio.run(run()) == "Hindi"
@@ -0,0 +1,65 @@
+"""ModelRouter model choice: latency reroutes, error failover and hedge accounting."""
+import asyncio
+
+from app.agents.router import ModelRouter
+from app.utils.scheduler import Priority
+
+PRIMARY = "llama-3.3-70b-versatile"
+FAST = "llama-3.1-8b-instant"
+
+def record(router: ModelRouter, model: str, task: str, latency, count: int = 30):
+    for _ in range(count):
+        router._window(model, task).add(latency)
+
+def test_slow_primary_keeps_non_fast_task():
+    router = ModelRouter(PRIMARY, FAST)
+    record(router, PRIMARY, "classify", 2.0)
+    record(router, FAST, "classify", 0.2)
+    assert router.choose("classify", 100) == PRIMARY
+    assert router.rerouted == 0
+
+def test_slow_primary_reroutes_fast_task():
+    router = ModelRouter(PRIMARY, FAST, fast_tasks={"summary"})
+    record(router, PRIMARY, "summary", 2.0)
+    record(router, FAST, "summary", 0.2)
+    # Too long for the fast model by configuration, but the primary is much slower
+    assert router.choose("summary", 5000) == FAST
+
+def test_slow_fast_model_reroutes_to_primary():
+    router = ModelRouter(PRIMARY, FAST, fast_tasks={"summary"})
+    record(router, FAST, "summary", 2.0)
+    record(router, PRIMARY, "summary", 0.2)
+    assert router.choose("summary", 100) == PRIMARY
+
+def test_failing_primary_fails_over():
+    router = ModelRouter(PRIMARY, FAST)
+    record(router, PRIMARY, "classify", None)
+    record(router, FAST, "classify", 0.2)
+    assert router.choose("classify", 100) == FAST
+
+def test_hedge_loser_is_recorded_but_cancelled_calls_are_not():
+    router = ModelRouter(PRIMARY, FAST, hedge_min_delay=0.01)
+    record(router, PRIMARY, "chat", 0.01)
+
+    async def call(model: str):
+        await asyncio.sleep(0.5 if model == PRIMARY else 0.02)
+        return model
+
+    async def run():
+        result = await router.run(PRIMARY, "chat", Priority.CHAT, call)
+        # Let the cancelled loser finish
+        await asyncio.sleep(0)
+        hedged = len(router._window(PRIMARY, "chat").samples)
+        # A request cancelled from outside, before any hedge
+        abandoned = asyncio.create_task(router.run(FAST, "chat", Priority.CHAT, call))
+        await asyncio.sleep(0.005)
+        abandoned.cancel()
+        await asyncio.gather(abandoned, return_exceptions=True)
+        return result, hedged
+
+    result, hedged = asyncio.run(run())
+    assert result == (FAST, FAST)
+    # The losing primary call counts as a (slow) sample
+    assert hedged == 31
+    # Only the hedge that won; the abandoned call is not a sample
+    assert len(router._window(FAST, "chat").samples) == 1
@@ -0,0 +1,146 @@
+"""GroqScheduler driving a real Groq client against benchmarks.fake_groq."""
+import time
+import socket
+import asyncio
+import threading
+
+import groq
+import pytest
+import uvicorn
+
+from benchmarks import fake_groq
+from app.utils import scheduler as scheduler_module
+from app.utils.scheduler import GroqScheduler, Priority
+
+MODEL = "llama-3.3-70b-versatile"
+
+@pytest.fixture(scope="module")
+def fake_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(fake_groq.app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server.should_exit = True
+    thread.join(5)
+
+@pytest.fixture(autouse=True)
+def fast_fake():
+    fake_groq.config.__init__(chat_latency_ms=5, whisper_latency_ms=5, jitter=0)
+    yield
+    fake_groq.config.__init__()
+
+def client(scheduler: GroqScheduler, url: str) -> groq.AsyncGroq:
+    return groq.AsyncGroq(api_key="test", base_url=url, max_retries=0, http_client=scheduler.http_client(MODEL))
+
+async def chat(api: groq.AsyncGroq):
+    return await api.chat.completions.create(model=MODEL, messages=[{"role": "user", "content": "Pothole on the main road"}])
+
+def test_admits_by_priority(fake_url):
+    async def run():
+        scheduler = GroqScheduler(limits={MODEL: (1200, 0)})
+        # An empty request budget refilling at 20/s, so calls are admitted one at a time
+        scheduler._lane(MODEL).requests.level = 0
+        api = client(scheduler, fake_url)
+        admitted = []
+
+        async def call(priority: Priority):
+            async def tracked():
+                admitted.append(priority)
+                return await chat(api)
+            await scheduler.run(MODEL, priority, tracked)
+
+        order = [Priority.BATCH, Priority.CLASSIFICATION, Priority.CHAT, Priority.TRANSCRIPTION, Priority.BATCH, Priority.CHAT]
+        await asyncio.gather(*(call(priority) for priority in order))
+        await api.close()
+        return admitted, scheduler.stats()
+
+    admitted, stats = asyncio.run(run())
+    assert admitted == sorted(admitted)
+    assert stats["priorities"]["chat"]["admitted"] == 2
+    assert stats["priorities"]["batch"]["throttled"] == 2
+
+def test_chat_reserve_holds_back_other_traffic(fake_url):
+    async def run(chat_reserve: float):
+        scheduler = GroqScheduler(limits={MODEL: (0, 1000)}, chat_reserve=chat_reserve)
+        api = client(scheduler, fake_url)
+        await scheduler.run(MODEL, Priority.CHAT, lambda: chat(api), tokens=300)
+        # 700 tokens left: enough for this call, but not for it and the 500-token chat reserve
+        batch = asyncio.create_task(scheduler.run(MODEL, Priority.BATCH, lambda: chat(api), tokens=300))
+        await asyncio.wait([batch], timeout=0.3)
+        batch_done = batch.done()
+        live = await asyncio.wait_for(scheduler.run(MODEL, Priority.CHAT, lambda: chat(api), tokens=300), 1)
+        batch.cancel()
+        await asyncio.gather(batch, return_exceptions=True)
+        await api.close()
+        return batch_done, live
+
+    batch_done, live = asyncio.run(run(chat_reserve=0.5))
+    assert not batch_done
+    assert live.choices[0].message.content
+    batch_done, _ = asyncio.run(run(chat_reserve=0))
+    assert batch_done
+
+def test_rate_limit_pauses_until_reset(fake_url):
+    # The fake answers 429 with retry-after 0.2
+    fake_groq.config.rate_limit_rate = 1.0
+
+    async def run():
+        scheduler = GroqScheduler(max_retries=0)
+        api = client(scheduler, fake_url)
+        with pytest.raises(groq.RateLimitError):
+            await scheduler.run(MODEL, Priority.CHAT, lambda: chat(api))
+        limited_at = time.monotonic()
+        fake_groq.config.rate_limit_rate = 0.0
+        await scheduler.run(MODEL, Priority.CHAT, lambda: chat(api))
+        waited = time.monotonic() - limited_at
+        await api.close()
+        return waited, scheduler.stats()
+
+    waited, stats = asyncio.run(run())
+    assert waited >= 0.15
+    assert stats["models"][MODEL]["rate_limited"] == 1
+    assert stats["priorities"]["chat"]["throttled"] == 1
+
+def test_rate_limited_call_is_retried_after_reset(fake_url):
+    fake_groq.config.rate_limit_rate = 1.0
+
+    async def run():
+        scheduler = GroqScheduler(max_retries=3, backoff=0.01)
+        api = client(scheduler, fake_url)
+        started = time.monotonic()
+        call = asyncio.create_task(scheduler.run(MODEL, Priority.TRANSCRIPTION, lambda: chat(api)))
+        while MODEL not in scheduler.lanes or not scheduler.lanes[MODEL].rate_limited:
+            await asyncio.sleep(0.01)
+        fake_groq.config.rate_limit_rate = 0.0
+        response = await call
+        elapsed = time.monotonic() - started
+        await api.close()
+        return response, elapsed, scheduler.stats()
+
+    response, elapsed, stats = asyncio.run(run())
+    assert response.choices[0].message.content
+    assert elapsed >= 0.15
+    assert stats["priorities"]["transcription"]["rate_limited"] >= 1
+
+def test_workers_split_the_quota(fake_url, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("GROQ_RATE_LIMITS", f"{MODEL}=100:0,whisper-large-v3-turbo=20:8000")
+    monkeypatch.setattr(scheduler_module, "scheduler", None)
+    scheduler = scheduler_module.get_scheduler()
+    assert scheduler.share == 0.25
+
+    async def run():
+        api = client(scheduler, fake_url)
+        await scheduler.run(MODEL, Priority.CHAT, lambda: chat(api))
+        await api.close()
+
+    asyncio.run(run())
+    models = scheduler.stats()["models"]
+    assert models[MODEL]["rpm"] == 25
+    # Learned from the fake's x-ratelimit-limit-tokens (1,000,000), then split the same way
+    assert models[MODEL]["tpm"] == 250000
+    assert scheduler._lane("whisper-large-v3-turbo").tokens.per_minute == 2000
@@ -0,0 +1,28 @@
+"""Session store backends."""
+import asyncio
+
+import pytest
+
+from app.sessions import MemorySessionStore, SessionStore
+
+def test_incomplete_store_fails_at_construction():
+    class LoadOnly(SessionStore):
+        async def _load(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        LoadOnly()
+
+def test_memory_store_round_trip():
+    async def run():
+        store = MemorySessionStore()
+        session = await store.create(language="Hindi")
+        await store.update(session.session_id, lambda current: current.history.append({"role": "user", "content": "hi"}))
+        loaded = await store.get(session.session_id)
+        await store.delete(session.session_id)
+        return loaded, await store.get(session.session_id)
+
+    loaded, deleted = asyncio.run(run())
+    assert loaded.language == "Hindi"
+    assert loaded.history == [{"role": "user", "content": "hi"}]
+    assert deleted is None
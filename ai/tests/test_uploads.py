@@ -0,0 +1,45 @@
+"""Upload spooling: the app's routes parse multipart bodies with SpooledMultiPartParser."""
+from fastapi import FastAPI, File, UploadFile
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from starlette.formparsers import MultiPartParser
+
+from app.utils.audio import SPOOL_MAX_BYTES, UploadRoute
+
+def upload_app(route_class=None) -> TestClient:
+    app = FastAPI()
+    if route_class:
+        app.router.route_class = route_class
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        # SpooledTemporaryFile moves to disk once it outgrows its max_size
+        return {"on_disk": file.file._rolled, "size": len(await file.read())}
+
+    @app.post("/json")
+    async def json_body(body: dict):
+        return body
+
+    return TestClient(app)
+
+def test_uploads_stay_in_memory_up_to_the_spool_limit():
+    # Fails if Starlette stops calling Request._get_form, which UploadRequest overrides
+    size = MultiPartParser.spool_max_size + 1024
+    assert size < SPOOL_MAX_BYTES
+    response = upload_app(UploadRoute).post("/upload", files={"file": ("a.mp3", b"x" * size)})
+    assert response.json() == {"on_disk": False, "size": size}
+    # Starlette's own default is left alone
+    assert upload_app().post("/upload", files={"file": ("a.mp3", b"x" * size)}).json()["on_disk"]
+
+def test_larger_uploads_spill_to_disk():
+    size = SPOOL_MAX_BYTES + 1024
+    assert upload_app(UploadRoute).post("/upload", files={"file": ("a.mp3", b"x" * size)}).json() == {"on_disk": True, "size": size}
+
+def test_other_bodies_are_unaffected():
+    assert upload_app(UploadRoute).post("/json", json={"a": 1}).json() == {"a": 1}
+
+def test_app_routes_use_upload_route(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    from app.main import app
+    routes = [route for route in app.routes if isinstance(route, APIRoute)]
+    assert routes and all(isinstance(route, UploadRoute) for route in routes)